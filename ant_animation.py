@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+
+import shutil
+import subprocess
+from typing import TYPE_CHECKING, List, Optional, Tuple, Union
+
+import numpy as np
+import matplotlib
+import matplotlib.pyplot as plt
+from matplotlib.animation import FuncAnimation
+from matplotlib.widgets import Button, Slider
+
+from ant_graph import CompactGraph
+from ant_profile import stage
+from ant_render import PATH_COLORS, render_graph
+from ant_turns import TurnIndex, TurnMoves, decode_turns, first_rooms
+
+if TYPE_CHECKING:
+    from ant_visualizer import Path
+
+ANT_COLOR = '#FFD700'
+
+
+def path_colors_by_room(first_room: np.ndarray, graph: CompactGraph, paths: List['Path']) -> List[str]:
+    """Color de cada hormiga según la primera sala a la que sale (-1: aún en ##start)"""
+    colors = [ANT_COLOR] * len(first_room)
+    room_to_path = {}
+    for i, path in enumerate(paths or []):
+        indices = graph.indices_of(path.nodes)
+        if len(indices) > 1:
+            room_to_path[indices[1]] = i
+    if not room_to_path:
+        return colors
+    for ant, room in enumerate(first_room.tolist()):
+        i = room_to_path.get(room)
+        if i is not None:
+            colors[ant] = PATH_COLORS[i % len(PATH_COLORS)]
+    return colors
+
+
+def ant_path_colors(moves: TurnMoves, num_ants: int, graph: CompactGraph, paths: List['Path']) -> List[str]:
+    """Color de cada hormiga según el camino por el que sale de ##start"""
+    if not paths:
+        return [ANT_COLOR] * num_ants
+    # Primera sala a la que se mueve: identifica el camino (son disjuntos)
+    return path_colors_by_room(first_rooms(moves, num_ants), graph, paths)
+
+
+class AntAnimator:
+    """Anima el movimiento de las hormigas turno a turno sobre el grafo ya dibujado
+
+    positions se indexa como la tabla (turnos + 1, hormigas): un TurnIndex
+    reconstruye las filas desde sus checkpoints sin la tabla completa. En
+    cada fotograma sólo se interpolan coordenadas y se actualiza la colección
+    de marcadores de hormigas (artista animado, compatible con blitting).
+    """
+
+    def __init__(self, fig, ax, graph: CompactGraph, positions: Union[np.ndarray, TurnIndex],
+                 colors: Optional[List[str]] = None, fps: float = 30, speed: float = 2.0):
+        self.fig = fig
+        self.ax = ax
+        coords = getattr(ax, 'node_coords', None)      # las que usó render_graph
+        if coords is None:
+            coords = np.column_stack((graph.xs, graph.ys))
+        self.coords = np.asarray(coords, dtype=float)
+        self.positions = positions
+        self.turns = positions.shape[0] - 1 if positions is not None else 0
+        self.first_turn = 0         # primer turno disponible (ver ant_live)
+        self.fps = fps
+        self.speed = speed          # turnos por segundo
+        self.time = 0.0             # posición actual en turnos (fraccionaria)
+        self.playing = True
+        self.anim = None
+        self.slider = None
+
+        self.ants = ax.scatter(*self._xy(0.0).T, s=45, c=colors or ANT_COLOR,
+                               edgecolors='#000000', linewidth=0.8, zorder=9, animated=True)
+        self.label = ax.text(0.01, 0.99, '', transform=ax.transAxes, va='top', ha='left',
+                             fontsize=11, fontweight='bold', color='#FFFFFF', zorder=10,
+                             bbox=dict(boxstyle='round,pad=0.4', facecolor='#2D2D2D',
+                                       edgecolor='#FFD700', alpha=0.85),
+                             animated=True)
+        self.artists = (self.ants, self.label)
+        # El tooltip de nodos se dibuja en cada fotograma: un blit propio lo borraría el siguiente
+        hover = getattr(ax, 'node_hover', None)
+        if hover is not None and hover.annot.get_animated():
+            hover.external_draw = True
+            self.artists += (hover.annot,)
+
+    def _xy(self, time: float) -> np.ndarray:
+        """Coordenadas de todas las hormigas en un instante (interpolación lineal)"""
+        t0 = min(int(time), self.turns)
+        frac = time - t0
+        xy = self.coords[self._row(t0)]
+        if frac > 0 and t0 < self.turns:
+            xy = xy + (self.coords[self._row(t0 + 1)] - xy) * frac
+        return xy
+
+    def _row(self, t: int) -> np.ndarray:
+        return self.positions[t]
+
+    def update(self, time: float):
+        """Coloca las hormigas en el instante time; devuelve los artistas modificados"""
+        self.time = min(max(time, float(self.first_turn)), float(self.turns))
+        self.ants.set_offsets(self._xy(self.time))
+        state = '' if self.playing else '  [PAUSA]'
+        self.label.set_text(f"Turno {int(self.time)}/{self.turns}  x{self.speed:g}{state}")
+        return self.artists
+
+    def _frame(self, _):
+        if self.playing:
+            self.update(self.time + self.speed / self.fps)
+            if self.time >= self.turns:
+                self.playing = False
+        return self.artists
+
+    # --- Controles interactivos -------------------------------------------------
+
+    def toggle(self, *_):
+        if self.time >= self.turns:
+            self.time = float(self.first_turn)
+        self.playing = not self.playing
+        self.update(self.time)
+        if not self.playing:
+            self._sync_slider()
+
+    def step(self, turns: int):
+        self.playing = False
+        self.update(round(self.time) + turns)
+        self._sync_slider()
+
+    def set_speed(self, factor: float):
+        self.speed = min(max(self.speed * factor, 0.125), 256.0)
+        self.update(self.time)
+
+    def _sync_slider(self):
+        # Sólo en pausa: mover el slider obliga a redibujar la figura completa
+        if self.slider is not None:
+            self.slider.eventson = False
+            self.slider.set_val(self.time)
+            self.slider.eventson = True
+
+    def _on_key(self, event):
+        if event.key == ' ':
+            self.toggle()
+        elif event.key == 'right':
+            self.step(1)
+        elif event.key == 'left':
+            self.step(-1)
+        elif event.key in ('+', '='):
+            self.set_speed(2.0)
+        elif event.key == '-':
+            self.set_speed(0.5)
+        elif event.key == 'home':
+            self.step(-self.turns)
+
+    def _on_scrub(self, value):
+        # El bucle de animación sigue re-dibujando (blit) las hormigas aunque esté en pausa
+        self.playing = False
+        self.update(value)
+
+    def connect(self):
+        """Crea el bucle de animación con blitting y los controles (slider, botones, teclado)"""
+        self._add_controls()
+        self.anim = FuncAnimation(self.fig, self._frame, interval=1000 / self.fps, blit=True,
+                                  cache_frame_data=False)
+        return self.anim
+
+    def _add_controls(self):
+        pos = self.ax.get_position()
+        self.ax.set_position([pos.x0, pos.y0 + 0.05, pos.width, pos.height - 0.05])
+        slider_ax = self.fig.add_axes([pos.x0 + 0.12, pos.y0 - 0.01, pos.width - 0.12, 0.02],
+                                      facecolor='#2D2D2D')
+        self.slider = Slider(slider_ax, 'Turno', 0, max(self.turns, 1), valinit=0,
+                             color='#FFD700')
+        self.slider.on_changed(self._on_scrub)
+
+        buttons = []
+        for k, (label, callback) in enumerate((('▶/II', self.toggle),
+                                               ('x½', lambda _: self.set_speed(0.5)),
+                                               ('x2', lambda _: self.set_speed(2.0)))):
+            button_ax = self.fig.add_axes([pos.x0 + k * 0.04, pos.y0 - 0.015, 0.035, 0.03])
+            button = Button(button_ax, label, color='#2D2D2D', hovercolor='#444444')
+            button.label.set_color('#CCCCCC')
+            button.on_clicked(callback)
+            buttons.append(button)
+        self._buttons = buttons
+
+        self.fig.canvas.mpl_connect('key_press_event', self._on_key)
+
+    # --- Exportación sin pantalla ------------------------------------------------
+
+    def frames(self, frames_per_turn: int):
+        """Genera los fotogramas RGBA de toda la simulación dibujando sólo las hormigas"""
+        canvas = self.fig.canvas
+        # Los artistas animados no se incluyen en draw(): el fondo es sólo el grafo
+        canvas.draw()
+        background = canvas.copy_from_bbox(self.fig.bbox)
+        self.playing = True
+        total = self.turns * frames_per_turn
+        for frame in range(total + 1):
+            canvas.restore_region(background)
+            self.update(frame / frames_per_turn)
+            self.ax.draw_artist(self.ants)
+            self.ax.draw_artist(self.label)
+            yield np.asarray(canvas.buffer_rgba())
+
+    def save(self, output: str, frames_per_turn: int = 6):
+        """Guarda la animación en GIF (Pillow) o vídeo (ffmpeg) sin redibujar el grafo"""
+        if output.lower().endswith('.gif'):
+            _save_gif(self.frames(frames_per_turn), output, self.fps)
+        else:
+            _save_ffmpeg(self.frames(frames_per_turn), output, self.fps)
+
+
+def _save_gif(frames, output: str, fps: float):
+    from PIL import Image
+    images = (Image.fromarray(frame).convert('RGB').quantize(colors=128) for frame in frames)
+    first = next(images)
+    first.save(output, save_all=True, append_images=images, duration=int(1000 / fps), loop=0)
+
+
+def _save_ffmpeg(frames, output: str, fps: float):
+    ffmpeg = shutil.which(matplotlib.rcParams['animation.ffmpeg_path'])
+    if ffmpeg is None:
+        raise RuntimeError("ffmpeg no está disponible: exporta a .gif o instala ffmpeg")
+    process = None
+    try:
+        for frame in frames:
+            if process is None:
+                height, width = frame.shape[:2]
+                process = subprocess.Popen(
+                    [ffmpeg, '-y', '-loglevel', 'error', '-f', 'rawvideo', '-pix_fmt', 'rgba',
+                     '-s', f'{width}x{height}', '-r', str(fps), '-i', '-',
+                     '-pix_fmt', 'yuv420p', '-vf', 'pad=ceil(iw/2)*2:ceil(ih/2)*2', output],
+                    stdin=subprocess.PIPE)
+            process.stdin.write(frame.tobytes())
+    finally:
+        if process is not None:
+            process.stdin.close()
+            if process.wait() != 0:
+                raise RuntimeError(f"ffmpeg terminó con error ({process.returncode})")
+
+
+def build_animator(num_ants: int, graph: CompactGraph, paths: List['Path'],
+                   simulation_lines: Union[List[str], TurnMoves], figsize: Tuple[float, float] = (16, 12),
+                   fps: float = 30, interactive: bool = True,
+                   coords: Optional[np.ndarray] = None) -> AntAnimator:
+    """Dibuja el grafo y prepara el animador con el índice de posiciones por checkpoints
+
+    simulation_lines puede venir ya decodificado (TurnMoves de ant_cache o
+    de un fichero de turnos).
+    """
+    with stage('decode'):
+        if isinstance(simulation_lines, TurnMoves):
+            moves = simulation_lines
+        else:
+            moves = decode_turns(simulation_lines, graph.index)
+        positions = TurnIndex(moves, num_ants, graph.start)
+    with stage('render'):
+        fig, ax = render_graph(num_ants, graph, paths, figsize=figsize, interactive=interactive,
+                               coords=coords)
+    colors = ant_path_colors(moves, positions.num_ants, graph, paths)
+    return AntAnimator(fig, ax, graph, positions, colors, fps=fps)
+
+
+def show_animation(num_ants: int, graph: CompactGraph, paths: List['Path'],
+                   simulation_lines: Union[List[str], TurnMoves], fps: float = 30,
+                   coords: Optional[np.ndarray] = None):
+    """Abre la ventana con la animación (espacio: play/pausa, flechas: turno, +/-: velocidad)"""
+    animator = build_animator(num_ants, graph, paths, simulation_lines, fps=fps, coords=coords)
+    animator.fig.canvas.manager.set_window_title('Lem-in Graph Visualizer - Animation')
+    anim = animator.connect()
+    plt.show()
+    return anim
+
+
+def export_animation(num_ants: int, graph: CompactGraph, paths: List['Path'],
+                     simulation_lines: Union[List[str], TurnMoves], output: str, fps: float = 30,
+                     frames_per_turn: int = 6, dpi: float = 100, figsize: Tuple[float, float] = (16, 12),
+                     coords: Optional[np.ndarray] = None):
+    """Exporta la animación a GIF/vídeo sin pantalla (requiere backend Agg)"""
+    animator = build_animator(num_ants, graph, paths, simulation_lines, figsize=figsize, fps=fps,
+                              interactive=False, coords=coords)
+    animator.fig.set_dpi(dpi)
+    try:
+        with stage('frames'):
+            animator.save(output, frames_per_turn)
+    finally:
+        plt.close(animator.fig)
@@ -0,0 +1,366 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import itertools
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Dict, Iterator, List, Optional, Sequence
+
+from ant_bench import GENERATOR_MODES, distinct_maps, required_turns, seeded_map
+from ant_graph import GraphBuilder
+from ant_profile import available_cores
+from ant_visualizer import LemInStreamParser
+
+TOO_MANY_STEPS = "Error: Too many steps"
+PERCENTILES = (50, 90, 99)
+CSV_FIELDS = ('map', 'group', 'status', 'exit_code', 'seconds', 'peak_kib', 'ants', 'rooms', 'links',
+              'paths', 'turns', 'required', 'excess', 'valid', 'error')
+VALIDATE_CHUNK = 4 << 20
+
+# Estados de una ejecución:
+#   ok              simulación completa
+#   too_many_steps  simulateAntMovement cortó la simulación a los 1000 pasos
+#   error           lem-in rechazó el mapa (última línea "Error: ...")
+#   no_simulation   sin error pero sin turnos (mapa sin camino)
+#   timeout         superó --timeout y se mató el proceso
+#   crash           terminó por una señal
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """Percentil q (0-100) por rango más cercano; None si no hay valores"""
+    values = sorted(v for v in values if v is not None)
+    if not values:
+        return None
+    rank = max(-(-len(values) * q // 100), 1)
+    return values[int(rank) - 1]
+
+
+def run_task(task: dict) -> dict:
+    """Ejecuta lem-in sobre un mapa (fichero o generado) y parsea su salida a medida que llega
+
+    Se ejecuta en un proceso del pool: recibe y devuelve diccionarios simples. Cualquier fallo
+    (mapa ilegible, generador, lem-in que no arranca) queda como un registro con estado error.
+    """
+    record = {'map': task['name'], 'group': task['group'], 'status': None, 'exit_code': None,
+              'seconds': None, 'peak_kib': None, 'ants': 0, 'rooms': 0, 'links': 0, 'paths': 0,
+              'turns': 0, 'required': None, 'excess': None, 'valid': None, 'error': None}
+    t0 = time.perf_counter()
+    try:
+        _run_task(task, record)
+    except Exception as e:
+        record.update(status='error', error=f"{type(e).__name__}: {e}")
+    if record['seconds'] is None:
+        record['seconds'] = time.perf_counter() - t0
+    return record
+
+
+def _run_task(task: dict, record: dict):
+    if task.get('error'):
+        record.update(status='error', error=task['error'])
+        return
+    if 'mode' in task:
+        text = task['text'] if 'text' in task else seeded_map(task['mode'], task['seed'])
+        if task.get('save_dir'):
+            path = os.path.join(task['save_dir'], task['name'].replace('gen:', '').replace('#', '_') + '.map')
+            with open(path, 'w') as f:
+                f.write(text)
+            record['map'] = path
+    else:
+        with open(task['path']) as f:
+            text = f.read()
+    record['required'] = required_turns(text)
+
+    with tempfile.TemporaryFile() as stdin:
+        stdin.write(text.encode())
+        stdin.seek(0)
+        _stream(task, stdin, record)
+
+    if record['required'] is not None and record['status'] in ('ok', 'too_many_steps'):
+        record['excess'] = record['turns'] - record['required']
+
+
+def _stream(task: dict, stdin, record: dict):
+    """Lanza lem-in y consume su stdout línea a línea con LemInStreamParser"""
+    t0 = time.perf_counter()
+    # Sesión propia: al vencer el plazo se mata el grupo entero, no sólo el primer proceso
+    process = subprocess.Popen([task['lem_in']], stdin=stdin, stdout=subprocess.PIPE,
+                               stderr=subprocess.STDOUT, text=True, errors='replace',
+                               start_new_session=True)
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        _kill_group(process.pid)
+
+    killer = threading.Timer(task['timeout'], kill)
+    killer.start()
+    # Con --validate el grafo se acumula hasta el primer turno y los turnos se validan por bloques
+    builder = GraphBuilder() if task['validate'] else None
+    validator, chunk, size = None, [], 0
+    try:
+        parser = LemInStreamParser(process.stdout)
+        for kind, value in parser.events():
+            if kind == 'turn':
+                record['turns'] += 1
+                if builder is not None:
+                    if validator is None:
+                        validator = _validator(builder, record['ants'])
+                    chunk.append(value)
+                    size += len(value)
+                    if size >= VALIDATE_CHUNK:
+                        validator.feed(chunk)
+                        chunk, size = [], 0
+            elif kind == 'room':
+                record['rooms'] += 1
+                if builder is not None:
+                    builder.add_room(*value)
+            elif kind == 'link':
+                record['links'] += 1
+                if builder is not None:
+                    builder.add_link(*value)
+            elif kind == 'path':
+                record['paths'] += 1
+            elif kind == 'ants':
+                record['ants'] = value
+        process.stdout.close()
+        _, status, usage = os.wait4(process.pid, 0)
+    except BaseException as e:
+        # lem-in no puede quedar suelto ni sin recoger, y un mapa no debe tumbar el lote entero
+        _kill_group(process.pid)
+        process.stdout.close()
+        _, status, usage = os.wait4(process.pid, 0)
+        if not isinstance(e, Exception):
+            raise
+        record.update(status='error', error=f"{type(e).__name__}: {e}", seconds=time.perf_counter() - t0,
+                      peak_kib=usage.ru_maxrss, exit_code=os.waitstatus_to_exitcode(status))
+        return
+    finally:
+        killer.cancel()
+    record['seconds'] = time.perf_counter() - t0
+    record['peak_kib'] = usage.ru_maxrss
+    process.returncode = record['exit_code'] = os.waitstatus_to_exitcode(status)
+
+    error = parser.error_line
+    if timed_out.is_set():
+        record['status'] = 'timeout'
+    elif process.returncode < 0:
+        record['status'] = 'crash'
+    elif error and error.startswith(TOO_MANY_STEPS):
+        record['status'] = 'too_many_steps'
+    elif error:
+        record['status'] = 'error'
+    elif record['turns'] == 0 and record['ants'] > 0:
+        record['status'] = 'no_simulation'
+    else:
+        record['status'] = 'ok'
+    record['error'] = error
+
+    if validator is not None and record['status'] in ('ok', 'too_many_steps'):
+        validator.feed(chunk)
+        violation = validator.finish(None, error)
+        record['valid'] = violation is None
+        if violation is not None:
+            record['error'] = f"turno {violation.turn} [{violation.kind}]: {violation.message}"
+
+
+def _kill_group(pid: int):
+    """Mata el grupo de procesos de lem-in (sesión propia, ver _stream)"""
+    try:
+        os.killpg(pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+
+
+def _validator(builder: GraphBuilder, num_ants: int):
+    # numpy sólo se importa en los procesos que validan
+    from ant_validator import SimulationValidator
+    return SimulationValidator(builder.build(), num_ants)
+
+
+def _common(args) -> dict:
+    return {'lem_in': args.lem_in, 'timeout': args.timeout, 'validate': args.validate}
+
+
+def collect_tasks(inputs: List[str], args) -> List[dict]:
+    """Tareas del lote: mapas de ficheros y directorios (*.map) y, con --seeded, mapas de ant_mapgen"""
+    common = _common(args)
+    tasks = []
+    for item in inputs:
+        if os.path.isdir(item):
+            names = sorted(os.path.join(item, e) for e in os.listdir(item) if e.endswith('.map'))
+            group = os.path.basename(os.path.normpath(item))
+        else:
+            names = [item]
+            group = os.path.basename(os.path.dirname(os.path.abspath(item)))
+        tasks += [dict(common, name=path, path=path, group=group) for path in names]
+    if args.seeded:
+        for mode in args.generate:
+            # Semilla explícita por mapa: los procesos del pool no repiten mapa y el lote se puede reproducir
+            for seed in range(args.seed, args.seed + args.count):
+                tasks.append(dict(common, name=f"gen:{mode}#{seed}", group=f"gen:{mode}", mode=mode,
+                                  seed=seed, save_dir=args.save_maps))
+    return tasks
+
+
+def generated_tasks(args) -> Iterator[dict]:
+    """Tareas con mapas distintos de generator_linux, generados aquí a medida que se piden
+
+    generator_linux se siembra con el reloj: generarlos en los procesos del pool repetiría mapas.
+    """
+    common = _common(args)
+    for mode in args.generate:
+        run = 0
+        task = dict(common, group=f"gen:{mode}", mode=mode, save_dir=args.save_maps)
+        try:
+            for run, text in enumerate(distinct_maps(args.generator, mode, args.count), 1):
+                yield dict(task, name=f"gen:{mode}#{run - 1}", text=text)
+        except (OSError, subprocess.CalledProcessError) as e:
+            yield dict(task, name=f"gen:{mode}#{run}", error=f"generador: {e}")
+            continue
+        if run < args.count:
+            print(f"Aviso: {mode}: solo {run} de {args.count} mapas distintos", file=sys.stderr)
+
+
+def summarize(records: List[dict]) -> Dict[str, dict]:
+    """Por grupo: estados, percentiles de tiempo, memoria y exceso de turnos sobre el objetivo"""
+    groups: Dict[str, List[dict]] = {}
+    for record in records:
+        groups.setdefault(record['group'], []).append(record)
+    if len(groups) > 1:
+        groups['total'] = records
+
+    summary = {}
+    for key, items in groups.items():
+        statuses: Dict[str, int] = {}
+        for record in items:
+            statuses[record['status']] = statuses.get(record['status'], 0) + 1
+        excess = [r['excess'] for r in items if r['excess'] is not None]
+        entry = {'runs': len(items), 'status': statuses,
+                 'over_target': sum(1 for e in excess if e > 0),
+                 'invalid': sum(1 for r in items if r['valid'] is False)}
+        for field, values in (('seconds', [r['seconds'] for r in items]),
+                              ('peak_kib', [r['peak_kib'] for r in items]),
+                              ('excess', excess)):
+            entry[field] = {f'p{q}': percentile(values, q) for q in PERCENTILES}
+            entry[field]['max'] = max((v for v in values if v is not None), default=None)
+        summary[key] = entry
+    return summary
+
+
+def print_summary(summary: Dict[str, dict], wall: float, jobs: int, out=sys.stderr):
+    """Tabla de resumen por grupo"""
+    def fmt(value, scale=1.0, spec='.0f'):
+        return '-' if value is None else format(value * scale, spec)
+
+    print(f"\n=== RESUMEN ({wall:.1f} s, {jobs} procesos) ===", file=out)
+    print(f"{'GRUPO':<22} {'MAPAS':>6} {'ms p50/p90/p99':>20} {'exceso p50/p90/max':>20} "
+          f"{'>obj':>5} {'ESTADOS'}", file=out)
+    for key, entry in summary.items():
+        sec, exc = entry['seconds'], entry['excess']
+        times = '/'.join(fmt(sec[f'p{q}'], 1000) for q in PERCENTILES)
+        excess = '/'.join(fmt(exc[k], spec='+.0f') for k in ('p50', 'p90', 'max'))
+        statuses = ' '.join(f"{k}:{v}" for k, v in sorted(entry['status'].items()))
+        if entry['invalid']:
+            statuses += f" inválidas:{entry['invalid']}"
+        print(f"{key:<22} {entry['runs']:>6} {times:>20} {excess:>20} {entry['over_target']:>5} {statuses}",
+              file=out)
+
+
+def write_csv(records: List[dict], path: str):
+    with open(path, 'w', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=CSV_FIELDS, extrasaction='ignore')
+        writer.writeheader()
+        writer.writerows(records)
+
+
+def main(argv=None):
+    """Ejecuta lem-in sobre un corpus de mapas en paralelo y agrega los resultados"""
+    parser = argparse.ArgumentParser(
+        description="Ejecución en paralelo de lem-in sobre corpus de mapas, con resumen por percentiles")
+    parser.add_argument('inputs', nargs='*', help="mapas o directorios con *.map (maps si no se indica "
+                                                 "nada ni --generate)")
+    parser.add_argument('--generate', nargs='+', default=[], choices=GENERATOR_MODES, metavar='MODE',
+                        help="modos de generator_linux sin guiones (flow-one big big-superposition...)")
+    parser.add_argument('--count', type=int, default=10, help="mapas generados por modo (10)")
+    parser.add_argument('--generator', default='./generator_linux', help="generador (./generator_linux)")
+    parser.add_argument('--seeded', action='store_true',
+                        help="generar con ant_mapgen en lugar de generator_linux: lote reproducible")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="con --seeded, semilla del primer mapa generado; el i-ésimo usa seed + i (0)")
+    parser.add_argument('--save-maps', metavar='DIR', help="guarda los mapas generados para reproducirlos")
+    parser.add_argument('-j', '--jobs', type=int, default=available_cores(),
+                        help=f"procesos en paralelo (núcleos disponibles: {available_cores()})")
+    parser.add_argument('--timeout', type=float, default=60, help="límite por ejecución de lem-in (60 s)")
+    parser.add_argument('--lem-in', default='./lem-in', help="binario de lem-in (./lem-in)")
+    parser.add_argument('--validate', action='store_true',
+                        help="valida cada simulación con ant_validator (más lento)")
+    parser.add_argument('--csv', metavar='FILE', help="una fila por ejecución")
+    parser.add_argument('--json', metavar='FILE', help="ejecuciones y resumen en JSON")
+    parser.add_argument('-q', '--quiet', action='store_true', help="sin una línea por mapa")
+    args = parser.parse_args(argv)
+
+    if not os.path.exists(args.lem_in):
+        sys.exit(f"ERROR: no existe {args.lem_in} (make)")
+    use_generator = bool(args.generate) and not args.seeded
+    if use_generator and not os.path.exists(args.generator):
+        sys.exit(f"ERROR: no existe {args.generator} (o usa --seeded)")
+    if args.save_maps:
+        os.makedirs(args.save_maps, exist_ok=True)
+    inputs = args.inputs or ([] if args.generate else ['maps'])
+    tasks = collect_tasks(inputs, args)
+    total = len(tasks) + (len(args.generate) * args.count if use_generator else 0)
+    if not total:
+        sys.exit("ERROR: no hay mapas que ejecutar")
+
+    t0 = time.perf_counter()
+    records: List[Optional[dict]] = []
+    pending = {}
+    done = 0
+
+    def report(finished):
+        nonlocal done
+        for future in finished:
+            record = records[pending.pop(future)] = future.result()
+            done += 1
+            if not args.quiet:
+                target = record['required'] if record['required'] is not None else '-'
+                extra = f" {record['error']}" if record['status'] != 'ok' and record['error'] else ''
+                print(f"[{done}/{total}] {record['map']:<36} {record['status']:<14} "
+                      f"turnos {record['turns']}/{target} {record['seconds'] * 1000:.0f}ms{extra}",
+                      file=sys.stderr)
+
+    with ProcessPoolExecutor(max_workers=max(args.jobs, 1)) as pool:
+        try:
+            # Los mapas de generator_linux se envían según se generan, mientras el pool ejecuta los demás
+            for task in itertools.chain(tasks, generated_tasks(args) if use_generator else ()):
+                pending[pool.submit(run_task, task)] = len(records)
+                records.append(None)
+                report(wait(pending, timeout=0)[0])
+            while pending:
+                report(wait(pending, return_when=FIRST_COMPLETED)[0])
+        except KeyboardInterrupt:
+            for future in pending:
+                future.cancel()
+            raise
+    wall = time.perf_counter() - t0
+
+    summary = summarize(records)
+    print_summary(summary, wall, args.jobs)
+    if args.csv:
+        write_csv(records, args.csv)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'jobs': args.jobs, 'seconds': wall,
+                       'records': records, 'summary': summary}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,324 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+
+STAGES = ('lem_in', 'parse', 'build', 'solver', 'distribution', 'validation', 'render')
+GENERATOR_MODES = ('flow-one', 'flow-ten', 'flow-thousand', 'big', 'big-superposition')
+# Cada modo de generator_linux imitado con ant_mapgen: (topología, salas, túneles por sala, hormigas)
+SEEDED_MODES = {
+    'flow-one': ('flow-one', 400, 1.0, 1),
+    'flow-ten': ('flow-one', 450, 1.0, 10),
+    'flow-thousand': ('flow-one', 500, 1.0, 1000),
+    'big': ('big', 2700, 1.3, 350),
+    'big-superposition': ('superposition', 2700, 1.0, 110),
+}
+_REQUIRED_RE = re.compile(r'^#Here is the number of lines required: (\d+)', re.MULTILINE)
+
+
+def required_turns(text: str) -> Optional[int]:
+    """Turnos objetivo de la línea '#Here is the number of lines required: N' del generador"""
+    match = _REQUIRED_RE.search(text)
+    return int(match.group(1)) if match else None
+
+
+def measure(func: Callable, repeat: int = 1, memory: bool = True) -> Tuple[object, float, Optional[int]]:
+    """(resultado, mejor tiempo en s, pico de memoria en KiB)
+
+    El tiempo se toma sin tracemalloc (lo ralentiza varias veces); el pico se
+    mide en una ejecución aparte.
+    """
+    best = None
+    for _ in range(max(repeat, 1)):
+        t0 = time.perf_counter()
+        result = func()
+        elapsed = time.perf_counter() - t0
+        best = elapsed if best is None else min(best, elapsed)
+    peak = None
+    if memory:
+        tracemalloc.start()
+        try:
+            func()
+            peak = tracemalloc.get_traced_memory()[1] >> 10
+        finally:
+            tracemalloc.stop()
+    return result, best, peak
+
+
+def run_lem_in(binary: str, map_text: str, timeout: float = 60) -> Tuple[str, float, int, int]:
+    """Ejecuta lem-in con el mapa por stdin: (salida, segundos, pico RSS en KiB, código de salida)
+
+    Se espera al proceso con os.wait4 para obtener el pico de memoria de ese
+    hijo en concreto (RUSAGE_CHILDREN acumula el máximo de todos).
+    """
+    with tempfile.TemporaryFile() as stdin, tempfile.TemporaryFile() as stdout:
+        stdin.write(map_text.encode())
+        stdin.seek(0)
+        t0 = time.perf_counter()
+        process = subprocess.Popen([binary], stdin=stdin, stdout=stdout, stderr=subprocess.STDOUT)
+        killer = threading.Timer(timeout, process.kill)
+        killer.start()
+        try:
+            _, status, usage = os.wait4(process.pid, 0)
+        finally:
+            killer.cancel()
+        elapsed = time.perf_counter() - t0
+        process.returncode = os.waitstatus_to_exitcode(status)
+        stdout.seek(0)
+        output = stdout.read().decode(errors='replace')
+    return output, elapsed, usage.ru_maxrss, process.returncode
+
+
+def generate_map(generator: str, mode: str) -> str:
+    """Mapa de generator_linux para un modo ('big' -> --big); se siembra con el reloj en segundos"""
+    return subprocess.run([generator, f'--{mode}'], capture_output=True, text=True, check=True).stdout
+
+
+def distinct_maps(generator: str, mode: str, count: int, attempts: int = 3) -> Iterator[str]:
+    """Hasta count mapas distintos de generator_linux; un repetido se descarta y se vuelve a generar
+    en el siguiente segundo del reloj, y tras attempts repetidos seguidos se deja de intentar"""
+    seen = set()
+    repeated = 0
+    while len(seen) < count and repeated < attempts:
+        text = generate_map(generator, mode)
+        digest = hashlib.sha1(text.encode()).digest()
+        if digest in seen:
+            repeated += 1
+            time.sleep(1.01 - time.time() % 1)
+            continue
+        seen.add(digest)
+        repeated = 0
+        yield text
+
+
+def seeded_map(mode: str, seed: int) -> str:
+    """Mapa de ant_mapgen del tamaño de un modo de generator_linux; mismo (mode, seed), mismo mapa"""
+    import ant_mapgen
+    topology, rooms, density, ants = SEEDED_MODES[mode]
+    out = io.StringIO()
+    ant_mapgen.generate(topology, rooms, int(rooms * density), ants, seed).write(out)
+    return out.getvalue()
+
+
+def bench_map(name: str, text: str, stages=STAGES, lem_in: Optional[str] = './lem-in',
+              repeat: int = 1, memory: bool = True, timeout: float = 60) -> dict:
+    """Mide cada etapa del pipeline sobre un mapa; devuelve un registro serializable a JSON"""
+    from ant_distribution import check_paths
+    from ant_solver import solve
+    from ant_validator import validate_stream
+    from ant_visualizer import parse_lem_in_with_simulation
+
+    record = {'map': name, 'required_turns': required_turns(text), 'stages': {}, 'turns': {}}
+    timings = record['stages']
+
+    # La salida de lem-in (mapa + caminos + simulación) alimenta al resto de etapas
+    output = text
+    if 'lem_in' in stages and lem_in and os.path.exists(lem_in):
+        output, seconds, rss, code = run_lem_in(lem_in, text, timeout)
+        timings['lem_in'] = {'seconds': seconds, 'peak_kib': rss}
+        record['exit_code'] = code
+
+    parsed, seconds, peak = measure(
+        lambda: parse_lem_in_with_simulation(io.StringIO(output), build=False), repeat, memory)
+    num_ants, builder, paths, simulation_lines = parsed
+    if 'parse' in stages:
+        timings['parse'] = {'seconds': seconds, 'peak_kib': peak}
+    graph, seconds, peak = measure(builder.build, repeat, memory)
+    if 'build' in stages:
+        timings['build'] = {'seconds': seconds, 'peak_kib': peak}
+    record.update(ants=num_ants, rooms=len(graph), links=graph.edge_count)
+    if simulation_lines:
+        record['turns']['lem_in'] = len(simulation_lines)
+    if record['required_turns'] is not None:
+        record['turns']['required'] = record['required_turns']
+
+    if 'solver' in stages and graph.start >= 0 and graph.end >= 0:
+        (turns, _, _), seconds, peak = measure(lambda: solve(graph, num_ants), repeat, memory)
+        timings['solver'] = {'seconds': seconds, 'peak_kib': peak}
+        record['turns']['optimal'] = turns
+
+    if 'distribution' in stages and paths:
+        report, seconds, peak = measure(lambda: check_paths(paths), repeat, memory)
+        timings['distribution'] = {'seconds': seconds, 'peak_kib': peak}
+        record['turns']['distribution_optimal'] = report['optimal_turns']
+
+    if 'validation' in stages and simulation_lines:
+        result, seconds, peak = measure(lambda: validate_stream(io.StringIO(output)), repeat, memory)
+        timings['validation'] = {'seconds': seconds, 'peak_kib': peak}
+        record['valid'] = result.ok
+        if not result.ok:
+            record['violation'] = result.to_dict()['violation']
+
+    if 'render' in stages and len(graph):
+        import matplotlib
+        matplotlib.use('Agg')
+        import matplotlib.pyplot as plt
+        from ant_render import render_graph
+
+        def render():
+            fig, _ = render_graph(num_ants, graph, paths, interactive=False)
+            fig.savefig(io.BytesIO(), format='png', dpi=50)
+            plt.close(fig)
+
+        # El render es la etapa más lenta: una sola medida de tiempo y memoria
+        _, seconds, peak = measure(render, 1, memory)
+        timings['render'] = {'seconds': seconds, 'peak_kib': peak}
+    return record
+
+
+def group_key(record: dict) -> str:
+    """Clave de comparación: el nombre del mapa, o el modo del generador (mapas aleatorios)"""
+    return record['map'].split('#')[0]
+
+
+def summarize(records: List[dict]) -> Dict[str, dict]:
+    """Mediana por grupo y etapa de segundos y pico de memoria, y de turnos"""
+    groups: Dict[str, List[dict]] = {}
+    for record in records:
+        groups.setdefault(group_key(record), []).append(record)
+
+    def median(values):
+        values = sorted(v for v in values if v is not None)
+        return values[len(values) // 2] if values else None
+
+    summary = {}
+    for key, items in groups.items():
+        stages = {}
+        for stage in STAGES:
+            runs = [r['stages'][stage] for r in items if stage in r['stages']]
+            if runs:
+                stages[stage] = {'seconds': median(r['seconds'] for r in runs),
+                                 'peak_kib': median(r['peak_kib'] for r in runs)}
+        # Exceso de turnos de lem-in sobre el objetivo (generador) o sobre el óptimo
+        excess = [r['turns']['lem_in'] - r['turns'].get('required', r['turns'].get('optimal', 0))
+                  for r in items if 'lem_in' in r['turns']]
+        summary[key] = {'stages': stages, 'turn_excess': median(excess), 'runs': len(items)}
+    return summary
+
+
+def compare(current: dict, baseline: dict, threshold: float = 0.25,
+            min_seconds: float = 0.005) -> List[str]:
+    """Regresiones de current frente a baseline (documentos completos de resultados)
+
+    Una etapa empeora si su mediana de tiempo o de memoria supera la de la
+    línea base en más de threshold (relativo); se ignoran las etapas por debajo
+    de min_seconds, dominadas por el ruido. Cualquier aumento del exceso de
+    turnos también cuenta.
+    """
+    regressions = []
+    base, now = baseline['summary'], current['summary']
+    for key in sorted(set(base) & set(now)):
+        for stage, old in base[key]['stages'].items():
+            new = now[key]['stages'].get(stage)
+            if new is None:
+                continue
+            if old['seconds'] >= min_seconds and new['seconds'] > old['seconds'] * (1 + threshold):
+                regressions.append(f"{key} {stage}: {old['seconds'] * 1000:.1f} ms -> "
+                                   f"{new['seconds'] * 1000:.1f} ms (+{new['seconds'] / old['seconds'] - 1:.0%})")
+            if old['peak_kib'] and new['peak_kib'] and new['peak_kib'] > old['peak_kib'] * (1 + threshold):
+                regressions.append(f"{key} {stage}: {old['peak_kib']} KiB -> {new['peak_kib']} KiB "
+                                   f"(+{new['peak_kib'] / old['peak_kib'] - 1:.0%})")
+        old_excess, new_excess = base[key]['turn_excess'], now[key]['turn_excess']
+        if old_excess is not None and new_excess is not None and new_excess > old_excess:
+            regressions.append(f"{key} turnos: {old_excess:+d} -> {new_excess:+d} sobre el objetivo")
+    return regressions
+
+
+def print_record(record: dict, out=sys.stderr):
+    """Una línea por mapa: tamaño, turnos y milisegundos por etapa"""
+    turns = record['turns']
+    target = turns.get('required', turns.get('optimal'))
+    parts = [f"{record['map']:<28} {record.get('rooms', 0):>6} salas",
+             f"turnos {turns.get('lem_in', '-')}/{target if target is not None else '-'}"]
+    parts += [f"{stage} {timing['seconds'] * 1000:.1f}ms" for stage, timing in record['stages'].items()]
+    if record.get('valid') is False:
+        parts.append("INVÁLIDA")
+    print(' | '.join(parts), file=out)
+
+
+def main(argv=None):
+    """Ejecuta el benchmark y opcionalmente lo compara con una línea base"""
+    parser = argparse.ArgumentParser(
+        description="Benchmark por etapas del pipeline de lem-in sobre maps/ y mapas generados")
+    parser.add_argument('--maps', default='maps', help="directorio de mapas (maps); '' para omitirlo")
+    parser.add_argument('--generate', nargs='*', default=['flow-one', 'big', 'big-superposition'],
+                        choices=GENERATOR_MODES, metavar='MODE',
+                        help="modos de generator_linux sin guiones (flow-one big big-superposition); "
+                             "sin valores no se generan mapas")
+    parser.add_argument('--runs', type=int, default=3, help="mapas generados por modo (3)")
+    parser.add_argument('--generator', default='./generator_linux', help="generador (./generator_linux)")
+    parser.add_argument('--seeded', action='store_true',
+                        help="generar con ant_mapgen en lugar de generator_linux: mismos mapas en cada ejecución")
+    parser.add_argument('--seed', type=int, default=0,
+                        help="con --seeded, semilla del primer mapa de cada modo; el i-ésimo usa seed + i (0)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES),
+                        help="etapas a medir (todas)")
+    parser.add_argument('--repeat', type=int, default=1, help="repeticiones por etapa, se toma la mejor (1)")
+    parser.add_argument('--no-memory', action='store_true', help="no medir el pico de memoria (más rápido)")
+    parser.add_argument('--lem-in', default='./lem-in', help="binario de lem-in (./lem-in)")
+    parser.add_argument('--timeout', type=float, default=60, help="límite por ejecución de lem-in (60 s)")
+    parser.add_argument('-o', '--output', help="fichero JSON de resultados (por defecto stdout)")
+    parser.add_argument('--baseline', help="resultados anteriores con los que comparar")
+    parser.add_argument('--threshold', type=float, default=0.25,
+                        help="empeoramiento relativo que se considera regresión (0.25)")
+    args = parser.parse_args(argv)
+
+    inputs = []
+    if args.maps:
+        for entry in sorted(os.listdir(args.maps)):
+            if entry.endswith('.map'):
+                with open(os.path.join(args.maps, entry)) as f:
+                    inputs.append((entry, f.read()))
+    if args.seeded:
+        # Los mismos mapas en cada ejecución: medianas y --baseline comparan lo mismo
+        for mode in args.generate:
+            for seed in range(args.seed, args.seed + args.runs):
+                inputs.append((f"gen:{mode}#{seed}", seeded_map(mode, seed)))
+    elif args.generate and not os.path.exists(args.generator):
+        print(f"Aviso: {args.generator} no existe, se omiten los mapas generados", file=sys.stderr)
+    else:
+        for mode in args.generate:
+            maps = list(distinct_maps(args.generator, mode, args.runs))
+            if len(maps) < args.runs:
+                print(f"Aviso: {mode}: solo {len(maps)} de {args.runs} mapas distintos", file=sys.stderr)
+            inputs.extend((f"gen:{mode}#{run}", text) for run, text in enumerate(maps))
+
+    records = []
+    for name, text in inputs:
+        record = bench_map(name, text, args.stages, args.lem_in, args.repeat,
+                           not args.no_memory, args.timeout)
+        print_record(record)
+        records.append(record)
+
+    results = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'), 'python': sys.version.split()[0],
+               'records': records, 'summary': summarize(records)}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    else:
+        json.dump(results, sys.stdout, indent=2)
+        print()
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(results, json.load(f), args.threshold)
+        for line in regressions:
+            print(f"REGRESIÓN {line}", file=sys.stderr)
+        if regressions:
+            sys.exit(1)
+        print("Sin regresiones frente a la línea base", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
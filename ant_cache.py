@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import io
+import json
+import mmap
+import os
+import sys
+import time
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from ant_graph import CompactGraph
+from ant_turns import TurnMoves
+from ant_visualizer import LemInStreamParser, Path, parse_lem_in_with_simulation
+
+MAGIC = b'LEMCACH1'            # cambia con el formato: las entradas antiguas cuentan como fallo
+SUFFIX = '.lemc'
+ARRAY_SUFFIX = '.npy'          # arrays derivados (distribuciones de ant_layout), mismo LRU
+ALIGN = 64
+DEFAULT_MAX_BYTES = 256 << 20
+
+# Arrays de una entrada, en el orden en que se escriben
+_GRAPH_ARRAYS = ('xs', 'ys', 'flags', 'edges', 'offsets', 'neighbors')
+_TURN_ARRAYS = ('turn_offsets', 'turn_ants', 'turn_rooms')
+
+
+def default_cache_dir() -> str:
+    """$LEMIN_CACHE_DIR, o lem-in dentro de $XDG_CACHE_HOME (~/.cache)"""
+    base = os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache')
+    return os.environ.get('LEMIN_CACHE_DIR') or os.path.join(base, 'lem-in')
+
+
+def content_key(data: bytes) -> str:
+    """Clave de la entrada: hash de los bytes de la entrada y de la versión del formato"""
+    return hashlib.blake2b(data, digest_size=16, person=MAGIC).hexdigest()
+
+
+class CachedParse:
+    """Resultado de parsear (o cargar de la caché) una salida de lem-in
+
+    graph y moves son los arrays ya construidos: en un acierto son vistas de
+    sólo lectura sobre el fichero mapeado en memoria. lines_read, elapsed y
+    error_line imitan a LemInStreamParser para collect_statistics.
+    """
+    __slots__ = ('key', 'hit', 'num_ants', 'graph', 'paths', 'moves',
+                 'lines_read', 'elapsed', 'error_line')
+
+    def __init__(self, key: str, hit: bool, num_ants: int, graph: CompactGraph, paths: List[Path],
+                 moves: TurnMoves, lines_read: int, elapsed: float, error_line: Optional[str]):
+        self.key = key
+        self.hit = hit
+        self.num_ants = num_ants
+        self.graph = graph
+        self.paths = paths
+        self.moves = moves
+        self.lines_read = lines_read
+        self.elapsed = elapsed
+        self.error_line = error_line
+
+    @property
+    def lines_per_second(self) -> float:
+        return self.lines_read / self.elapsed if self.elapsed > 0 else 0.0
+
+
+def _aligned(n: int) -> int:
+    return -(-n // ALIGN) * ALIGN
+
+
+def write_entry(path: str, entry: CachedParse):
+    """Escribe la entrada: MAGIC, longitud y cabecera JSON, y los arrays alineados a ALIGN bytes
+
+    Se escribe en un temporal y se renombra: un lector concurrente ve la
+    entrada completa o ninguna.
+    """
+    graph, moves = entry.graph, entry.moves
+    arrays = [('names', np.frombuffer('\n'.join(graph.names).encode(), dtype=np.uint8))]
+    arrays += [(name, np.ascontiguousarray(getattr(graph, name))) for name in _GRAPH_ARRAYS]
+    arrays += [(name, np.ascontiguousarray(array)) for name, array in
+               zip(_TURN_ARRAYS, (moves.offsets, moves.ants, moves.rooms))]
+
+    table, offset = {}, 0
+    for name, array in arrays:
+        table[name] = [array.dtype.str, list(array.shape), offset]
+        offset = _aligned(offset + array.nbytes)
+    header = json.dumps({
+        'num_ants': entry.num_ants,
+        'rooms': len(graph),
+        'link_lines': graph.link_lines,
+        'invalid_links': graph.invalid_links,
+        'paths': [[p.path_num, p.ant_count, p.nodes] for p in entry.paths],
+        'unknown_rooms': moves.unknown_rooms,
+        'error_line': entry.error_line,
+        'lines_read': entry.lines_read,
+        'arrays': table,
+    }, separators=(',', ':')).encode()
+    base = _aligned(len(MAGIC) + 8 + len(header))
+
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(MAGIC + len(header).to_bytes(8, 'little') + header)
+            for name, array in arrays:
+                f.seek(base + table[name][2])
+                f.write(array.tobytes())
+            f.truncate(base + offset)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def read_entry(path: str, key: str = '') -> CachedParse:
+    """Mapea la entrada en memoria; los arrays son vistas sobre el mapeo, sin copias"""
+    t0 = time.perf_counter()
+    with open(path, 'rb') as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[:len(MAGIC)] != MAGIC:
+        raise ValueError(f"{path}: no es una entrada de caché de esta versión")
+    start = len(MAGIC) + 8
+    size = int.from_bytes(mapped[len(MAGIC):start], 'little')
+    header = json.loads(mapped[start:start + size])
+    base = _aligned(start + size)
+
+    arrays = {}
+    for name, (dtype, shape, offset) in header['arrays'].items():
+        dtype = np.dtype(dtype)
+        count = int(np.prod(shape))
+        if base + offset + count * dtype.itemsize > len(mapped):
+            raise ValueError(f"{path}: entrada truncada")
+        arrays[name] = np.frombuffer(mapped, dtype=dtype, count=count, offset=base + offset).reshape(shape)
+
+    names = bytes(arrays.pop('names')).decode().split('\n') if header['rooms'] else []
+    graph = CompactGraph(names, dict(zip(names, range(len(names)))),
+                         arrays['xs'], arrays['ys'], arrays['flags'], arrays['edges'],
+                         header['link_lines'], header['invalid_links'],
+                         csr=(arrays['offsets'], arrays['neighbors']))
+    moves = TurnMoves(arrays['turn_offsets'], arrays['turn_ants'], arrays['turn_rooms'],
+                      header['unknown_rooms'])
+    paths = [Path(num, ants, nodes) for num, ants, nodes in header['paths']]
+    return CachedParse(key, True, header['num_ants'], graph, paths, moves, header['lines_read'],
+                       time.perf_counter() - t0, header['error_line'])
+
+
+def parse_bytes(data: bytes, key: str = '') -> CachedParse:
+    """Parsea la salida de lem-in completa: grafo en arrays y turnos decodificados"""
+    t0 = time.perf_counter()
+    parser = LemInStreamParser(io.StringIO(data.decode()))
+    num_ants, graph, paths, moves = parse_lem_in_with_simulation(parser=parser, encode=True)
+    return CachedParse(key, False, num_ants, graph, paths, moves, parser.lines_read,
+                       time.perf_counter() - t0, parser.error_line)
+
+
+class ParseCache:
+    """Caché en disco de salidas de lem-in parseadas, direccionada por contenido
+
+    Cada entrada es un fichero <hash>.lemc con el grafo (salas, coordenadas,
+    CSR, inicio/fin), los caminos y los turnos codificados; los arrays
+    derivados (<clave>.npy) comparten directorio y límite. La fecha de
+    modificación hace de marca LRU: se actualiza en cada acierto y, al
+    superar max_bytes, se borran primero las entradas más antiguas.
+    """
+
+    def __init__(self, directory: Optional[str] = None, max_bytes: int = DEFAULT_MAX_BYTES):
+        self.directory = directory or default_cache_dir()
+        self.max_bytes = max_bytes
+
+    def path_for(self, key: str) -> str:
+        return os.path.join(self.directory, key + SUFFIX)
+
+    def get(self, key: str) -> Optional[CachedParse]:
+        """Entrada de la clave o None; una entrada ilegible se descarta"""
+        path = self.path_for(key)
+        try:
+            entry = read_entry(path, key)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError, TypeError):
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry
+
+    def get_array(self, key: str) -> Optional[np.ndarray]:
+        """Array guardado con put_array (mapeado en memoria, sólo lectura) o None"""
+        path = os.path.join(self.directory, key + ARRAY_SUFFIX)
+        try:
+            array = np.load(path, mmap_mode='r', allow_pickle=False)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError):
+            self._remove(path)
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return array
+
+    def put_array(self, key: str, array: np.ndarray):
+        """Guarda un array asociado a key y aplica el límite de tamaño"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = os.path.join(self.directory, key + ARRAY_SUFFIX)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        try:
+            with open(tmp, 'wb') as f:
+                np.save(f, array, allow_pickle=False)
+            os.replace(tmp, path)
+        except BaseException:
+            self._remove(tmp)
+            raise
+        self.evict()
+
+    def put(self, entry: CachedParse) -> bool:
+        """Guarda la entrada y aplica el límite de tamaño; False si no cabe y se descarta"""
+        os.makedirs(self.directory, exist_ok=True)
+        path = self.path_for(entry.key)
+        write_entry(path, entry)
+        kept = os.path.getsize(path) <= self.max_bytes
+        if not kept:
+            # Una sola entrada mayor que el límite no se conserva
+            self._remove(path)
+        self.evict()
+        return kept
+
+    def load(self, data: bytes) -> CachedParse:
+        """Carga la entrada de estos bytes, o los parsea y la guarda"""
+        key = content_key(data)
+        entry = self.get(key)
+        if entry is None:
+            entry = parse_bytes(data, key)
+            try:
+                self.put(entry)
+            except OSError as e:
+                # Sin caché escribible se sigue con el resultado en memoria
+                print(f"Aviso: no se pudo guardar en la caché ({e})", file=sys.stderr)
+        return entry
+
+    def load_input(self, input_path: Optional[str] = None) -> CachedParse:
+        """load() del fichero indicado o de stdin"""
+        if input_path:
+            with open(input_path, 'rb') as f:
+                data = f.read()
+        else:
+            data = sys.stdin.buffer.read()
+        return self.load(data)
+
+    def entries(self) -> List[Tuple[str, int, float]]:
+        """(ruta, bytes, última modificación) de cada entrada, de la más antigua a la más reciente"""
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        found = []
+        for name in names:
+            if name.endswith((SUFFIX, ARRAY_SUFFIX)):
+                path = os.path.join(self.directory, name)
+                try:
+                    st = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                found.append((path, st.st_size, st.st_mtime_ns))
+        return sorted(found, key=lambda e: e[2])
+
+    def total_bytes(self) -> int:
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self) -> int:
+        """Borra las entradas menos usadas hasta quedar por debajo de max_bytes; devuelve cuántas"""
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        removed = 0
+        for path, size, _ in entries:
+            if total <= self.max_bytes:
+                break
+            self._remove(path)
+            total -= size
+            removed += 1
+        return removed
+
+    def invalidate(self, data: bytes) -> bool:
+        """Borra la entrada de estos bytes y las distribuciones de su grafo; True si había algo
+
+        Las distribuciones (ant_layout) van por topología: se borran las del
+        grafo y las del grafo reducido (--simplify), las compartan o no con
+        otras entradas. Sin la entrada en la caché hay que parsear los bytes.
+        """
+        from ant_layout import topology_key
+        from ant_reduce import reduce_graph
+        key = content_key(data)
+        entry = self.get(key)
+        graph = (entry if entry is not None else parse_bytes(data, key)).graph
+        removed = self._remove(self.path_for(key))
+        prefixes = {topology_key(graph)}
+        if len(graph):
+            prefixes.add(topology_key(reduce_graph(graph).graph))
+        for path, _, _ in self.entries():
+            name = os.path.basename(path)
+            if name.endswith(ARRAY_SUFFIX) and name.split('-', 1)[0] in prefixes:
+                removed = self._remove(path) or removed
+        return removed
+
+    def clear(self) -> int:
+        """Borra todas las entradas (y temporales huérfanos); devuelve cuántas entradas había"""
+        removed = 0
+        for path, _, _ in self.entries():
+            removed += self._remove(path)
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                if name.endswith('.tmp'):
+                    self._remove(os.path.join(self.directory, name))
+        return removed
+
+    @staticmethod
+    def _remove(path: str) -> bool:
+        try:
+            os.remove(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+
+def _parse_size(text: str) -> int:
+    """Tamaño con sufijo opcional K, M o G (en potencias de 1024)"""
+    units = {'K': 1 << 10, 'M': 1 << 20, 'G': 1 << 30}
+    text = text.strip().upper().rstrip('B')
+    if text and text[-1] in units:
+        return int(float(text[:-1]) * units[text[-1]])
+    return int(text)
+
+
+def main(argv=None):
+    """Gestiona la caché de salidas parseadas: info, warm, invalidate y clear"""
+    parser = argparse.ArgumentParser(description="Caché binaria de mapas y salidas de lem-in parseados")
+    parser.add_argument('action', choices=['info', 'warm', 'invalidate', 'clear'],
+                        help="info: entradas y tamaño; warm: parsea y guarda las entradas; "
+                             "invalidate: borra las entradas de esos ficheros; clear: vacía la caché")
+    parser.add_argument('inputs', nargs='*', help="mapas o salidas de lem-in (warm / invalidate)")
+    parser.add_argument('--dir', help=f"directorio de la caché (por defecto {default_cache_dir()})")
+    parser.add_argument('--max-size', type=_parse_size, default=DEFAULT_MAX_BYTES,
+                        help="límite de tamaño antes de expulsar entradas LRU (256M)")
+    args = parser.parse_args(argv)
+    cache = ParseCache(args.dir, args.max_size)
+
+    if args.action in ('warm', 'invalidate') and not args.inputs:
+        parser.error(f"{args.action} necesita al menos un fichero")
+    if args.action == 'info':
+        entries = cache.entries()
+        print(f"Caché: {cache.directory}")
+        print(f"Entradas: {len(entries)} | {sum(e[1] for e in entries) / (1 << 20):.1f} MiB "
+              f"de {args.max_size / (1 << 20):.0f} MiB")
+    elif args.action == 'clear':
+        print(f"Borradas {cache.clear()} entradas de {cache.directory}")
+    else:
+        for name in args.inputs:
+            with open(name, 'rb') as f:
+                data = f.read()
+            if args.action == 'invalidate':
+                print(f"{name}: {'borrada' if cache.invalidate(data) else 'no estaba en la caché'}")
+                continue
+            key = content_key(data)
+            entry = cache.get(key)
+            if entry is not None:
+                state = 'acierto'
+            else:
+                entry = parse_bytes(data, key)
+                state = 'guardada' if cache.put(entry) else 'no guardada (mayor que --max-size)'
+            print(f"{name}: {state} ({entry.elapsed * 1000:.1f} ms, "
+                  f"{len(entry.graph)} salas, {entry.moves.turn_count} turnos)")
+
+
+if __name__ == "__main__":
+    main()
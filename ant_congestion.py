@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+
+import argparse
+import csv
+import os
+import sys
+import time
+from typing import TYPE_CHECKING, Dict, Iterator, List, Optional, Union
+
+import numpy as np
+
+from ant_graph import CompactGraph
+from ant_turns import TurnMoves, decode_turns, load_turns
+
+if TYPE_CHECKING:
+    from ant_visualizer import Path
+
+METRICS = ('ant_turns', 'waits', 'peak', 'entries')
+
+
+class CongestionReport:
+    """Ocupación y tráfico de una simulación, calculados sobre los movimientos decodificados
+
+    - por sala (arrays de len(graph)): entries (hormigas que entran), ant_turns
+      (suma de turnos que pasa cada hormiga), waits (turnos sin moverse fuera de
+      ##end, es decir, colas), busy (turnos con alguna hormiga) y peak (máximo a la vez)
+    - runs: ocupación como tramos constantes; la sala run_room tiene run_ants
+      hormigas tras los turnos run_first..run_last (turno 0: estado inicial)
+    - traffic: hormigas que cruzan cada túnel (alineado con graph.edges);
+      stray_moves son movimientos entre salas sin túnel
+    - departure, arrival: turno de salida de ##start y de llegada a ##end de
+      cada hormiga (índice = hormiga - 1; -1 si no sale o no llega)
+    - lanes: hormigas agrupadas por la primera sala tras ##start (un camino;
+      lane_path es su path_num si coincide con un camino impreso, si no -1)
+    """
+    __slots__ = ('graph', 'num_ants', 'turns', 'moves', 'entries', 'ant_turns', 'waits', 'busy', 'peak',
+                 'run_room', 'run_first', 'run_last', 'run_ants', 'traffic', 'stray_moves',
+                 'departure', 'arrival', 'first_room', 'lane_room', 'lane_path', 'lane_ants', 'lane_arrived',
+                 'lane_length', 'lane_first', 'lane_last', 'lane_active', 'lane_transit', 'elapsed')
+
+    def room_metric(self, metric: str) -> np.ndarray:
+        if metric not in METRICS:
+            raise ValueError(f"métrica desconocida: {metric} (opciones: {', '.join(METRICS)})")
+        return getattr(self, metric)
+
+    def occupancy(self, rooms: Optional[np.ndarray] = None) -> np.ndarray:
+        """Hormigas en cada sala tras cada turno: array (len(rooms), turns + 1)"""
+        n = len(self.graph)
+        rooms = np.arange(n) if rooms is None else np.asarray(rooms, dtype=np.int64)
+        row = np.full(n, -1, dtype=np.int64)
+        row[rooms] = np.arange(len(rooms))
+        keep = row[self.run_room] >= 0
+        r = row[self.run_room[keep]]
+        width = self.turns + 2
+        diff = np.bincount(r * width + self.run_first[keep], weights=self.run_ants[keep],
+                           minlength=len(rooms) * width)
+        diff -= np.bincount(r * width + self.run_last[keep] + 1, weights=self.run_ants[keep],
+                            minlength=len(rooms) * width)
+        table = np.cumsum(diff.reshape(len(rooms), width), axis=1)[:, :-1]
+        return table.astype(np.int32)
+
+    def lane_rows(self) -> Iterator[Dict]:
+        """Una fila por camino: hormigas, longitud, throughput (llegadas por turno) e inactividad"""
+        names = self.graph.names
+        for k in range(len(self.lane_room)):
+            first, last = int(self.lane_first[k]), int(self.lane_last[k])
+            span = last - first + 1
+            yield {
+                'path': int(self.lane_path[k]), 'first_room': names[self.lane_room[k]],
+                'ants': int(self.lane_ants[k]), 'arrived': int(self.lane_arrived[k]),
+                'length': int(self.lane_length[k]), 'first_turn': first, 'last_turn': last,
+                'throughput': self.lane_arrived[k] / span, 'idle_turns': span - int(self.lane_active[k]),
+                'mean_transit': float(self.lane_transit[k]),
+            }
+
+    def summary(self) -> dict:
+        arrived = self.arrival >= 0
+        return {
+            'ants': self.num_ants, 'turns': self.turns, 'moves': self.moves,
+            'arrived': int(arrived.sum()),
+            'last_arrival': int(self.arrival.max()) if arrived.any() else -1,
+            'stray_moves': self.stray_moves, 'seconds': self.elapsed,
+        }
+
+
+def _reduce_groups(values: np.ndarray, groups: np.ndarray, count: int, reduce) -> np.ndarray:
+    """reduce (ufunc) de values por grupo 0..count-1; 0 en los grupos vacíos"""
+    out = np.zeros(count, dtype=np.int64)
+    if len(values):
+        order = np.argsort(groups, kind='stable')
+        sorted_groups = groups[order]
+        starts = np.flatnonzero(np.concatenate(([True], sorted_groups[1:] != sorted_groups[:-1])))
+        out[sorted_groups[starts]] = reduce.reduceat(values[order], starts)
+    return out
+
+
+def analyze(graph: CompactGraph, num_ants: int, moves: Union[TurnMoves, List[str]],
+            paths: Optional[List['Path']] = None) -> CongestionReport:
+    """Calcula la congestión de una simulación completa sin tabla densa de posiciones
+
+    La tabla (turnos + 1, hormigas) no cabe con 100k hormigas y miles de
+    turnos; todo sale de los movimientos ordenados por (hormiga, turno): cada
+    movimiento abre una estancia en su sala que dura hasta el siguiente de la
+    misma hormiga. moves puede ser TurnMoves o las líneas de turno.
+    """
+    t0 = time.perf_counter()
+    if not isinstance(moves, TurnMoves):
+        moves = decode_turns(moves, graph.index)
+    n, turns = len(graph), moves.turn_count
+    start, end = graph.start, graph.end
+    ants = moves.ants.astype(np.int64)
+    rooms = moves.rooms.astype(np.int64)
+    turn = moves.turn_ids().astype(np.int64) + 1
+    num_ants = max(num_ants, int(ants.max()) if len(ants) else 0)
+    valid = (ants >= 1) & (ants <= num_ants) & (rooms >= 0)
+    ants, rooms, turn = ants[valid], rooms[valid], turn[valid]
+
+    # Orden por (hormiga, turno): los movimientos ya vienen por turno, basta un orden estable
+    by_ant = np.argsort(ants, kind='stable')
+    ants, rooms, turn = ants[by_ant], rooms[by_ant], turn[by_ant]
+    same_ant = np.zeros(len(ants), dtype=bool)
+    same_ant[1:] = ants[1:] == ants[:-1]
+    first = ~same_ant
+    prev = np.where(same_ant, np.roll(rooms, 1), start)
+    next_turn = np.full(len(turn), turns + 1, dtype=np.int64)
+    has_next = np.zeros(len(ants), dtype=bool)
+    has_next[:-1] = same_ant[1:]
+    next_turn[has_next] = turn[1:][same_ant[1:]]
+
+    departure = np.full(num_ants, -1, dtype=np.int64)
+    departure[ants[first] - 1] = turn[first]
+    first_room = np.full(num_ants, -1, dtype=np.int64)
+    first_room[ants[first] - 1] = rooms[first]
+    arrival = np.full(num_ants, -1, dtype=np.int64)
+    at_end = rooms == end
+    arrival[ants[at_end] - 1] = turn[at_end]
+
+    # Estancias: la espera inicial en ##start y una por movimiento, [entrada, salida)
+    stay_room, stay_in, stay_out = rooms, turn, next_turn
+    if start >= 0:
+        stay_room = np.concatenate((np.full(num_ants, start, dtype=np.int64), rooms))
+        stay_in = np.concatenate((np.zeros(num_ants, dtype=np.int64), turn))
+        stay_out = np.concatenate((np.where(departure >= 0, departure, turns + 1), next_turn))
+    length = stay_out - stay_in
+    entries = np.bincount(rooms, minlength=n).astype(np.int64)
+    ant_turns = np.bincount(stay_room, weights=length, minlength=n).astype(np.int64)
+    waits = np.bincount(stay_room, weights=np.maximum(length - 1, 0), minlength=n).astype(np.int64)
+    if end >= 0:
+        waits[end] = 0
+
+    # Tramos de ocupación constante: +1/-1 por estancia, ordenados por (sala, turno)
+    width = turns + 2
+    keys = np.concatenate((stay_room * width + stay_in, stay_room * width + stay_out))
+    delta = np.concatenate((np.ones(len(stay_in), dtype=np.int64), -np.ones(len(stay_out), dtype=np.int64)))
+    order = np.argsort(keys)
+    keys, running = keys[order], np.cumsum(delta[order])
+    last = np.ones(len(keys), dtype=bool)
+    last[:-1] = keys[1:] != keys[:-1]
+    keys, running = keys[last], running[last]
+    # Cada sala vuelve a 0 en su último evento: un tramo no vacío siempre tiene siguiente
+    at = np.flatnonzero(running > 0)
+    run_room, run_first = keys[at] // width, keys[at] % width
+    run_last = keys[at + 1] % width - 1
+    run_ants = running[at]
+    busy = np.bincount(run_room, weights=run_last - run_first + 1, minlength=n).astype(np.int64)
+    peak = np.zeros(n, dtype=np.int64)
+    if len(run_room):
+        starts = np.flatnonzero(np.concatenate(([True], run_room[1:] != run_room[:-1])))
+        peak[run_room[starts]] = np.maximum.reduceat(run_ants, starts)
+
+    # Tráfico por túnel: clave no dirigida min * n + max buscada entre las de graph.edges
+    edges = graph.edges.astype(np.int64)
+    traffic = np.zeros(len(edges), dtype=np.int64)
+    stray = int(np.count_nonzero(prev < 0))
+    crossing = prev >= 0
+    if len(edges) and crossing.any():
+        edge_keys = np.minimum(edges[:, 0], edges[:, 1]) * n + np.maximum(edges[:, 0], edges[:, 1])
+        edge_order = np.argsort(edge_keys, kind='stable')
+        sorted_keys = edge_keys[edge_order]
+        a, b = prev[crossing], rooms[crossing]
+        move_keys = np.minimum(a, b) * n + np.maximum(a, b)
+        hit = np.minimum(np.searchsorted(sorted_keys, move_keys), len(sorted_keys) - 1)
+        found = sorted_keys[hit] == move_keys
+        traffic = np.bincount(edge_order[hit[found]], minlength=len(edges)).astype(np.int64)
+        stray += int(np.count_nonzero(~found))
+    elif crossing.any():
+        stray += int(np.count_nonzero(crossing))
+
+    # Carriles: hormigas agrupadas por su primera sala (los caminos son disjuntos)
+    departed = np.flatnonzero(first_room >= 0)
+    lane_room, lane_of = np.unique(first_room[departed], return_inverse=True)
+    k = len(lane_room)
+    lane_ants = np.bincount(lane_of, minlength=k)
+    reached = arrival[departed] >= 0
+    lane_arrived = np.bincount(lane_of[reached], minlength=k)
+    lane_transit = np.bincount(lane_of[reached], weights=(arrival - departure)[departed][reached] + 1,
+                               minlength=k) / np.maximum(lane_arrived, 1)
+    steps = np.bincount(ants, minlength=num_ants + 1)[1:]
+    # Longitud del camino: movimientos de las hormigas que llegan (esperar no añade movimientos)
+    lane_length = _reduce_groups(steps[departed][reached], lane_of[reached], k, np.minimum)
+    lane_first = _reduce_groups(departure[departed], lane_of, k, np.minimum)
+    move_lane = np.full(num_ants + 1, -1, dtype=np.int64)
+    move_lane[departed + 1] = lane_of
+    move_lane = move_lane[ants]
+    lane_last = _reduce_groups(turn, move_lane, k, np.maximum)
+    active = np.unique(move_lane * width + turn) // width
+    lane_active = np.bincount(active, minlength=k)
+    lane_path = np.full(k, -1, dtype=np.int64)
+    for path in paths or []:
+        indices = graph.indices_of(path.nodes)
+        if len(indices) > 1:
+            at_lane = np.searchsorted(lane_room, indices[1])
+            if at_lane < k and lane_room[at_lane] == indices[1]:
+                lane_path[at_lane] = path.path_num
+
+    report = CongestionReport()
+    report.graph, report.num_ants, report.turns, report.moves = graph, num_ants, turns, moves.move_count
+    report.entries, report.ant_turns, report.waits, report.busy, report.peak = entries, ant_turns, waits, busy, peak
+    report.run_room, report.run_first, report.run_last, report.run_ants = run_room, run_first, run_last, run_ants
+    report.traffic, report.stray_moves = traffic, stray
+    report.departure, report.arrival, report.first_room = departure, arrival, first_room
+    report.lane_room, report.lane_path, report.lane_ants = lane_room, lane_path, lane_ants
+    report.lane_arrived, report.lane_length, report.lane_first = lane_arrived, lane_length, lane_first
+    report.lane_last, report.lane_active, report.lane_transit = lane_last, lane_active, lane_transit
+    report.elapsed = time.perf_counter() - t0
+    return report
+
+
+def write_csv(report: CongestionReport, directory: str) -> List[str]:
+    """Escribe rooms, tunnels, paths, ants y occupancy (.csv) en directory; devuelve las rutas"""
+    os.makedirs(directory, exist_ok=True)
+    graph = report.graph
+    names = graph.names
+    tables = {
+        'rooms.csv': (('room', 'x', 'y', 'entries', 'ant_turns', 'waits', 'busy_turns', 'peak'),
+                      zip(names, graph.xs.tolist(), graph.ys.tolist(), report.entries.tolist(),
+                          report.ant_turns.tolist(), report.waits.tolist(), report.busy.tolist(),
+                          report.peak.tolist())),
+        'tunnels.csv': (('room_a', 'room_b', 'traffic'),
+                        ((names[a], names[b], t) for (a, b), t in zip(graph.edges.tolist(),
+                                                                       report.traffic.tolist()))),
+        'paths.csv': (('path', 'first_room', 'ants', 'arrived', 'length', 'first_turn', 'last_turn',
+                       'throughput', 'idle_turns', 'mean_transit'),
+                      (tuple(row.values()) for row in report.lane_rows())),
+        'ants.csv': (('ant', 'first_room', 'departure', 'arrival'),
+                     ((i, names[r] if r >= 0 else '', d, a) for i, (r, d, a) in enumerate(
+                         zip(report.first_room.tolist(), report.departure.tolist(), report.arrival.tolist()),
+                         start=1))),
+        'occupancy.csv': (('room', 'first_turn', 'last_turn', 'ants'),
+                          ((names[r], f, l, c) for r, f, l, c in zip(
+                              report.run_room.tolist(), report.run_first.tolist(), report.run_last.tolist(),
+                              report.run_ants.tolist()))),
+    }
+    written = []
+    for filename, (header, rows) in tables.items():
+        path = os.path.join(directory, filename)
+        with open(path, 'w', newline='') as f:
+            writer = csv.writer(f)
+            writer.writerow(header)
+            writer.writerows(rows)
+        written.append(path)
+    return written
+
+
+def main(argv=None):
+    """Informe de congestión de una salida de lem-in (salas, túneles y caminos)"""
+    parser = argparse.ArgumentParser(description="Ocupación y tráfico por sala, túnel y camino de una simulación")
+    parser.add_argument('input', nargs='?', help="salida de lem-in (por defecto stdin)")
+    parser.add_argument('--csv', metavar='DIR', help="escribe rooms, tunnels, paths, ants y occupancy .csv en DIR")
+    parser.add_argument('--top', type=int, default=10, help="salas y túneles más cargados que se listan (10)")
+    parser.add_argument('--metric', choices=METRICS, default='ant_turns',
+                        help="métrica para ordenar las salas (ant_turns)")
+    parser.add_argument('--turns-file', metavar='FILE',
+                        help="turnos ya codificados (ant_validator --save-turns); si no existe se crea")
+    args = parser.parse_args(argv)
+
+    from ant_visualizer import parse_lem_in_with_simulation
+    moves = spill = None
+    if args.turns_file:
+        if os.path.exists(args.turns_file):
+            moves = load_turns(args.turns_file)
+        else:
+            spill = args.turns_file
+    stream = open(args.input) if args.input else sys.stdin
+    try:
+        num_ants, graph, paths, simulation_lines = parse_lem_in_with_simulation(
+            stream, encode=True, spill=spill, moves=moves)
+    except ValueError as e:
+        sys.exit(f"ERROR: {args.turns_file}: {e}")
+    finally:
+        if args.input:
+            stream.close()
+    if not simulation_lines:
+        sys.exit("ERROR: la entrada no contiene simulación")
+
+    report = analyze(graph, num_ants, simulation_lines, paths)
+    s = report.summary()
+    print(f"{s['ants']} hormigas, {s['turns']} turnos, {s['moves']} movimientos | {s['arrived']} llegan a ##end "
+          f"(última en el turno {s['last_arrival']}) | análisis en {s['seconds'] * 1000:.0f} ms")
+    if s['stray_moves']:
+        print(f"WARNING: {s['stray_moves']} movimiento(s) sin túnel")
+
+    names = graph.names
+    inner = np.ones(len(graph), dtype=bool)
+    inner[[i for i in (graph.start, graph.end) if i >= 0]] = False
+    values = report.room_metric(args.metric)
+    top = [i for i in np.argsort(-np.where(inner, values, -1), kind='stable')[:args.top].tolist() if values[i] > 0]
+    if top:
+        print(f"\nSalas más cargadas ({args.metric}):")
+        for i in top:
+            print(f"  {names[i]:<12} entradas {report.entries[i]:>7} | hormiga-turnos {report.ant_turns[i]:>7} "
+                  f"| esperas {report.waits[i]:>6} | pico {report.peak[i]}")
+    busiest = [e for e in np.argsort(-report.traffic, kind='stable')[:args.top].tolist() if report.traffic[e] > 0]
+    if busiest:
+        print("\nTúneles con más tráfico:")
+        for e in busiest:
+            a, b = graph.edges[e].tolist()
+            print(f"  {names[a]}-{names[b]}: {report.traffic[e]} hormigas")
+    rows = list(report.lane_rows())
+    if rows:
+        print("\nCaminos (por primera sala):")
+        for row in rows:
+            label = f"camino {row['path']}" if row['path'] >= 0 else "sin camino impreso"
+            print(f"  {row['first_room']:<12} {label:<18} {row['ants']:>7} hormigas, longitud {row['length']:>4} | "
+                  f"turnos {row['first_turn']}-{row['last_turn']} | {row['throughput']:.2f} llegadas/turno | "
+                  f"{row['idle_turns']} turnos inactivo")
+    if args.csv:
+        written = write_csv(report, args.csv)
+        print(f"\n>> CSV: {', '.join(written)}")
+
+
+if __name__ == "__main__":
+    main()
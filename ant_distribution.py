@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+from typing import TYPE_CHECKING, List, Sequence, Tuple
+
+if TYPE_CHECKING:
+    from ant_visualizer import Path
+
+# Sin numpy: se usa desde el modo de estadísticas del visualizador
+
+
+def optimal_turns(lengths: Sequence[int], num_ants: int) -> Tuple[int, int]:
+    """Turnos mínimos para num_ants sobre caminos disjuntos de estas longitudes (en túneles)
+
+    Llenado por niveles ("water-filling"): con los k caminos más cortos, el
+    camino i recibe T - l_i + 1 hormigas y el menor T válido es
+    ceil((hormigas + sum(l_i - 1)) / k). Devuelve (turnos, k caminos usados)
+    en O(P log P), independiente del número de hormigas.
+    """
+    if num_ants <= 0 or not lengths:
+        return 0, 0
+    ordered = sorted(lengths)
+    if ordered[0] <= 1:
+        # Túnel directo ##start-##end: todas las hormigas en un único turno
+        return 1, 1
+    best = (None, 0)
+    total = 0
+    for k, length in enumerate(ordered, 1):
+        total += length - 1
+        turns = -(-(num_ants + total) // k)
+        if turns < length:
+            # El camino k no recibiría hormigas: los siguientes (más largos) tampoco
+            break
+        if best[0] is None or turns < best[0]:
+            best = (turns, k)
+    return best
+
+
+def optimal_distribution(lengths: Sequence[int], num_ants: int) -> Tuple[int, List[int]]:
+    """Turnos óptimos y hormigas por camino (en el orden de lengths)"""
+    turns, used = optimal_turns(lengths, num_ants)
+    ants = [0] * len(lengths)
+    if not used:
+        return turns, ants
+    order = sorted(range(len(lengths)), key=lambda i: lengths[i])
+    if lengths[order[0]] <= 1:
+        ants[order[0]] = num_ants
+        return turns, ants
+    for i in order[:used]:
+        ants[i] = turns - lengths[i] + 1
+    # Quitar el sobrante empezando por los caminos más largos (no alargan el final)
+    excess = sum(ants) - num_ants
+    for i in reversed(order[:used]):
+        if excess <= 0:
+            break
+        take = min(excess, ants[i] - 1)
+        ants[i] -= take
+        excess -= take
+    return turns, ants
+
+
+def distribution_turns(lengths: Sequence[int], ants: Sequence[int]) -> int:
+    """Turnos que tarda un reparto concreto: la última hormiga del camino i llega en l_i - 1 + a_i"""
+    if any(length <= 1 and count > 0 for length, count in zip(lengths, ants)):
+        return 1
+    return max((length - 1 + count for length, count in zip(lengths, ants) if count > 0), default=0)
+
+
+def check_paths(paths: List['Path']) -> dict:
+    """Compara el reparto impreso por lem-in (Path.ant_count) con el óptimo para esos caminos"""
+    lengths = [len(path.nodes) - 1 for path in paths]
+    assigned = [path.ant_count for path in paths]
+    num_ants = sum(assigned)
+    turns = distribution_turns(lengths, assigned)
+    best, optimal = optimal_distribution(lengths, num_ants)
+    return {
+        'ants': num_ants,
+        'turns': turns,
+        'optimal_turns': best,
+        'gap': turns - best,
+        'assigned': assigned,
+        'optimal_assigned': optimal,
+    }
+
+
+def main(argv=None):
+    """Turnos óptimos para N hormigas a partir de longitudes o de una salida de lem-in"""
+    parser = argparse.ArgumentParser(
+        description="Reparto óptimo de hormigas y turnos a partir de las longitudes de los caminos")
+    parser.add_argument('input', nargs='?', help="salida de lem-in con líneas 'path num:' (por defecto stdin)")
+    parser.add_argument('--lengths', type=int, nargs='+', help="longitudes de los caminos en túneles")
+    parser.add_argument('--ants', type=int, nargs='+', help="número(s) de hormigas a evaluar")
+    args = parser.parse_args(argv)
+
+    if args.lengths:
+        lengths = args.lengths
+        ant_counts = args.ants or []
+    else:
+        from ant_visualizer import parse_lem_in_with_simulation
+        stream = open(args.input) if args.input else sys.stdin
+        try:
+            num_ants, _, paths, _ = parse_lem_in_with_simulation(stream, build=False)
+        finally:
+            if args.input:
+                stream.close()
+        if not paths:
+            sys.exit("ERROR: la entrada no contiene líneas 'path num:'")
+        lengths = [len(path.nodes) - 1 for path in paths]
+        ant_counts = args.ants or []
+        report = check_paths(paths)
+        print(f"Reparto de lem-in: {report['turns']} turnos | óptimo: {report['optimal_turns']} "
+              f"turnos (+{report['gap']})")
+        print(f"   Actual:  {report['assigned']}")
+        print(f"   Óptimo:  {report['optimal_assigned']}")
+
+    for n in ant_counts:
+        turns, used = optimal_turns(lengths, n)
+        print(f"{n} hormigas: {turns} turnos usando {used} de {len(lengths)} caminos")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+
+from array import array
+from typing import Dict, List, Optional, Tuple
+
+# numpy se importa dentro de las funciones: GraphBuilder sirve para el modo
+# de sólo estadísticas sin pagar el coste de importarlo
+
+FLAG_START = 1
+FLAG_END = 2
+
+
+class CompactGraph:
+    """Grafo de lem-in respaldado por arrays (sin un objeto por sala o túnel)
+
+    - names / index: nombre <-> índice entero de sala
+    - xs, ys: coordenadas (int32)
+    - flags: máscara de bits FLAG_START / FLAG_END (uint8)
+    - edges: túneles válidos en orden de entrada, array (m, 2) de índices
+    - offsets, neighbors: adyacencia CSR sin duplicados; los vecinos de la sala i
+      son neighbors[offsets[i]:offsets[i + 1]] (se calcula si no se pasa csr)
+    """
+    __slots__ = ('names', 'index', 'xs', 'ys', 'flags', 'edges',
+                 'offsets', 'neighbors', 'link_lines', 'invalid_links')
+
+    def __init__(self, names: List[str], index: Dict[str, int], xs: 'np.ndarray', ys: 'np.ndarray',
+                 flags: 'np.ndarray', edges: 'np.ndarray', link_lines: int = 0,
+                 invalid_links: Optional[List[str]] = None,
+                 csr: Optional[Tuple['np.ndarray', 'np.ndarray']] = None):
+        self.names = names
+        self.index = index
+        self.xs = xs
+        self.ys = ys
+        self.flags = flags
+        self.edges = edges
+        self.link_lines = link_lines
+        self.invalid_links = invalid_links or []
+        self.offsets, self.neighbors = csr if csr is not None else build_csr(len(names), edges)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def edge_count(self) -> int:
+        return len(self.edges)
+
+    @property
+    def start(self) -> int:
+        """Índice de la sala ##start (-1 si no hay)"""
+        import numpy as np
+        found = np.flatnonzero(self.flags & FLAG_START)
+        return int(found[0]) if len(found) else -1
+
+    @property
+    def end(self) -> int:
+        """Índice de la sala ##end (-1 si no hay)"""
+        import numpy as np
+        found = np.flatnonzero(self.flags & FLAG_END)
+        return int(found[0]) if len(found) else -1
+
+    def is_start(self, i: int) -> bool:
+        return bool(self.flags[i] & FLAG_START)
+
+    def is_end(self, i: int) -> bool:
+        return bool(self.flags[i] & FLAG_END)
+
+    def neighbors_of(self, i: int) -> 'np.ndarray':
+        return self.neighbors[self.offsets[i]:self.offsets[i + 1]]
+
+    def degrees(self) -> 'np.ndarray':
+        import numpy as np
+        return np.diff(self.offsets)
+
+    def indices_of(self, names: List[str]) -> List[int]:
+        """Traduce una lista de nombres a índices (-1 para nombres desconocidos)"""
+        index = self.index
+        return [index.get(name, -1) for name in names]
+
+    def nbytes(self) -> int:
+        """Memoria aproximada ocupada por los arrays del grafo"""
+        return sum(a.nbytes for a in (self.xs, self.ys, self.flags, self.edges,
+                                      self.offsets, self.neighbors))
+
+
+def build_csr(n: int, edges: 'np.ndarray') -> Tuple['np.ndarray', 'np.ndarray']:
+    """Construye la adyacencia CSR (offsets, neighbors) de un grafo no dirigido"""
+    import numpy as np
+    if len(edges) == 0:
+        return np.zeros(n + 1, dtype=np.int32), np.zeros(0, dtype=np.int32)
+    # Ambas direcciones, sin duplicados ni bucles
+    src = np.concatenate((edges[:, 0], edges[:, 1]))
+    dst = np.concatenate((edges[:, 1], edges[:, 0]))
+    keep = src != dst
+    keys = np.unique(src[keep].astype(np.int64) * n + dst[keep])
+    src = (keys // n).astype(np.int32)
+    dst = (keys % n).astype(np.int32)
+    offsets = np.zeros(n + 1, dtype=np.int32)
+    np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+    return offsets, dst
+
+
+class GraphBuilder:
+    """Acumula salas y túneles del parser y produce un CompactGraph
+
+    Expone la misma interfaz de sólo lectura que CompactGraph para las
+    estadísticas (names, xs, ys, start, end, edge_count...), sin numpy.
+    """
+
+    def __init__(self):
+        self.names: List[str] = []
+        self.index: Dict[str, int] = {}
+        self._xs = array('i')
+        self._ys = array('i')
+        self._flags = bytearray()
+        self._edges = array('i')
+        self.link_lines = 0
+        self.invalid_links: List[str] = []
+
+    def add_room(self, name: str, x: int, y: int, is_start: bool = False, is_end: bool = False) -> int:
+        i = len(self.names)
+        self.names.append(name)
+        self.index[name] = i
+        self._xs.append(x)
+        self._ys.append(y)
+        self._flags.append((FLAG_START if is_start else 0) | (FLAG_END if is_end else 0))
+        return i
+
+    def add_link(self, node1: str, node2: str):
+        self.link_lines += 1
+        a = self.index.get(node1)
+        b = self.index.get(node2)
+        if a is None or b is None:
+            self.invalid_links.append(f"{node1}-{node2}")
+            return
+        self._edges.append(a)
+        self._edges.append(b)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    @property
+    def xs(self) -> array:
+        return self._xs
+
+    @property
+    def ys(self) -> array:
+        return self._ys
+
+    @property
+    def edge_count(self) -> int:
+        return len(self._edges) // 2
+
+    @property
+    def start(self) -> int:
+        return next((i for i, f in enumerate(self._flags) if f & FLAG_START), -1)
+
+    @property
+    def end(self) -> int:
+        return next((i for i, f in enumerate(self._flags) if f & FLAG_END), -1)
+
+    def build(self) -> CompactGraph:
+        import numpy as np
+        # array('i') usa el int de C: np.intc; astype copia y libera el buffer
+        edges = np.frombuffer(self._edges, dtype=np.intc).astype(np.int32).reshape(-1, 2)
+        return CompactGraph(self.names, self.index,
+                            np.frombuffer(self._xs, dtype=np.intc).astype(np.int32),
+                            np.frombuffer(self._ys, dtype=np.intc).astype(np.int32),
+                            np.frombuffer(self._flags, dtype=np.uint8).copy(),
+                            edges, self.link_lines, self.invalid_links)
@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+
+import argparse
+import hashlib
+import sys
+import time
+
+import numpy as np
+
+from ant_graph import CompactGraph
+
+DEFAULT_ITERATIONS = 120
+DRAW_SCALE = 10                # unidades de dibujo por distancia ideal entre salas vecinas
+LAYOUT_VERSION = b'layout1'
+
+# Desplazamientos de la rejilla fina (vecindad 3x3, campo cercano exacto) y de
+# los hijos de la vecindad del padre (lista de interacción, campo lejano)
+_NEAR = np.array([(dx, dy) for dx in (-1, 0, 1) for dy in (-1, 0, 1)], dtype=np.int64)
+_CHILDREN = np.arange(-2, 4, dtype=np.int64)
+
+
+def is_degenerate(graph: CompactGraph) -> bool:
+    """True si las coordenadas del mapa no sirven para dibujarlo
+
+    Salas alineadas (todas en x == y, como en los mapas del generador) o
+    muchas salas en el mismo punto.
+    """
+    n = len(graph)
+    if n < 3:
+        return False
+    coords = np.column_stack((graph.xs, graph.ys)).astype(np.float64)
+    if len(np.unique(coords, axis=0)) < n * 0.9:
+        return True
+    centered = coords - coords.mean(axis=0)
+    singular = np.linalg.svd(centered, compute_uv=False)
+    return singular[1] <= singular[0] * 1e-3
+
+
+def _hop_distances(graph: CompactGraph, source: int) -> np.ndarray:
+    """Distancia en túneles desde source por BFS sobre el CSR, por frentes (-1 si no se alcanza)"""
+    n = len(graph)
+    dist = np.full(n, -1, dtype=np.int64)
+    if source < 0:
+        return dist
+    offsets, neighbors = graph.offsets, graph.neighbors
+    dist[source] = 0
+    frontier = np.array([source], dtype=np.int64)
+    level = 0
+    while len(frontier):
+        level += 1
+        counts = offsets[frontier + 1] - offsets[frontier]
+        starts = np.repeat(offsets[frontier] - np.cumsum(counts) + counts, counts)
+        nxt = neighbors[starts + np.arange(counts.sum())]
+        nxt = np.unique(nxt[dist[nxt] < 0])
+        dist[nxt] = level
+        frontier = nxt
+    return dist
+
+
+def _initial_positions(graph: CompactGraph, k: float, rng: np.random.Generator) -> np.ndarray:
+    """x según la distancia relativa entre ##start y ##end, y aleatoria
+
+    Empezar con las salas ya ordenadas de inicio a fin evita la mayoría de los
+    cruces que el algoritmo de fuerzas no sabe deshacer.
+    """
+    n = len(graph)
+    side = k * np.sqrt(n)
+    pos = rng.uniform(-side / 2, side / 2, size=(n, 2))
+    from_start = _hop_distances(graph, graph.start)
+    to_end = _hop_distances(graph, graph.end)
+    reached = (from_start >= 0) & (to_end >= 0)
+    total = (from_start + to_end).astype(np.float64)
+    total[total == 0] = 1
+    pos[reached, 0] = (from_start[reached] / total[reached] - 0.5) * side
+    return pos
+
+
+def _near_forces(pos: np.ndarray, cell: np.ndarray, side: int, k2: float) -> np.ndarray:
+    """Repulsión exacta entre salas de celdas vecinas de la rejilla fina"""
+    n = len(pos)
+    keys = cell[:, 0] * side + cell[:, 1]
+    order = np.argsort(keys, kind='stable')
+    bounds = np.searchsorted(keys[order], np.arange(side * side + 1))
+    force = np.zeros_like(pos)
+    for dx, dy in _NEAR:
+        tx, ty = cell[:, 0] + dx, cell[:, 1] + dy
+        valid = (tx >= 0) & (tx < side) & (ty >= 0) & (ty < side)
+        src = np.flatnonzero(valid)
+        target = tx[src] * side + ty[src]
+        counts = bounds[target + 1] - bounds[target]
+        if not counts.sum():
+            continue
+        # Pares (i, j) con j recorriendo la celda destino: repeat + arange por tramos
+        i = np.repeat(src, counts)
+        first = np.repeat(bounds[target] - np.cumsum(counts) + counts, counts)
+        j = order[first + np.arange(counts.sum())]
+        keep = i != j
+        i, j = i[keep], j[keep]
+        dx = pos[i, 0] - pos[j, 0]
+        dy = pos[i, 1] - pos[j, 1]
+        scale = k2 / np.maximum(dx * dx + dy * dy, 1e-9 * k2)
+        force[:, 0] += np.bincount(i, weights=dx * scale, minlength=n)
+        force[:, 1] += np.bincount(i, weights=dy * scale, minlength=n)
+    return force
+
+
+def _far_forces(pos: np.ndarray, origin: np.ndarray, size: float, levels: int, k2: float) -> np.ndarray:
+    """Repulsión aproximada de las celdas lejanas, nivel a nivel (rejilla jerárquica)
+
+    En el nivel l (2^l celdas por lado) cada celda ocupada interactúa con el
+    centro de masas de las celdas hijas de la vecindad 3x3 de su padre que no
+    son vecinas suyas (a lo sumo 27); entre todos los niveles cubren cada celda
+    lejana una vez. La fuerza se evalúa en el centro de masas de la celda y se
+    aplica a todas sus salas: O(n) celdas por iteración, como Barnes-Hut.
+    """
+    n = len(pos)
+    force = np.zeros_like(pos)
+    for level in range(2, levels + 1):
+        side = 1 << level
+        cell = np.clip(((pos - origin) / size * side).astype(np.int64), 0, side - 1)
+        keys = cell[:, 0] * side + cell[:, 1]
+        mass = np.bincount(keys, minlength=side * side).astype(np.float64)
+        occupied = np.flatnonzero(mass)
+        m = mass[occupied]
+        cx = np.bincount(keys, weights=pos[:, 0], minlength=side * side)[occupied] / m
+        cy = np.bincount(keys, weights=pos[:, 1], minlength=side * side)[occupied] / m
+        # Índice de celda -> posición en occupied (-1 si está vacía)
+        slot = np.full(side * side, -1, dtype=np.int64)
+        slot[occupied] = np.arange(len(occupied))
+
+        ox, oy = occupied // side, occupied % side
+        ix = ((ox >> 1) * 2)[:, None, None] + _CHILDREN[None, :, None]
+        iy = ((oy >> 1) * 2)[:, None, None] + _CHILDREN[None, None, :]
+        far = (np.abs(ix - ox[:, None, None]) > 1) | (np.abs(iy - oy[:, None, None]) > 1)
+        far &= (ix >= 0) & (ix < side) & (iy >= 0) & (iy < side)
+        source, a, b = np.nonzero(far)
+        target = slot[ix[source, a, 0] * side + iy[source, 0, b]]
+        hit = target >= 0
+        source, target = source[hit], target[hit]
+        dx = cx[source] - cx[target]
+        dy = cy[source] - cy[target]
+        scale = m[target] * k2 / np.maximum(dx * dx + dy * dy, 1e-9 * k2)
+        fx = np.bincount(source, weights=dx * scale, minlength=len(occupied))
+        fy = np.bincount(source, weights=dy * scale, minlength=len(occupied))
+        node_slot = slot[keys]
+        force[:, 0] += fx[node_slot]
+        force[:, 1] += fy[node_slot]
+    return force
+
+
+def force_layout(graph: CompactGraph, iterations: int = DEFAULT_ITERATIONS, seed: int = 0) -> np.ndarray:
+    """Posiciones (n, 2) calculadas a partir de la topología (Fruchterman-Reingold)
+
+    La atracción recorre los túneles (O(m)) y la repulsión usa una rejilla
+    jerárquica: exacta entre celdas vecinas de la rejilla fina y por centros
+    de masas para el resto. ##start y ##end quedan fijos a la izquierda y a la
+    derecha. Determinista para una misma semilla.
+    """
+    n = len(graph)
+    if n == 0:
+        return np.zeros((0, 2))
+    k = 1.0
+    k2 = k * k
+    rng = np.random.default_rng(seed)
+    pos = _initial_positions(graph, k, rng)
+    radius = k * np.sqrt(n) * 0.6
+    pinned = [i for i in (graph.start, graph.end) if i >= 0]
+    anchors = {graph.start: (-radius, 0.0), graph.end: (radius, 0.0)}
+    for i in pinned:
+        pos[i] = anchors[i]
+    if n == 1:
+        return pos
+
+    src = np.repeat(np.arange(n, dtype=np.int64), np.diff(graph.offsets))
+    dst = graph.neighbors.astype(np.int64)
+    # Rejilla fina de ~2 salas por celda
+    levels = max(int(np.ceil(np.log(max(n / 2, 1)) / np.log(4))), 2)
+    temperature = radius / 4
+    cooling = temperature / iterations
+
+    for _ in range(iterations):
+        origin = pos.min(axis=0)
+        size = max(float((pos.max(axis=0) - origin).max()), k) * (1 + 1e-9)
+        side = 1 << levels
+        cell = np.clip(((pos - origin) / size * side).astype(np.int64), 0, side - 1)
+        force = _near_forces(pos, cell, side, k2)
+        force += _far_forces(pos, origin, size, levels, k2)
+
+        # Atracción d^2 / k por túnel (CSR con ambos sentidos: cada sala suma la suya)
+        delta = pos[dst] - pos[src]
+        dist = np.sqrt((delta * delta).sum(axis=1))
+        pull = delta * (dist / k)[:, None]
+        force[:, 0] += np.bincount(src, weights=pull[:, 0], minlength=n)
+        force[:, 1] += np.bincount(src, weights=pull[:, 1], minlength=n)
+
+        length = np.sqrt((force * force).sum(axis=1))
+        step = np.minimum(length, temperature) / np.maximum(length, 1e-12)
+        pos += force * step[:, None]
+        for i in pinned:
+            pos[i] = anchors[i]
+        temperature = max(temperature - cooling, k * 0.01)
+
+    # Inicio y fin en los extremos aunque alguna sala haya quedado más afuera
+    low, high = pos[:, 0].min(), pos[:, 0].max()
+    if graph.start >= 0:
+        pos[graph.start, 0] = low - k
+    if graph.end >= 0:
+        pos[graph.end, 0] = high + k
+    return pos
+
+
+def topology_key(graph: CompactGraph) -> str:
+    """Huella de la topología (salas, ##start/##end y túneles), sin las coordenadas"""
+    digest = hashlib.blake2b(digest_size=16, person=LAYOUT_VERSION)
+    digest.update(np.array([len(graph), graph.start, graph.end], dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(graph.offsets, dtype=np.int64).tobytes())
+    digest.update(np.ascontiguousarray(graph.neighbors, dtype=np.int64).tobytes())
+    return digest.hexdigest()
+
+
+def layout_key(graph: CompactGraph, iterations: int, seed: int) -> str:
+    """Clave de caché de la distribución: topology_key como prefijo (ver ParseCache.invalidate)"""
+    return f"{topology_key(graph)}-{iterations}-{seed}"
+
+
+def cached_force_layout(graph: CompactGraph, cache=None, iterations: int = DEFAULT_ITERATIONS,
+                        seed: int = 0) -> np.ndarray:
+    """force_layout guardado en la caché de ant_cache (ParseCache) si se indica"""
+    if cache is None:
+        return force_layout(graph, iterations, seed)
+    key = layout_key(graph, iterations, seed)
+    pos = cache.get_array(key)
+    if pos is None or pos.shape != (len(graph), 2):
+        pos = force_layout(graph, iterations, seed)
+        try:
+            cache.put_array(key, pos)
+        except OSError as e:
+            print(f"Aviso: no se pudo guardar la distribución en la caché ({e})", file=sys.stderr)
+    return pos
+
+
+def graph_coords(graph: CompactGraph, layout: str = 'map', cache=None,
+                 iterations: int = DEFAULT_ITERATIONS) -> np.ndarray:
+    """Coordenadas de dibujo: las del mapa, las calculadas o (auto) éstas si las del mapa degeneran"""
+    if layout == 'force' or (layout == 'auto' and is_degenerate(graph)):
+        # Escala parecida a la de los mapas: los márgenes de render_graph son de 5 unidades
+        return cached_force_layout(graph, cache, iterations) * DRAW_SCALE
+    return np.column_stack((graph.xs, graph.ys))
+
+
+def main(argv=None):
+    """Calcula la distribución por fuerzas de un mapa y opcionalmente la escribe como mapa nuevo"""
+    parser = argparse.ArgumentParser(description="Distribución por fuerzas de las salas de un mapa de lem-in")
+    parser.add_argument('input', nargs='?', help="mapa o salida de lem-in (por defecto stdin)")
+    parser.add_argument('--iterations', type=int, default=DEFAULT_ITERATIONS,
+                        help=f"iteraciones ({DEFAULT_ITERATIONS})")
+    parser.add_argument('--seed', type=int, default=0, help="semilla de la posición inicial (0)")
+    parser.add_argument('--scale', type=float, default=DRAW_SCALE,
+                        help="unidades de mapa por distancia ideal al escribir el mapa (10)")
+    parser.add_argument('-o', '--output', help="escribe el mapa con las coordenadas calculadas")
+    args = parser.parse_args(argv)
+
+    from ant_solver import write_map
+    from ant_visualizer import parse_lem_in_with_simulation
+    stream = open(args.input) if args.input else sys.stdin
+    try:
+        num_ants, graph, _, _ = parse_lem_in_with_simulation(stream)
+    finally:
+        if args.input:
+            stream.close()
+
+    t0 = time.perf_counter()
+    pos = force_layout(graph, args.iterations, args.seed)
+    elapsed = time.perf_counter() - t0
+    print(f"{len(graph)} salas, {graph.edge_count} túneles: {elapsed:.2f} s "
+          f"({args.iterations} iteraciones{', coordenadas del mapa degeneradas' if is_degenerate(graph) else ''})",
+          file=sys.stderr)
+    if args.output:
+        # Coordenadas enteras sin repetir: el formato de mapa no admite decimales
+        coords = np.round((pos - pos.min(axis=0)) * args.scale).astype(np.int32)
+        _, first = np.unique(coords, axis=0, return_index=True)
+        if len(first) < len(coords):
+            print("Aviso: salas en la misma posición entera, aumenta --scale", file=sys.stderr)
+        laid = CompactGraph(graph.names, graph.index, coords[:, 0], coords[:, 1], graph.flags, graph.edges,
+                            graph.link_lines, graph.invalid_links, csr=(graph.offsets, graph.neighbors))
+        with open(args.output, 'w') as f:
+            write_map(num_ants, laid, f)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,313 @@
+#!/usr/bin/env python3
+
+import sys
+import threading
+import time
+from typing import Callable, List, Optional
+
+import numpy as np
+import matplotlib.pyplot as plt
+
+from ant_animation import AntAnimator, path_colors_by_room
+from ant_graph import CompactGraph, GraphBuilder
+from ant_render import add_paths, render_graph
+from ant_turns import decode_turns, position_table
+from ant_visualizer import LemInStreamParser, Path
+
+DEFAULT_WINDOW = 2000           # turnos que se conservan en memoria
+BATCH_LINES = 256               # líneas de turno que se decodifican de una vez
+BATCH_SECONDS = 0.1             # latencia máxima de un lote incompleto
+REDRAW_SHARE = 0.2              # fracción máxima del tiempo en redibujados completos
+
+
+class TurnWindow:
+    """Últimos capacity turnos de la simulación en un buffer circular de posiciones
+
+    El estado tras el turno t está en rows[t % len(rows)] mientras
+    first <= t <= turns; la memoria es (capacity + 1) * hormigas * 4 bytes.
+    """
+    __slots__ = ('rows', 'capacity', 'turns')
+
+    def __init__(self, num_ants: int, start: int, capacity: int = DEFAULT_WINDOW):
+        self.capacity = max(capacity, 1)
+        self.rows = np.empty((self.capacity + 1, num_ants), dtype=np.int32)
+        self.rows[0] = start
+        self.turns = 0
+
+    @property
+    def first(self) -> int:
+        return max(0, self.turns - self.capacity)
+
+    def row(self, t: int) -> np.ndarray:
+        return self.rows[t % len(self.rows)]
+
+    def last(self) -> np.ndarray:
+        return self.row(self.turns)
+
+    def append(self, table: np.ndarray):
+        """Añade los estados de los turnos siguientes (una fila por turno)"""
+        size = len(self.rows)
+        turns = self.turns + len(table)
+        table = table[-size:]
+        self.rows[np.arange(turns - len(table) + 1, turns + 1) % size] = table
+        self.turns = turns
+
+
+class LiveFeed:
+    """Lee la salida de lem-in en un hilo mientras la interfaz dibuja
+
+    El grafo se publica (graph_ready) en cuanto termina la sección de salas y
+    conexiones; los caminos se acumulan según llegan y los turnos se decodifican
+    por lotes a una TurnWindow. Todo lo compartido se lee bajo lock.
+    """
+
+    def __init__(self, stream, window: int = DEFAULT_WINDOW):
+        self.parser = LemInStreamParser(stream)
+        self.window_size = window
+        self.lock = threading.Lock()
+        self.graph_ready = threading.Event()
+        self.num_ants = 0
+        self.builder = GraphBuilder()
+        self.graph: Optional[CompactGraph] = None
+        self.paths: List[Path] = []
+        self.window: Optional[TurnWindow] = None
+        self.departures: Optional[np.ndarray] = None   # primera sala de cada hormiga (-1: en ##start)
+        self.departed = 0
+        self.unknown_rooms = set()
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self._thread = threading.Thread(target=self._run, name='lem-in-reader', daemon=True)
+
+    def start(self) -> 'LiveFeed':
+        self._thread.start()
+        return self
+
+    def _run(self):
+        try:
+            self._read()
+        except BaseException as exc:
+            self.error = exc
+        finally:
+            self.done = True
+            self.graph_ready.set()
+
+    def _read(self):
+        builder = self.builder
+        pending: List[str] = []
+        flushed = time.monotonic()
+        for kind, value in self.parser.events():
+            if kind == 'turn':
+                if self.graph is None:
+                    self._publish_graph()
+                pending.append(value)
+                if len(pending) >= BATCH_LINES or time.monotonic() - flushed > BATCH_SECONDS:
+                    self._flush(pending)
+                    pending = []
+                    flushed = time.monotonic()
+            elif kind == 'room':
+                builder.add_room(*value)
+            elif kind == 'link':
+                builder.add_link(*value)
+            elif kind == 'ants':
+                self.num_ants = value
+            else:
+                # Caminos y errores sólo llegan cuando el mapa ya está completo
+                if self.graph is None:
+                    self._publish_graph()
+                if kind == 'path':
+                    with self.lock:
+                        self.paths.append(value)
+        if self.graph is None:
+            self._publish_graph()
+        if pending:
+            self._flush(pending)
+
+    def _publish_graph(self):
+        graph = self.builder.build()
+        if graph.start >= 0:
+            self.window = TurnWindow(self.num_ants, graph.start, self.window_size)
+            self.departures = np.full(self.num_ants, -1, dtype=np.int32)
+        self.graph = graph
+        self.graph_ready.set()
+
+    def _flush(self, lines: List[str]):
+        window = self.window
+        if window is None:
+            return
+        moves = decode_turns(lines, self.graph.index)
+        self.unknown_rooms.update(moves.unknown_rooms)
+        # Sólo este hilo escribe en la ventana: la última fila se puede leer sin lock
+        table = position_table(moves, self.num_ants, self.graph.start, initial=window.last())[1:]
+        moved = table != self.graph.start
+        new = (self.departures < 0) & moved.any(axis=0)
+        with self.lock:
+            window.append(table)
+            if new.any():
+                columns = np.flatnonzero(new)
+                self.departures[columns] = table[moved[:, columns].argmax(axis=0), columns]
+                self.departed += len(columns)
+
+
+class LiveAnimator(AntAnimator):
+    """AntAnimator sobre una LiveFeed: la simulación crece mientras se reproduce
+
+    El bucle es un temporizador del canvas con blitting manual; el fondo se
+    vuelve a capturar en cada dibujo completo (caminos nuevos, rango del slider).
+    """
+
+    def __init__(self, fig, ax, feed: LiveFeed, fps: float = 30, speed: float = 2.0):
+        self.feed = feed
+        self.drawn_paths = len(feed.paths)
+        self.colored = 0
+        self.background = None
+        self.timer = None
+        self._redraw_at = 0.0           # no redibujar el fondo antes de este instante
+        self._draw_requested = None
+        super().__init__(fig, ax, feed.graph, None, fps=fps, speed=speed)
+        self.playing = True
+
+    def _xy(self, time: float) -> np.ndarray:
+        window = self.feed.window
+        if window is None:
+            return np.empty((0, 2))
+        with self.feed.lock:
+            # El lector puede haber avanzado la ventana desde poll(): las filas de
+            # antes de window.first ya tienen turnos nuevos, así que se vuelve a acotar
+            self.turns, self.first_turn = window.turns, window.first
+            if time < self.first_turn:
+                time = self.time = float(self.first_turn)
+            return super()._xy(time)
+
+    def _row(self, t: int) -> np.ndarray:
+        return self.feed.window.row(t)
+
+    def update(self, time: float):
+        artists = super().update(time)
+        feed = self.feed
+        if not feed.done:
+            state = '  leyendo...'
+        elif feed.error is not None:
+            state = '  [error de lectura]'
+        elif feed.parser.error_line:
+            state = f"  [{feed.parser.error_line}]"
+        else:
+            state = ''
+        if self.first_turn:
+            state += f"  (ventana desde {self.first_turn})"
+        self.label.set_text(self.label.get_text() + state)
+        return artists
+
+    def poll(self) -> bool:
+        """Incorpora lo que ha leído el hilo; devuelve True si hay que redibujar el fondo
+
+        Caminos nuevos y el rango del slider obligan a un dibujo completo (lento
+        en mapas grandes): se aplican juntos como mucho cada pocos segundos, de
+        modo que los redibujados no pasen de REDRAW_SHARE del tiempo.
+        """
+        feed = self.feed
+        first_room = None
+        with feed.lock:
+            paths = list(feed.paths)
+            if feed.window is not None:
+                self.turns, self.first_turn = feed.window.turns, feed.window.first
+            if feed.departed != self.colored:
+                self.colored = feed.departed
+                first_room = feed.departures.copy()
+        if first_room is not None:
+            self.ants.set_facecolor(path_colors_by_room(first_room, feed.graph, paths[:self.drawn_paths]))
+        slider = self.slider
+        stale_slider = slider is not None and (slider.valmin, slider.valmax) != (self.first_turn,
+                                                                                 max(self.turns, 1))
+        if not (len(paths) > self.drawn_paths or stale_slider):
+            return False
+        if time.monotonic() < self._redraw_at and not feed.done:
+            return False
+        if len(paths) > self.drawn_paths:
+            add_paths(self.ax, feed.num_ants, feed.graph, paths, self.drawn_paths)
+            self.drawn_paths = len(paths)
+            self.colored = -1       # recolorear con los caminos nuevos
+        if stale_slider:
+            slider.valmin, slider.valmax = self.first_turn, max(self.turns, 1)
+            slider.ax.set_xlim(slider.valmin, slider.valmax)
+        return True
+
+    def _tick(self):
+        redraw = self.poll()
+        if self.playing:
+            self.update(self.time + self.speed / self.fps)
+            if self.time >= self.turns and self.feed.done:
+                self.playing = False
+        else:
+            self.update(self.time)
+        canvas = self.fig.canvas
+        if redraw or self.background is None:
+            if self._draw_requested is None:
+                self._draw_requested = time.monotonic()
+                canvas.draw_idle()
+            return
+        canvas.restore_region(self.background)
+        for artist in self.artists:
+            self.ax.draw_artist(artist)
+        canvas.blit(self.fig.bbox)
+
+    def _on_draw(self, _):
+        now = time.monotonic()
+        if self._draw_requested is not None:
+            self._redraw_at = now + (now - self._draw_requested) / REDRAW_SHARE
+            self._draw_requested = None
+        # Los artistas animados no entran en el dibujo completo: el fondo queda sin ellos
+        self.background = self.fig.canvas.copy_from_bbox(self.fig.bbox)
+        for artist in self.artists:
+            self.ax.draw_artist(artist)
+
+    def connect(self):
+        self._add_controls()
+        self.fig.canvas.mpl_connect('draw_event', self._on_draw)
+        self.timer = self.fig.canvas.new_timer(interval=1000 / self.fps)
+        self.timer.add_callback(self._tick)
+        self.timer.start()
+        return self.timer
+
+
+def wait_for_graph(feed: LiveFeed, progress: bool = True) -> CompactGraph:
+    """Espera a que termine la sección de salas y conexiones mostrando el avance"""
+    builder = feed.builder
+    shown = False
+    while not feed.graph_ready.wait(0.25):
+        if progress:
+            print(f"\r>> Leyendo mapa: {len(builder)} salas, {builder.edge_count} conexiones...",
+                  end='', file=sys.stderr, flush=True)
+            shown = True
+    if shown:
+        print(file=sys.stderr)
+    if feed.error is not None and feed.graph is None:
+        raise feed.error
+    return feed.graph
+
+
+def show_live(stream, window: int = DEFAULT_WINDOW, fps: float = 30,
+              figsize=(16, 12), layout: Optional[Callable[[CompactGraph], np.ndarray]] = None):
+    """Dibuja la salida de lem-in a medida que llega (grafo, caminos y turnos)
+
+    layout(graph) devuelve las coordenadas de dibujo (ver ant_layout); se
+    calcula una vez, cuando el mapa está completo.
+    """
+    feed = LiveFeed(stream, window).start()
+    graph = wait_for_graph(feed)
+    if not len(graph):
+        sys.exit("ERROR: No se encontraron nodos válidos en la entrada")
+    coords = layout(graph) if layout is not None else None
+    with feed.lock:
+        paths = list(feed.paths)
+    print(f">> Mapa completo: {len(graph)} salas; dibujando mientras llega la simulación "
+          f"(ventana de {window} turnos)")
+    fig, ax = render_graph(feed.num_ants, graph, paths, figsize=figsize, coords=coords)
+    fig.canvas.manager.set_window_title('Lem-in Graph Visualizer - Live')
+    animator = LiveAnimator(fig, ax, feed, fps=fps)
+    timer = animator.connect()
+    plt.show()
+    if feed.parser.error_line:
+        print(f">> {feed.parser.error_line}", file=sys.stderr)
+    if feed.unknown_rooms:
+        print(f">> Aviso: {len(feed.unknown_rooms)} sala(s) desconocida(s) en la simulación", file=sys.stderr)
+    return timer
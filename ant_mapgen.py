@@ -0,0 +1,387 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+from typing import List, Optional, TextIO, Tuple
+
+import numpy as np
+
+from ant_distribution import optimal_turns
+from ant_graph import FLAG_END, FLAG_START, CompactGraph
+
+TOPOLOGIES = ('flow-one', 'big', 'superposition', 'grid', 'geometric')
+DEFAULT_ANTS = {'flow-one': 1, 'big': 300, 'superposition': 300, 'grid': 500, 'geometric': 500}
+REQUIRED_HEADER = "#Here is the number of lines required: "
+CHUNK_LINES = 1 << 16           # líneas por escritura
+SOLVE_ROOMS = 20000             # geometric: tope de salas para calcular los turnos por defecto
+SCALE = 10                      # unidades de coordenada por unidad de diseño
+
+_UPPER = 'ABCDEFGHIJKMNOPQRSTUVWXYZ'    # sin L: lem-in lee "L..." como movimiento
+_LOWER = 'abcdefghijklmnopqrstuvwxyz'
+
+
+class GeneratedMap:
+    """Mapa generado: la sala 0 es ##start, la 1 es ##end; túneles únicos y sin bucles
+
+    required son los turnos óptimos (línea "#Here is the number of lines
+    required" de generator_linux) o None si no se calculan.
+    """
+    __slots__ = ('topology', 'seed', 'num_ants', 'names', 'xs', 'ys', 'edges', 'required')
+
+    def __init__(self, topology: str, seed: int, num_ants: int, names: List[str], xs: np.ndarray,
+                 ys: np.ndarray, edges: np.ndarray, required: Optional[int]):
+        self.topology = topology
+        self.seed = seed
+        self.num_ants = num_ants
+        self.names = names
+        self.xs = xs
+        self.ys = ys
+        self.edges = edges
+        self.required = required
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def graph(self) -> CompactGraph:
+        return _compact(self.names, self.xs, self.ys, self.edges)
+
+    def _rooms(self, lo: int, hi: int) -> str:
+        return ''.join(f"{name} {x} {y}\n" for name, x, y in
+                       zip(self.names[lo:hi], self.xs[lo:hi].tolist(), self.ys[lo:hi].tolist()))
+
+    def write(self, out: TextIO, chunk_lines: int = CHUNK_LINES):
+        """Escribe el mapa por bloques (sin construir el texto completo en memoria)"""
+        head = f"{self.num_ants}\n"
+        if self.required is not None:
+            head += f"{REQUIRED_HEADER}{self.required}\n"
+        out.write(head + "##start\n" + self._rooms(0, 1) + "##end\n" + self._rooms(1, 2))
+        for lo in range(2, len(self), chunk_lines):
+            out.write(self._rooms(lo, lo + chunk_lines))
+        names = self.names
+        for lo in range(0, len(self.edges), chunk_lines):
+            out.write(''.join(f"{names[a]}-{names[b]}\n" for a, b in self.edges[lo:lo + chunk_lines].tolist()))
+
+
+def _compact(names: List[str], xs: np.ndarray, ys: np.ndarray, edges: np.ndarray) -> CompactGraph:
+    flags = np.zeros(len(names), dtype=np.uint8)
+    flags[0], flags[1] = FLAG_START, FLAG_END
+    return CompactGraph(names, {name: i for i, name in enumerate(names)}, xs.astype(np.int32),
+                        ys.astype(np.int32), flags, edges.astype(np.int32), len(edges))
+
+
+def _names(n: int, rng: np.random.Generator) -> List[str]:
+    """Nombres únicos al estilo de generator_linux (Nrc0, Kdu6...): tres letras y un número"""
+    prefixes = [a + b + c for a in _UPPER for b in _LOWER for c in _LOWER]
+    count = len(prefixes)
+    return [prefixes[i % count] + str(i // count) for i in rng.permutation(n).tolist()]
+
+
+def _unique_edges(edges: np.ndarray, n: int) -> np.ndarray:
+    """Túneles sin bucles ni repetidos (en cualquier sentido), en orden aleatorio estable"""
+    a, b = np.minimum(edges[:, 0], edges[:, 1]), np.maximum(edges[:, 0], edges[:, 1])
+    keep = a != b
+    _, first = np.unique(a[keep] * n + b[keep], return_index=True)
+    return edges[keep][np.sort(first)]
+
+
+def _coords(points: np.ndarray, rng: np.random.Generator) -> Tuple[np.ndarray, np.ndarray]:
+    """Coordenadas enteras no negativas y distintas (lem-in rechaza las repetidas)
+
+    Una coordenada negativa pondría un "-" en la línea de sala y lem-in la
+    tomaría por un túnel. Las salas que coinciden se desplazan al azar hasta
+    que todas son distintas.
+    """
+    xy = np.rint((points - points.min(axis=0)) * SCALE).astype(np.int64)
+    while True:
+        _, first = np.unique(xy[:, 0] * (1 << 32) + xy[:, 1], return_index=True)
+        if len(first) == len(xy):
+            return xy[:, 0], xy[:, 1]
+        clash = np.ones(len(xy), dtype=bool)
+        clash[first] = False
+        xy[clash] += rng.integers(0, 3, (int(clash.sum()), 2))
+
+
+def _fill(edges: List[np.ndarray], links: int, n: int, sample) -> np.ndarray:
+    """Completa edges con túneles de sample(count) hasta ~links únicos
+
+    Los pares al azar se repiten, así que se muestrea de más en varias
+    rondas; lo que sobra se recorta por el final (nunca los de edges).
+    """
+    result = _unique_edges(np.concatenate(edges).astype(np.int64), n)
+    keep = max(links, len(result))
+    for _ in range(8):
+        missing = links - len(result)
+        if missing <= 0:
+            return result[:keep]
+        extra = sample(missing + missing // 4 + 16)
+        result = _unique_edges(np.concatenate((result, extra.astype(np.int64))), n)
+    return result
+
+
+def _group_edges(count: int, rng: np.random.Generator, first: np.ndarray, size: np.ndarray) -> np.ndarray:
+    """count túneles al azar dentro de grupos contiguos de salas (first[g], size[g])"""
+    groups = rng.choice(len(first), count, p=size / size.sum())
+    a = first[groups] + (rng.random(count) * size[groups]).astype(np.int64)
+    b = first[groups] + (rng.random(count) * size[groups]).astype(np.int64)
+    return np.column_stack((a, b))
+
+
+def _flow(topology: str, n: int, links: int, rng: np.random.Generator):
+    """Caminos plantados entre ##start y ##end, atajos y ruido en grupos colgantes
+
+    Cada grupo de ruido se une al resto por un único túnel: ningún camino
+    simple entre ##start y ##end lo atraviesa, así que los turnos óptimos
+    son los del núcleo (caminos plantados y atajos), que es pequeño. Los
+    grupos crecen con la densidad de túneles para que quepan todos.
+    """
+    k = 1 if topology == 'flow-one' else int(rng.integers(8, 17))
+    base = max(4, int(np.sqrt(n) / 2))
+    lengths = rng.integers(base, 2 * base, k)                  # en túneles
+    budget = max(n - 2, 1)
+    while (lengths - 1).sum() > budget // 2 and lengths.max() > 2:
+        lengths = np.maximum(lengths * 2 // 3, 2)
+    span = float(lengths.max())
+    gap = 3.0
+
+    # Núcleo: sala j-ésima interior del camino p en ((j + 1) / lengths[p] * span, fila p)
+    path_of = np.repeat(np.arange(k), lengths - 1)
+    step = np.arange(len(path_of)) - np.repeat(np.cumsum(lengths - 1) - (lengths - 1), lengths - 1) + 1
+    core_x = step / lengths[path_of] * span
+    core_y = (path_of - (k - 1) / 2) * gap
+    core = 2 + np.arange(len(path_of))
+    first_room = np.cumsum(lengths - 1) - (lengths - 1) + 2   # primera sala interior de cada camino
+    last_room = first_room + lengths - 2
+    edges = [np.column_stack((np.zeros(k, dtype=np.int64), first_room)),
+             np.column_stack((last_room, np.ones(k, dtype=np.int64)))]
+    inner = step[1:] > 1
+    edges.append(np.column_stack((core[:-1], core[1:]))[inner])
+    points = [np.array([[0.0, 0.0], [span + 1, 0.0]]), np.column_stack((core_x, core_y))]
+
+    def room_near(p: np.ndarray, x: np.ndarray) -> np.ndarray:
+        j = np.clip(np.rint(x / span * lengths[p]).astype(np.int64), 1, lengths[p] - 1)
+        return first_room[p] + j - 1
+
+    extra = len(core) + 2
+    if k > 1:
+        # Cruces entre caminos vecinos (big) o atajos de un camino a otro más adelante (superposition)
+        count = k if topology == 'big' else k // 2 + 1
+        p = rng.integers(0, k - 1, count)
+        q = p + 1
+        if topology == 'big':
+            x = rng.random(count) * span
+            a, b = room_near(p, x), room_near(q, x + rng.normal(0, 1, count))
+            edges.append(np.column_stack((a, b)))
+        else:
+            # Un pasillo de una sala: acorta la ruta pero bloquea los dos caminos que une
+            x0 = rng.uniform(0.15, 0.35, count) * span
+            x1 = rng.uniform(0.65, 0.85, count) * span
+            a, b = room_near(p, x0), room_near(q, x1)
+            mid = extra + np.arange(count)
+            extra += count
+            edges += [np.column_stack((a, mid)), np.column_stack((mid, b))]
+            points.append(np.column_stack(((x0 + x1) / 2, (p - (k - 1) / 2 + 0.5) * gap)))
+    core_rooms = extra
+
+    # Ruido: grupos de 16 salas o más repartidos por el rectángulo, cada uno colgado de la sala del núcleo más cercana
+    noise = max(n - extra, 0)
+    if noise:
+        groups = max(noise // max(16, 6 * links // n), 1)
+        group = np.minimum(np.arange(noise) * groups // noise, groups - 1)
+        size = np.bincount(group, minlength=groups)
+        first = extra + np.cumsum(size) - size
+        height = max(k * gap / 2 + 2, noise / (2 * span))
+        center = np.column_stack((rng.random(groups) * span, rng.uniform(-height, height, groups)))
+        points.append(center[group] + rng.normal(0, 1.5, (noise, 2)))
+        anchor_path = np.clip(np.rint(center[:, 1] / gap + (k - 1) / 2), 0, k - 1).astype(np.int64)
+        edges.append(np.column_stack((room_near(anchor_path, center[:, 0]), first)))
+        # Árbol dentro de cada grupo (cada sala con una anterior del mismo grupo) y túneles extra
+        rooms = extra + np.arange(noise)
+        later = rooms != first[group]
+        parent = first[group] + (rng.random(noise) * (rooms - first[group])).astype(np.int64)
+        edges.append(np.column_stack((parent[later], rooms[later])))
+        edges = _fill(edges, links, n, lambda count: _group_edges(count, rng, first, size))
+    else:
+        edges = _unique_edges(np.concatenate(edges).astype(np.int64), n)
+    return np.concatenate(points), edges, core_rooms
+
+
+def _grid(n: int, links: int, rng: np.random.Generator, width: Optional[int] = None):
+    """Capas de width salas; cada túnel une salas de la misma capa o de capas consecutivas
+
+    ##start se une a toda la primera capa y ##end a toda la última. Todo
+    camino necesita layers + 1 túneles y width caminos rectos los tienen,
+    con lo que los turnos óptimos salen sin resolver el flujo.
+    """
+    rooms = n - 2
+    width = max(2, min(width or int(np.sqrt(rooms / 4)), rooms))
+    layers = max(rooms // width, 1)
+    ids = np.arange(rooms)
+    layer, row = ids // width, ids % width
+    first, last = 2 + np.arange(width), 2 + (layers - 1) * width + np.arange(width)
+    edges = [np.column_stack((np.zeros(width, dtype=np.int64), first)),
+             np.column_stack((last, np.ones(width, dtype=np.int64)))]
+    # Filas rectas; las salas sobrantes forman una capa incompleta que no llega a ##end
+    ahead = ids + width < rooms
+    edges.append(np.column_stack((2 + ids[ahead], 2 + ids[ahead] + width)))
+
+    def sample(count: int) -> np.ndarray:
+        # Diagonales a la capa siguiente o saltos dentro de la misma capa
+        u = rng.integers(0, rooms, count)
+        shift = rng.integers(-8, 9, count)
+        forward = rng.random(count) < 0.5
+        v = np.where(forward, u + width + np.clip(shift, -2, 2), u - row[u] + (row[u] + shift) % width)
+        ok = (v >= 0) & (v < rooms)
+        ok[ok] &= np.abs(layer[v[ok]] - layer[u[ok]]) <= 1
+        return np.column_stack((2 + u[ok], 2 + v[ok]))
+
+    edges = _fill(edges, links, n, sample)
+    right = layer[-1] + 2
+    points = np.concatenate((np.array([[0.0, (width - 1) / 2], [right, (width - 1) / 2]]),
+                             np.column_stack((layer + 1, row)).astype(float)))
+    return points, edges, layers, width
+
+
+def _geometric(n: int, links: int, rng: np.random.Generator):
+    """Puntos al azar en el cuadrado unidad unidos a los que están a menos de un radio
+
+    El radio se elige para que salgan ~links túneles; la búsqueda de vecinos
+    usa una rejilla de celdas del tamaño del radio (sólo las 4 celdas vecinas
+    "hacia delante" de cada una, para no repetir pares).
+    """
+    points = rng.random((n, 2))
+    radius = np.sqrt(2 * links / (np.pi * n * n))
+    cells = max(int(1 / radius), 1)
+    cell = np.minimum((points * cells).astype(np.int64), cells - 1)
+    key = cell[:, 0] * cells + cell[:, 1]
+    order = np.argsort(key, kind='stable')
+    offsets = np.searchsorted(key[order], np.arange(cells * cells + 1))
+    edges = []
+    for dx, dy in ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1)):
+        other = cell + (dx, dy)
+        valid = (other >= 0).all(axis=1) & (other < cells).all(axis=1)
+        u = np.flatnonzero(valid)
+        okey = other[u, 0] * cells + other[u, 1]
+        count = offsets[okey + 1] - offsets[okey]
+        a = np.repeat(u, count)
+        b = order[np.repeat(offsets[okey], count) + np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)]
+        near = ((points[a] - points[b]) ** 2).sum(axis=1) < radius * radius
+        if (dx, dy) == (0, 0):
+            near &= a < b
+        edges.append(np.column_stack((a[near], b[near])))
+    edges = np.concatenate(edges)
+
+    # ##start y ##end: los puntos más cercanos a esquinas opuestas dentro de la componente mayor
+    component = _largest_component(n, edges)
+    candidates = np.flatnonzero(component)
+    start = candidates[np.argmin((points[candidates] ** 2).sum(axis=1))]
+    end = candidates[np.argmin(((points[candidates] - 1) ** 2).sum(axis=1))]
+    rest = np.setdiff1d(np.arange(n), [start, end])
+    perm = np.concatenate(([start, end], rest))
+    inverse = np.empty(n, dtype=np.int64)
+    inverse[perm] = np.arange(n)
+    edges = _unique_edges(inverse[edges], n)
+    return points[perm] * np.sqrt(n), edges
+
+
+def _largest_component(n: int, edges: np.ndarray) -> np.ndarray:
+    """Máscara de la componente conexa más grande (unión de etiquetas por mínimo, vectorizada)"""
+    label = np.arange(n)
+    if not len(edges):
+        return label == 0
+    a, b = edges[:, 0], edges[:, 1]
+    while True:
+        low = np.minimum(label[a], label[b])
+        new = label.copy()
+        np.minimum.at(new, a, low)
+        np.minimum.at(new, b, low)
+        new = new[new]              # saltar por punteros: converge en pocas vueltas
+        if (new == label).all():
+            break
+        label = new
+    return label == np.bincount(label).argmax()
+
+
+def generate(topology: str, rooms: int = 4000, links: Optional[int] = None, ants: Optional[int] = None,
+             seed: int = 0, required: Optional[bool] = None, width: Optional[int] = None) -> GeneratedMap:
+    """Genera un mapa reproducible (mismo topology, rooms, links, ants y seed: mismo mapa)
+
+    links es el número aproximado de túneles (por defecto ~1.3 por sala,
+    como los mapas --big de generator_linux). Con required se calculan los
+    turnos óptimos: en grid son cerrados y en las topologías de caminos
+    plantados se resuelve sólo el núcleo. En geometric hay que resolver el
+    grafo completo con ant_solver (~1 min con 100k salas), así que por
+    defecto (None) sólo se hace hasta SOLVE_ROOMS salas.
+    """
+    if topology not in TOPOLOGIES:
+        raise ValueError(f"topología desconocida: {topology} (opciones: {', '.join(TOPOLOGIES)})")
+    rooms = max(rooms, 4)
+    if required is None:
+        required = topology != 'geometric' or rooms <= SOLVE_ROOMS
+    links = links if links is not None else int(rooms * 1.3)
+    num_ants = ants if ants is not None else DEFAULT_ANTS[topology]
+    rng = np.random.default_rng([seed, TOPOLOGIES.index(topology)])
+    names = _names(rooms, rng)
+    turns = None
+    if topology == 'grid':
+        points, edges, layers, width = _grid(rooms, links, rng, width)
+        if required:
+            turns = optimal_turns([layers + 1] * width, num_ants)[0]
+    elif topology == 'geometric':
+        points, edges = _geometric(rooms, links, rng)
+    else:
+        points, edges, core = _flow(topology, rooms, links, rng)
+    xs, ys = _coords(points, rng)
+    if required and turns is None:
+        from ant_solver import solve
+        if topology == 'geometric':
+            graph = _compact(names, xs, ys, edges)
+        else:
+            inside = (edges < core).all(axis=1)
+            graph = _compact(names[:core], xs[:core], ys[:core], edges[inside])
+        turns = solve(graph, num_ants)[0]
+    return GeneratedMap(topology, seed, num_ants, names, xs, ys, edges, turns)
+
+
+def main(argv=None):
+    """Escribe un mapa generado en stdout o en un fichero"""
+    parser = argparse.ArgumentParser(description="Generador reproducible de mapas de lem-in")
+    parser.add_argument('topology', choices=TOPOLOGIES,
+                        help="flow-one: un camino y 1 hormiga; big: caminos con cruces; superposition: "
+                             "atajos que solapan caminos; grid: capas; geometric: grafo geométrico aleatorio")
+    parser.add_argument('--rooms', type=int, default=4000, help="número de salas (4000)")
+    parser.add_argument('--links', type=int, help="número aproximado de túneles (por defecto 1.3 por sala)")
+    parser.add_argument('--ants', type=int, help="hormigas (por defecto según la topología)")
+    parser.add_argument('--seed', type=int, default=0, help="semilla (0)")
+    parser.add_argument('--width', type=int, help="grid: salas por capa (por defecto ~sqrt(salas / 4))")
+    required = parser.add_mutually_exclusive_group()
+    required.add_argument('--required', action='store_true', default=None,
+                          help=f"calcular siempre los turnos óptimos (geometric con más de {SOLVE_ROOMS} "
+                               "salas no los calcula si no se pide)")
+    required.add_argument('--no-required', dest='required', action='store_false',
+                          help="no calcular los turnos óptimos ni escribir la línea 'lines required'")
+    parser.add_argument('-o', '--output', help="fichero de salida (por defecto stdout)")
+    args = parser.parse_args(argv)
+
+    t0 = time.perf_counter()
+    generated = generate(args.topology, args.rooms, args.links, args.ants, args.seed,
+                         required=args.required, width=args.width)
+    t1 = time.perf_counter()
+    out = open(args.output, 'w') if args.output else sys.stdout
+    try:
+        generated.write(out)
+    except BrokenPipeError:
+        # Lectores que paran antes de tiempo (head, lem-in con error)
+        sys.stderr.close()
+        return
+    finally:
+        if args.output:
+            out.close()
+    required = f", {generated.required} turnos" if generated.required is not None else ""
+    print(f">> {args.topology}: {len(generated)} salas, {len(generated.edges)} túneles, "
+          f"{generated.num_ants} hormigas{required} | generado en {(t1 - t0) * 1000:.0f} ms, "
+          f"escrito en {(time.perf_counter() - t1) * 1000:.0f} ms", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
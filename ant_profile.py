@@ -0,0 +1,215 @@
+#!/usr/bin/env python3
+
+import os
+import time
+from contextlib import contextmanager, nullcontext
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional
+
+if TYPE_CHECKING:
+    import cProfile
+    import pstats
+
+# Este módulo se carga en todos los modos: tracemalloc, cProfile y pstats se
+# importan sólo cuando hay un perfil activo
+
+_active: Optional['StageProfiler'] = None
+
+
+def stage(name: str):
+    """Etapa del perfil activo (--profile); sin perfil activo no hace nada"""
+    return _active.stage(name) if _active is not None else nullcontext()
+
+
+def active() -> bool:
+    return _active is not None
+
+
+def available_cores() -> int:
+    """Núcleos que puede usar este proceso (respeta taskset / cgroups de afinidad)"""
+    try:
+        return len(os.sched_getaffinity(0))
+    except AttributeError:
+        return os.cpu_count() or 1
+
+
+class StageRecord:
+    """Acumulado de una etapa: llamadas, tiempo y memoria"""
+    __slots__ = ('name', 'depth', 'calls', 'seconds', 'allocated', 'peak')
+
+    def __init__(self, name: str, depth: int):
+        self.name = name
+        self.depth = depth
+        self.calls = 0
+        self.seconds = 0.0
+        self.allocated = 0      # bytes netos que siguen vivos al salir de la etapa
+        self.peak = 0           # pico de bytes por encima del inicio de la etapa
+
+    def to_dict(self) -> dict:
+        return {'name': self.name, 'depth': self.depth, 'calls': self.calls, 'seconds': self.seconds,
+                'allocated_kib': self.allocated >> 10, 'peak_kib': self.peak >> 10}
+
+
+class StageProfiler:
+    """Tiempos (perf_counter_ns) y memoria (tracemalloc) por etapa del pipeline
+
+    Las etapas pueden anidarse ('render' dentro de 'export'); cada una guarda su
+    pico sin perder el de la etapa exterior. Las etapas de cprofile_stages se
+    ejecutan además bajo cProfile para volcarlas como pilas colapsadas.
+    """
+
+    def __init__(self, memory: bool = True, cprofile_stages: Iterable[str] = ()):
+        self.memory = memory
+        self.cprofile_stages = set(cprofile_stages)
+        self.records: Dict[str, StageRecord] = {}
+        self.profiles: Dict[str, 'cProfile.Profile'] = {}
+        self._stack: List[list] = []        # [registro, memoria al entrar, pico visto]
+        self._started = None
+        self._tracemalloc = None
+        self._owns_tracing = False          # tracemalloc lo arrancó este perfil (y lo para al salir)
+        self.total = 0.0
+
+    def __enter__(self):
+        global _active
+        import tracemalloc
+        self._tracemalloc = tracemalloc
+        self._owns_tracing = self.memory and not tracemalloc.is_tracing()
+        if self._owns_tracing:
+            tracemalloc.start()
+        self._started = time.perf_counter_ns()
+        _active = self
+        return self
+
+    def __exit__(self, *exc):
+        global _active
+        _active = None
+        self.total = (time.perf_counter_ns() - self._started) / 1e9
+        if self._owns_tracing:
+            self._tracemalloc.stop()
+            self._owns_tracing = False
+        return False
+
+    @contextmanager
+    def stage(self, name: str):
+        tracemalloc = self._tracemalloc
+        record = self.records.get(name)
+        if record is None:
+            record = self.records[name] = StageRecord(name, len(self._stack))
+        if self.memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if self._stack:
+                # reset_peak borra el pico de la etapa exterior: guardarlo antes
+                self._stack[-1][2] = max(self._stack[-1][2], peak)
+            tracemalloc.reset_peak()
+        else:
+            current = 0
+        frame = [record, current, current]
+        self._stack.append(frame)
+        profile = None
+        if name in self.cprofile_stages:
+            import cProfile
+            profile = self.profiles.setdefault(name, cProfile.Profile())
+            profile.enable()
+        t0 = time.perf_counter_ns()
+        try:
+            yield record
+        finally:
+            elapsed = time.perf_counter_ns() - t0
+            if profile is not None:
+                profile.disable()
+            self._stack.pop()
+            record.calls += 1
+            record.seconds += elapsed / 1e9
+            if self.memory:
+                now, peak = tracemalloc.get_traced_memory()
+                peak = max(peak, frame[2])
+                record.allocated += now - frame[1]
+                record.peak = max(record.peak, peak - frame[1])
+                if self._stack:
+                    self._stack[-1][2] = max(self._stack[-1][2], peak)
+
+    def to_dict(self) -> dict:
+        return {'total_seconds': self.total, 'memory': self.memory,
+                'stages': [record.to_dict() for record in self.records.values()]}
+
+    def table(self) -> str:
+        """Tabla de texto con una fila por etapa (las anidadas, sangradas)"""
+        lines = [f"{'ETAPA':<28} {'LLAMADAS':>8} {'ms':>10} {'%':>6} {'ASIGNADO KiB':>13} {'PICO KiB':>10}"]
+        for record in self.records.values():
+            share = record.seconds / self.total * 100 if self.total else 0
+            memory = (f"{record.allocated >> 10:>13,} {record.peak >> 10:>10,}" if self.memory
+                      else f"{'-':>13} {'-':>10}")
+            lines.append(f"{'  ' * record.depth + record.name:<28} {record.calls:>8} "
+                         f"{record.seconds * 1000:>10.1f} {share:>6.1f} {memory}")
+        lines.append(f"{'total':<28} {'':>8} {self.total * 1000:>10.1f}")
+        if self.memory:
+            lines.append("(tiempos con tracemalloc activo; --profile time para medir sólo tiempos)")
+        return '\n'.join(lines)
+
+    def collapsed_stacks(self) -> List[str]:
+        """Pilas colapsadas ("etapa;f1;f2 microsegundos") de las etapas con cProfile"""
+        import pstats
+        lines = []
+        for name, profile in self.profiles.items():
+            lines.extend(collapse_stats(pstats.Stats(profile), root=name))
+        return lines
+
+
+def _frame_label(func) -> str:
+    filename, line, function = func
+    if filename == '~':
+        return function.replace(';', ',')
+    return f"{function} ({os.path.basename(filename)}:{line})".replace(';', ',')
+
+
+def collapse_stats(stats: 'pstats.Stats', root: str = '', max_repeat: int = 3,
+                   min_seconds: float = 1e-5) -> List[str]:
+    """Convierte estadísticas de cProfile en pilas colapsadas para flamegraph.pl/speedscope
+
+    cProfile sólo guarda aristas llamador -> llamado, no pilas completas: se
+    reparte el tiempo de cada función entre sus llamadores en proporción al
+    tiempo acumulado de cada arista (la aproximación habitual de los
+    conversores de cProfile a flame graph). Las recursiones se expanden hasta
+    max_repeat apariciones por pila y las ramas de menos de min_seconds se
+    funden en su llamador, así la suma total se conserva.
+    """
+    raw = stats.stats
+    children: Dict[tuple, Dict[tuple, float]] = {}
+    for func, (_, _, _, cumulative, callers) in raw.items():
+        # En funciones recursivas las aristas suman más que el total: se normalizan
+        incoming = sum(edge[3] for edge in callers.values())
+        share = min(cumulative / incoming, 1.0) if incoming else 0.0
+        for caller, edge in callers.items():
+            children.setdefault(caller, {})[func] = edge[3] * share
+    roots = [func for func, (_, _, _, _, callers) in raw.items()
+             if not any(caller in raw for caller in callers)]
+
+    totals: Dict[str, float] = {}
+
+    def walk(func, budget: float, stack: List[str], repeats: Dict[tuple, int]):
+        _, _, self_time, cumulative, _ = raw[func]
+        scale = budget / cumulative if cumulative else 0.0
+        own = self_time * scale
+        for child, edge_time in children.get(func, {}).items():
+            child_budget = edge_time * scale
+            if child not in raw or repeats.get(child, 0) >= max_repeat or child_budget < min_seconds:
+                own += child_budget
+                continue
+            repeats[child] = repeats.get(child, 0) + 1
+            walk(child, child_budget, stack + [_frame_label(child)], repeats)
+            repeats[child] -= 1
+        label = ';'.join(stack)
+        totals[label] = totals.get(label, 0.0) + own
+
+    prefix = [root] if root else []
+    for func in roots:
+        walk(func, raw[func][3], prefix + [_frame_label(func)], {func: 1})
+    return [f"{stack} {round(seconds * 1e6)}" for stack, seconds in totals.items()
+            if round(seconds * 1e6) > 0]
+
+
+def write_collapsed(profiler: StageProfiler, path: str) -> int:
+    """Escribe las pilas colapsadas en path; devuelve el número de líneas"""
+    lines = profiler.collapsed_stacks()
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + ('\n' if lines else ''))
+    return len(lines)
@@ -0,0 +1,217 @@
+#!/usr/bin/env python3
+
+import argparse
+import sys
+import time
+from typing import TYPE_CHECKING, List, Tuple
+
+import numpy as np
+
+from ant_graph import CompactGraph
+
+if TYPE_CHECKING:
+    from ant_visualizer import Path
+
+
+class ReducedGraph:
+    """Grafo reducido: sin callejones sin salida y con los pasillos contraídos
+
+    - graph: CompactGraph de las salas que quedan (cruces, ##start y ##end);
+      puede tener aristas paralelas entre ##start y ##end
+    - rooms: índice original de cada sala de graph
+    - weights: túneles que representa cada arista de graph.edges
+    - chain_offsets, chain_rooms: salas originales interiores de la arista e,
+      de edges[e, 0] a edges[e, 1]: chain_rooms[chain_offsets[e]:chain_offsets[e + 1]]
+    """
+    __slots__ = ('original', 'graph', 'rooms', 'weights', 'chain_offsets', 'chain_rooms',
+                 'pruned', 'unreachable', 'contracted', 'elapsed')
+
+    def __init__(self, original: CompactGraph, graph: CompactGraph, rooms: np.ndarray, weights: np.ndarray,
+                 chain_offsets: np.ndarray, chain_rooms: np.ndarray, pruned: int, unreachable: int,
+                 elapsed: float):
+        self.original = original
+        self.graph = graph
+        self.rooms = rooms
+        self.weights = weights
+        self.chain_offsets = chain_offsets
+        self.chain_rooms = chain_rooms
+        self.pruned = pruned
+        self.unreachable = unreachable
+        self.contracted = len(chain_rooms)
+        self.elapsed = elapsed
+
+    def chain(self, e: int) -> np.ndarray:
+        return self.chain_rooms[self.chain_offsets[e]:self.chain_offsets[e + 1]]
+
+    def expand(self, nodes: List[int], edge_ids: List[int]) -> List[int]:
+        """Camino de salas originales a partir de un camino del grafo reducido y sus aristas"""
+        rooms, edges = self.rooms, self.graph.edges
+        path = [int(rooms[nodes[0]])]
+        for u, v, e in zip(nodes, nodes[1:], edge_ids):
+            inner = self.chain(e).tolist()
+            if edges[e, 0] != u:
+                inner.reverse()
+            path.extend(inner)
+            path.append(int(rooms[v]))
+        return path
+
+    def map_paths(self, paths: List['Path']) -> List['Path']:
+        """Caminos de lem-in (nombres) restringidos a las salas que quedan en el grafo reducido"""
+        from ant_visualizer import Path
+        index = self.graph.index
+        return [Path(p.path_num, p.ant_count, [name for name in p.nodes if name in index]) for p in paths]
+
+    def report(self) -> dict:
+        original, graph = self.original, self.graph
+        return {
+            'rooms': len(original), 'reduced_rooms': len(graph),
+            'tunnels': original.edge_count, 'reduced_tunnels': graph.edge_count,
+            'dead_ends': self.pruned, 'unreachable': self.unreachable, 'contracted': self.contracted,
+            'seconds': self.elapsed,
+        }
+
+
+def _prune(graph: CompactGraph) -> Tuple[np.ndarray, np.ndarray]:
+    """(componente de ##start, salas útiles): las útiles quedan fuera de ramas sin salida"""
+    n = len(graph)
+    start, end = graph.start, graph.end
+    offsets = graph.offsets.tolist()
+    neighbors = graph.neighbors.tolist()
+    component = np.zeros(n, dtype=bool)
+
+    # Componente de ##start (BFS sobre el CSR)
+    if start >= 0:
+        component[start] = True
+        queue = [start]
+        for u in queue:
+            for v in neighbors[offsets[u]:offsets[u + 1]]:
+                if not component[v]:
+                    component[v] = True
+                    queue.append(v)
+    if end < 0 or not component[end]:
+        return component, np.zeros(n, dtype=bool)
+    alive = component.copy()
+
+    # Callejones: se quitan hojas hasta que no quedan (una rama entera se va en cadena)
+    degree = np.diff(graph.offsets).astype(np.int64)
+    degree[~alive] = 0
+    for u in np.flatnonzero(alive).tolist():
+        for v in neighbors[offsets[u]:offsets[u + 1]]:
+            if not alive[v]:
+                degree[u] -= 1
+    degree = degree.tolist()
+    terminal = {start, end}
+    leaves = [u for u in np.flatnonzero(alive).tolist() if degree[u] <= 1 and u not in terminal]
+    while leaves:
+        u = leaves.pop()
+        if not alive[u]:
+            continue
+        alive[u] = False
+        for v in neighbors[offsets[u]:offsets[u + 1]]:
+            if alive[v]:
+                degree[v] -= 1
+                if degree[v] <= 1 and v not in terminal:
+                    leaves.append(v)
+    return component, alive
+
+
+def reduce_graph(graph: CompactGraph) -> ReducedGraph:
+    """Poda salas inútiles y contrae los pasillos (salas de grado 2) en aristas con peso
+
+    Para caminos disjuntos por salas el resultado es equivalente: un pasillo
+    sólo puede usarlo un camino, como un túnel de capacidad 1 y coste su
+    longitud. Entre dos cruces sólo sirve el pasillo más corto (ambos cruces
+    tienen capacidad 1), salvo entre ##start y ##end, donde se conservan todos.
+    """
+    t0 = time.perf_counter()
+    n = len(graph)
+    start, end = graph.start, graph.end
+    component, alive = _prune(graph)
+    unreachable = int(n - component.sum()) if alive.any() else n
+    pruned = int(component.sum() - alive.sum()) if alive.any() else 0
+
+    offsets, neighbors = graph.offsets.tolist(), graph.neighbors.tolist()
+    degree = [0] * n
+    for u in np.flatnonzero(alive).tolist():
+        degree[u] = sum(1 for v in neighbors[offsets[u]:offsets[u + 1]] if alive[v])
+    junction = [bool(alive[u]) and (degree[u] != 2 or u in (start, end)) for u in range(n)]
+
+    # Recorre cada pasillo una sola vez, desde un cruce hasta el siguiente
+    walked = [False] * n
+    best = {}           # (u, v) con u < v -> (peso, salas interiores de u a v)
+    parallel = []       # pasillos (y túnel directo) entre ##start y ##end
+    for u in (i for i in range(n) if junction[i]):
+        for first in neighbors[offsets[u]:offsets[u + 1]]:
+            if not alive[first] or walked[first] or (junction[first] and first < u):
+                continue
+            inner, prev, v = [], u, first
+            while not junction[v]:
+                walked[v] = True
+                inner.append(v)
+                a, b = [w for w in neighbors[offsets[v]:offsets[v + 1]] if alive[w]]
+                prev, v = v, (b if a == prev else a)
+            if v == u:
+                continue        # bucle: un camino simple no puede volver al mismo cruce
+            key = (u, v) if u < v else (v, u)
+            if u > v:
+                inner.reverse()
+            if {u, v} == {start, end}:
+                parallel.append((*key, len(inner) + 1, inner))
+            elif key not in best or len(inner) + 1 < best[key][0]:
+                best[key] = (len(inner) + 1, inner)
+    chains = [(u, v, w, inner) for (u, v), (w, inner) in best.items()] + parallel
+
+    kept = np.flatnonzero(np.array(junction, dtype=bool)) if n else np.zeros(0, dtype=np.int64)
+    remap = np.full(n, -1, dtype=np.int64)
+    remap[kept] = np.arange(len(kept))
+    edges = np.array([(remap[u], remap[v]) for u, v, _, _ in chains], dtype=np.int32).reshape(-1, 2)
+    weights = np.array([w for _, _, w, _ in chains], dtype=np.int64)
+    chain_offsets = np.zeros(len(chains) + 1, dtype=np.int64)
+    np.cumsum([len(inner) for _, _, _, inner in chains], out=chain_offsets[1:])
+    chain_rooms = np.array([r for _, _, _, inner in chains for r in inner], dtype=np.int64)
+
+    names = [graph.names[i] for i in kept.tolist()]
+    reduced = CompactGraph(names, {name: i for i, name in enumerate(names)}, graph.xs[kept], graph.ys[kept],
+                           graph.flags[kept], edges, len(edges))
+    return ReducedGraph(graph, reduced, kept, weights, chain_offsets, chain_rooms, pruned, unreachable,
+                        time.perf_counter() - t0)
+
+
+def main(argv=None):
+    """Informe de la reducción de un mapa y de la mejora que da al solver"""
+    parser = argparse.ArgumentParser(description="Poda de callejones y contracción de pasillos de un mapa")
+    parser.add_argument('input', nargs='?', help="mapa o salida de lem-in (por defecto stdin)")
+    parser.add_argument('--ants', type=int, help="número de hormigas (por defecto el del mapa)")
+    args = parser.parse_args(argv)
+
+    from ant_solver import solve
+    from ant_visualizer import parse_lem_in_with_simulation
+    stream = open(args.input) if args.input else sys.stdin
+    try:
+        num_ants, graph, _, _ = parse_lem_in_with_simulation(stream)
+    finally:
+        if args.input:
+            stream.close()
+    if args.ants is not None:
+        num_ants = args.ants
+
+    reduced = reduce_graph(graph)
+    r = reduced.report()
+    print(f"Salas: {r['rooms']} -> {r['reduced_rooms']} ({r['dead_ends']} en callejones, "
+          f"{r['unreachable']} inalcanzables, {r['contracted']} en pasillos contraídos)")
+    print(f"Túneles: {r['tunnels']} -> {r['reduced_tunnels']} | reducción en {r['seconds'] * 1000:.1f} ms")
+
+    t0 = time.perf_counter()
+    full_turns, _, _ = solve(graph, num_ants, reduce=False)
+    full = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    turns, _, _ = solve(graph, num_ants)
+    fast = time.perf_counter() - t0
+    print(f"Solver: {full * 1000:.0f} ms -> {fast * 1000:.0f} ms con la reducción "
+          f"(x{full / fast if fast else 0:.1f}) | turnos {full_turns} / {turns}")
+    if turns != full_turns:
+        sys.exit("ERROR: la reducción cambia el resultado del solver")
+
+
+if __name__ == "__main__":
+    main()
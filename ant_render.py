@@ -0,0 +1,861 @@
+#!/usr/bin/env python3
+
+from typing import TYPE_CHECKING, Callable, List, Optional, Tuple
+import matplotlib.pyplot as plt
+import matplotlib.colors as mcolors
+import numpy as np
+from matplotlib.artist import Artist
+from matplotlib.collections import LineCollection, PatchCollection, PathCollection
+from matplotlib.font_manager import FontProperties
+from matplotlib.patches import BoxStyle, Circle
+from matplotlib.transforms import IdentityTransform
+from ant_graph import CompactGraph, FLAG_START, FLAG_END
+from ant_profile import active as profile_active, stage
+
+if TYPE_CHECKING:
+    from ant_congestion import CongestionReport
+    from ant_visualizer import Path
+
+# Paleta de colores moderna para caminos
+PATH_COLORS = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8', 
+               '#F06292', '#AED581', '#FFB74D', '#BA68C8', '#81C784']
+
+LAYER_PAUSE = 0.001             # eventos de la ventana entre capas del dibujo progresivo (s)
+
+class _NodeHover:
+    """Tooltip de nodos sobre un índice espacial (rejilla uniforme de las coordenadas)
+
+    La rejilla se construye una sola vez; cada consulta pasa el radio de acierto
+    de píxeles a datos, visita sólo las celdas que lo cubren y elige el nodo más
+    cercano en pantalla. Los eventos de ratón se agrupan con un temporizador y
+    sólo se redibuja la anotación (blitting) cuando cambia el nodo señalado.
+    """
+    THROTTLE_MS = 16
+
+    def __init__(self, fig, ax, graph: CompactGraph, sizes: np.ndarray, pickradius: float = 5.0,
+                 coords: Optional[np.ndarray] = None):
+        self.fig = fig
+        self.ax = ax
+        self.graph = graph
+        # Posiciones dibujadas (pueden venir de ant_layout); el tooltip muestra las del mapa
+        self.coords = np.asarray(coords if coords is not None else np.column_stack((graph.xs, graph.ys)),
+                                 dtype=float)
+        self.radii = np.sqrt(np.broadcast_to(sizes, len(graph))) / 2     # en puntos
+        self.pickradius = pickradius                                       # trazo de acierto, en píxeles
+        self.current = -1
+        self.pending = None
+        self.background = None
+        self.external_draw = False      # True si otro bucle (animación) dibuja la anotación
+
+        # Rejilla de ~1 nodo por celda: nodos ordenados por celda y offsets estilo CSR
+        self.cells = max(int(np.sqrt(len(graph))), 1)
+        self.origin = self.coords.min(axis=0) if len(graph) else np.zeros(2)
+        span = self.coords.max(axis=0) - self.origin if len(graph) else np.ones(2)
+        self.cell_size = np.maximum(span / self.cells, 1e-9)
+        cx, cy = self._cell_of(self.coords).T
+        keys = cx * self.cells + cy
+        self.order = np.argsort(keys, kind='stable')
+        self.offsets = np.searchsorted(keys[self.order], np.arange(self.cells * self.cells + 1))
+
+        canvas = fig.canvas
+        self.annot = ax.annotate('', xy=(0,0), xytext=(20,20), textcoords="offset points",
+                           bbox=dict(boxstyle="round,pad=0.8", facecolor='#2D2D2D', 
+                                   edgecolor='#00FF88', linewidth=2, alpha=0.95),
+                           arrowprops=dict(arrowstyle="->", connectionstyle="arc3,rad=0.3",
+                                         color='#00FF88', linewidth=2),
+                           fontsize=12, fontweight='bold', color='white',
+                           zorder=1000, animated=canvas.supports_blit)
+        self.annot.set_visible(False)
+
+        self.timer = canvas.new_timer(interval=self.THROTTLE_MS)
+        self.timer.single_shot = True
+        self.timer.add_callback(self._process)
+        # Backends sin bucle de eventos (Agg, pdf...) no declaran framework y su temporizador no dispara nunca
+        self.throttled = canvas.required_interactive_framework is not None
+        self.waiting = False
+        canvas.mpl_connect('motion_notify_event', self._on_motion)
+        canvas.mpl_connect('draw_event', self._on_draw)
+
+    def _cell_of(self, points: np.ndarray) -> np.ndarray:
+        cell = np.floor((points - self.origin) / self.cell_size).astype(np.int64)
+        return np.clip(cell, 0, self.cells - 1)
+
+    def nearest(self, x: float, y: float) -> int:
+        """Nodo bajo el punto de pantalla (x, y) en píxeles, o -1"""
+        if not len(self.coords):
+            return -1
+        px_per_pt = self.fig.dpi / 72
+        reach = float(self.radii.max()) * px_per_pt + self.pickradius / 2
+        corners = self.ax.transData.inverted().transform([(x - reach, y - reach), (x + reach, y + reach)])
+        (cx0, cy0), (cx1, cy1) = self._cell_of(np.sort(corners, axis=0))
+        offsets = self.offsets
+        candidates = np.concatenate([
+            self.order[offsets[cx * self.cells + cy0]:offsets[cx * self.cells + cy1 + 1]]
+            for cx in range(cx0, cx1 + 1)])
+        if not len(candidates):
+            return -1
+        screen = self.ax.transData.transform(self.coords[candidates])
+        dist2 = ((screen - (x, y)) ** 2).sum(axis=1)
+        dist2[dist2 > (self.radii[candidates] * px_per_pt + self.pickradius / 2) ** 2] = np.inf
+        best = int(np.argmin(dist2))
+        return int(candidates[best]) if np.isfinite(dist2[best]) else -1
+
+    def _on_motion(self, event):
+        self.pending = event
+        if not self.throttled:
+            self._process()
+        elif not self.waiting:
+            self.waiting = True
+            self.timer.start()
+
+    def _process(self):
+        self.waiting = False
+        event, self.pending = self.pending, None
+        node = -1
+        if event is not None and event.inaxes == self.ax:
+            node = self.nearest(event.x, event.y)
+        if node != self.current:
+            self.current = node
+            self._update_annot(node)
+            self._redraw()
+
+    def _update_annot(self, i: int):
+        if i < 0:
+            self.annot.set_visible(False)
+            return
+        graph = self.graph
+        pos = self.coords[i]
+        self.annot.xy = pos
+        
+        # Construir texto del tooltip con información del nodo
+        tooltip_text = f"NODE: {graph.names[i]}\nPOS: ({graph.xs[i]}, {graph.ys[i]})"
+        if graph.is_start(i):
+            tooltip_text += "\n[START]"
+        elif graph.is_end(i):
+            tooltip_text += "\n[END]"
+        
+        self.annot.set_text(tooltip_text)
+        # Ajustar posición para evitar que se salga de la pantalla
+        if pos[0] > self.ax.get_xlim()[1] * 0.8:  # Si está muy a la derecha
+            self.annot.set_position((-40, 20))  # Mover tooltip a la izquierda
+        else:
+            self.annot.set_position((20, 20))  # Posición normal
+        self.annot.set_visible(True)
+
+    def _on_draw(self, _):
+        # La anotación es animada: no entra en el dibujo completo, se guarda el fondo sin ella
+        canvas = self.fig.canvas
+        if self.annot.get_animated() and not self.external_draw:
+            self.background = canvas.copy_from_bbox(self.fig.bbox)
+            if self.annot.get_visible():
+                self.ax.draw_artist(self.annot)
+
+    def _redraw(self):
+        if self.external_draw:
+            return
+        canvas = self.fig.canvas
+        if self.background is None or not self.annot.get_animated():
+            canvas.draw_idle()
+            return
+        canvas.restore_region(self.background)
+        if self.annot.get_visible():
+            self.ax.draw_artist(self.annot)
+        canvas.blit(self.fig.bbox)
+
+
+def _add_interactive_tooltip(fig, ax, scatter, graph: CompactGraph,
+                             coords: Optional[np.ndarray] = None) -> _NodeHover:
+    """Añade tooltip interactivo con estilo mejorado"""
+    return _NodeHover(fig, ax, graph, scatter.get_sizes(), scatter.get_pickradius(), coords)
+
+def _apply_dark_theme(fig, ax):
+    """Aplica tema oscuro elegante"""
+    # Configurar colores de fondo
+    fig.patch.set_facecolor('#0F0F0F')
+    ax.set_facecolor('#1A1A1A')
+    
+    # Configurar grid con estilo futurista
+    ax.grid(True, alpha=0.3, color='#333333', linewidth=0.8, linestyle='--')
+    
+    # Configurar ejes
+    ax.spines['bottom'].set_color('#555555')
+    ax.spines['top'].set_color('#555555')
+    ax.spines['right'].set_color('#555555')
+    ax.spines['left'].set_color('#555555')
+    ax.spines['bottom'].set_linewidth(2)
+    ax.spines['top'].set_linewidth(2)
+    ax.spines['right'].set_linewidth(2)
+    ax.spines['left'].set_linewidth(2)
+    
+    # Configurar etiquetas de ejes
+    ax.tick_params(axis='x', colors='#CCCCCC', labelsize=10)
+    ax.tick_params(axis='y', colors='#CCCCCC', labelsize=10)
+    ax.xaxis.label.set_color('#CCCCCC')
+    ax.yaxis.label.set_color('#CCCCCC')
+    ax.xaxis.label.set_fontsize(12)
+    ax.yaxis.label.set_fontsize(12)
+    ax.xaxis.label.set_fontweight('bold')
+    ax.yaxis.label.set_fontweight('bold')
+
+def _add_glow_effect(ax, xs, ys, color, size=50):
+    """Añade efecto de resplandor a los nodos importantes (un único artista)"""
+    # Crear círculos concéntricos para el efecto de resplandor
+    circles = []
+    facecolors = []
+    for x, y in zip(xs, ys):
+        for i in range(3):
+            alpha = 0.1 - i * 0.03
+            radius = size * (1 + i * 0.3)
+            circles.append(Circle((x, y), radius))
+            facecolors.append(mcolors.to_rgba(color, alpha))
+    if circles:
+        return ax.add_collection(PatchCollection(circles, facecolors=facecolors,
+                                                 edgecolors='none', zorder=1))
+    return None
+
+
+class _NodeLabels(Artist):
+    """Etiquetas de nodos dibujadas en lote (equivale a un annotate por nodo)
+
+    Las cajas redondeadas se dibujan como una sola PathCollection en
+    coordenadas de pantalla y los textos directamente con el renderer,
+    en lugar de crear un Annotation + FancyBboxPatch por nodo.
+    """
+
+    def __init__(self, xs, ys, names: List[str], text_colors, box_edgecolors,
+                 fontsize=9, offset=(8, 8), pad=0.3):
+        super().__init__()
+        self.xy = np.column_stack((xs, ys)).astype(float)
+        self.names = names
+        self.text_colors = [mcolors.to_rgba(c) for c in text_colors]
+        self.prop = FontProperties(size=fontsize, weight='bold')
+        self.fontsize = fontsize
+        self.offset = offset
+        self.boxstyle = BoxStyle.Round(pad=pad)
+        self._box_edgecolors = mcolors.to_rgba_array(box_edgecolors, 0.8)
+        self.boxes = PathCollection([], facecolors=mcolors.to_rgba('#2D2D2D', 0.8),
+                                    edgecolors=self._box_edgecolors,
+                                    linewidths=1, transform=IdentityTransform())
+        self._extents = {}
+        self.subset = None          # índices a dibujar (None: todas), ver _LevelOfDetail
+
+    def _text_extent(self, renderer, name):
+        key = (name, renderer.dpi)
+        extent = self._extents.get(key)
+        if extent is None:
+            extent = renderer.get_text_width_height_descent(name, self.prop, ismath=False)
+            self._extents[key] = extent
+        return extent
+
+    def draw(self, renderer):
+        if not self.get_visible() or not self.names:
+            return
+        with stage('draw labels'):
+            self._draw(renderer)
+
+    def _draw(self, renderer):
+        xy, names, text_colors = self.xy, self.names, self.text_colors
+        if self.subset is not None:
+            xy = xy[self.subset]
+            names = [names[i] for i in self.subset.tolist()]
+            text_colors = [text_colors[i] for i in self.subset.tolist()]
+            self.boxes.set_edgecolor(self._box_edgecolors[self.subset])
+        points = renderer.points_to_pixels(1.0)
+        anchors = self.axes.transData.transform(xy)
+        anchors[:, 0] += self.offset[0] * points
+        anchors[:, 1] += self.offset[1] * points
+        mutation_size = self.fontsize * points
+        
+        extents = [self._text_extent(renderer, name) for name in names]
+        self.boxes.set_paths([self.boxstyle(x, y - d, w, h, mutation_size)
+                              for (x, y), (w, h, d) in zip(anchors, extents)])
+        self.boxes.set_figure(self.figure)
+        self.boxes.draw(renderer)
+        
+        renderer.open_group('node_labels', gid=self.get_gid())
+        gc = renderer.new_gc()
+        flip = renderer.height if renderer.flipy() else None
+        for (x, y), name, color in zip(anchors, names, text_colors):
+            gc.set_foreground(color)
+            renderer.draw_text(gc, x, flip - y if flip is not None else y, name, self.prop, 0,
+                               ismath=False)
+        gc.restore()
+        renderer.close_group('node_labels')
+        self.stale = False
+
+class _BoxIndex:
+    """Índice espacial de cajas alineadas (aristas o puntos) en una jerarquía de rejillas
+
+    Cada caja se guarda una sola vez, en el nivel más fino en el que ocupa como
+    mucho 2x2 celdas (rejilla holgada); la rejilla base tiene ~1 caja por celda
+    y cada nivel dobla el tamaño de celda. Una consulta visita en cada nivel las
+    celdas que cubren la vista (ampliada en una celda hacia abajo) y filtra los
+    candidatos por intersección exacta: el coste depende de lo visible, no del total.
+    """
+
+    def __init__(self, lo: np.ndarray, hi: np.ndarray):
+        self.lo, self.hi = lo, hi
+        m = len(lo)
+        self.side = 1 << max(int(np.ceil(np.log2(max(np.sqrt(m), 1.0)))), 0)
+        self.origin = lo.min(axis=0) if m else np.zeros(2)
+        span = hi.max(axis=0) - self.origin if m else np.ones(2)
+        self.cell = np.maximum(span / self.side, 1e-9)
+        c0, c1 = self._cell_of(lo), self._cell_of(hi)
+        level = np.full(m, -1, dtype=np.int64)
+        self.levels = []
+        for l in range(int(np.log2(self.side)) + 1):
+            fits = (level < 0) & (((c1 >> l) - (c0 >> l)).max(axis=1) <= 1) if m else level < 0
+            level[fits] = l
+            ids = np.flatnonzero(level == l)
+            side = self.side >> l
+            keys = (c0[ids, 0] >> l) * side + (c0[ids, 1] >> l)
+            order = np.argsort(keys, kind='stable')
+            self.levels.append((side, ids[order], np.searchsorted(keys[order], np.arange(side * side + 1))))
+
+    def _cell_of(self, points: np.ndarray) -> np.ndarray:
+        cell = np.floor((points - self.origin) / self.cell).astype(np.int64)
+        return np.clip(cell, 0, self.side - 1)
+
+    def _ranges(self, x0: float, y0: float, x1: float, y1: float):
+        """(ids ordenados, inicios, finales) de los tramos de celdas que cubren la vista en cada nivel"""
+        a = np.floor((np.array([x0, y0]) - self.origin) / self.cell).astype(np.int64)
+        b = np.floor((np.array([x1, y1]) - self.origin) / self.cell).astype(np.int64)
+        for l, (side, order, offsets) in enumerate(self.levels):
+            if not len(order):
+                continue
+            lo = np.clip((a >> l) - 1, 0, side - 1)
+            hi = np.clip(b >> l, 0, side - 1)
+            columns = np.arange(lo[0], hi[0] + 1) * side
+            yield order, offsets[columns + lo[1]], offsets[columns + hi[1] + 1]
+
+    def count(self, x0: float, y0: float, x1: float, y1: float) -> int:
+        """Cota superior de las cajas en la vista, sin recorrerlas (sólo offsets)"""
+        return int(sum((ends - starts).sum() for _, starts, ends in self._ranges(x0, y0, x1, y1)))
+
+    def query(self, x0: float, y0: float, x1: float, y1: float) -> np.ndarray:
+        """Índices (ordenados) de las cajas que cortan la vista"""
+        parts = [order[start:end] for order, starts, ends in self._ranges(x0, y0, x1, y1)
+                 for start, end in zip(starts.tolist(), ends.tolist()) if end > start]
+        if not parts:
+            return np.zeros(0, dtype=np.int64)
+        ids = np.concatenate(parts)
+        lo, hi = self.lo[ids], self.hi[ids]
+        keep = (lo[:, 0] <= x1) & (hi[:, 0] >= x0) & (lo[:, 1] <= y1) & (hi[:, 1] >= y0)
+        return np.sort(ids[keep])
+
+
+class _LevelOfDetail(Artist):
+    """Nivel de detalle según la vista: recorta nodos, túneles y etiquetas antes de dibujarlos
+
+    Es el primer artista de los ejes (zorder mínimo) y no dibuja nada propio:
+    cuando cambian los límites (xlim_changed/ylim_changed) o el tamaño, ajusta
+    los datos del resto de artistas a lo que cae en la vista. Con pocos nodos
+    visibles se muestran etiquetas y resplandores; con muchos, los nodos y
+    túneles se sustituyen por un sombreado de densidad precalculado. Caminos,
+    ##start y ##end se dibujan siempre.
+    """
+    LABEL_NODES = 300           # etiquetas y resplandores con como mucho tantos nodos visibles
+    OVERVIEW_NODES = 4000       # por encima, sombreado de densidad en lugar de nodos y túneles
+    OVERVIEW_EDGES = 1500       # ídem con túneles visibles (cada uno es un trazo aparte en Agg)
+    DENSITY_CELLS = 512         # resolución de la rejilla de densidad (celdas por lado)
+
+    def __init__(self, ax, coords: np.ndarray, scatter, edges: np.ndarray, edge_collections,
+                 path_collections, labels: '_NodeLabels', glows):
+        super().__init__()
+        self.set_zorder(-1)
+        self.set_in_layout(False)
+        self.coords = coords
+        self.scatter = scatter
+        self.edges = edges
+        self.edge_collections = edge_collections
+        self.labels = labels
+        self.glows = [glow for glow in glows if glow is not None]
+        # Estilo completo de los nodos, para recortarlo por índices
+        self.sizes = np.broadcast_to(scatter.get_sizes(), len(coords)).copy()
+        self.facecolors = np.broadcast_to(scatter.get_facecolors(), (len(coords), 4)).copy()
+        self.edgecolors = np.broadcast_to(scatter.get_edgecolors(), (len(coords), 4)).copy()
+        self.nodes = _BoxIndex(coords, coords)
+        if len(edges):
+            a, b = coords[edges[:, 0]], coords[edges[:, 1]]
+            self.edge_index = _BoxIndex(np.minimum(a, b), np.maximum(a, b))
+        else:
+            self.edge_index = None
+        # Caminos: siempre visibles, pero sólo con los segmentos que caen en la vista
+        self.path_collections = path_collections
+        self.path_styles = []
+        self.path_index = None
+        if path_collections:
+            segments = np.array(path_collections[0].get_segments(), dtype=float)
+            self.path_segments = segments
+            for collection in path_collections:
+                self.path_styles.append(
+                    (np.broadcast_to(collection.get_colors(), (len(segments), 4)).copy(),
+                     np.broadcast_to(collection.get_linewidths(), len(segments)).copy()))
+            self.path_index = _BoxIndex(segments.min(axis=1), segments.max(axis=1))
+        self.density = None         # se calcula la primera vez que hace falta
+        colormap = mcolors.LinearSegmentedColormap.from_list(
+            'lem_in_density', [mcolors.to_rgba('#4A9EFF', 0.0), mcolors.to_rgba('#4A9EFF', 0.55),
+                               mcolors.to_rgba('#CCE4FF', 0.95)])
+        # La imagen se crea ya: un artista añadido durante el dibujado no entra en esa pasada
+        low, high = coords.min(axis=0), coords.max(axis=0)
+        self.image = ax.imshow(np.zeros((1, 1), dtype=np.float32), origin='lower', cmap=colormap,
+                               extent=(low[0], high[0], low[1], high[1]), interpolation='antialiased',
+                               aspect='auto', zorder=1.5, visible=False)
+        self.image.set_in_layout(False)
+        self.mode = None
+        self._view = None
+        ax.callbacks.connect('xlim_changed', self._on_limits)
+        ax.callbacks.connect('ylim_changed', self._on_limits)
+
+    def _on_limits(self, _):
+        self._view = None
+
+    def draw(self, renderer):
+        ax = self.axes
+        view = (tuple(ax.viewLim.bounds), tuple(ax.bbox.size))
+        if view == self._view:
+            return
+        self._view = view
+        with stage('level of detail'):
+            (x0, x1), (y0, y1) = sorted(ax.get_xlim()), sorted(ax.get_ylim())
+            visible = self._within(self.nodes, self.OVERVIEW_NODES, x0, y0, x1, y1)
+            shown = np.zeros(0, dtype=np.int64)
+            if visible is not None and self.edge_index is not None:
+                shown = self._within(self.edge_index, self.OVERVIEW_EDGES, x0, y0, x1, y1)
+            if visible is None or shown is None:
+                self._overview(x0, y0, x1, y1)
+            else:
+                self._detail(visible, shown)
+            if self.path_index is not None:
+                ids = self.path_index.query(x0, y0, x1, y1)
+                for collection, (colors, widths) in zip(self.path_collections, self.path_styles):
+                    collection.set_segments(self.path_segments[ids])
+                    collection.set_colors(colors[ids])
+                    collection.set_linewidths(widths[ids])
+
+    @staticmethod
+    def _within(index: '_BoxIndex', limit: int, x0: float, y0: float, x1: float, y1: float):
+        """Elementos del índice dentro de la vista, o None si pasan de limit"""
+        if index.count(x0, y0, x1, y1) > 4 * limit:
+            return None         # la cota ya descarta el detalle sin filtrar uno a uno
+        ids = index.query(x0, y0, x1, y1)
+        return ids if len(ids) <= limit else None
+
+    def _detail(self, visible: np.ndarray, shown: np.ndarray):
+        self.mode = 'detail'
+        scatter = self.scatter
+        scatter.set_offsets(self.coords[visible])
+        scatter.set_sizes(self.sizes[visible])
+        scatter.set_facecolors(self.facecolors[visible])
+        scatter.set_edgecolors(self.edgecolors[visible])
+        scatter.set_visible(True)
+        if self.edge_index is not None:
+            shown = self.edges[shown]
+            segments = np.stack((self.coords[shown[:, 0]], self.coords[shown[:, 1]]), axis=1)
+            for collection in self.edge_collections:
+                collection.set_segments(segments)
+                collection.set_visible(True)
+        close = len(visible) <= self.LABEL_NODES
+        self.labels.subset = visible
+        self.labels.set_visible(close)
+        for glow in self.glows:
+            glow.set_visible(close)
+        self.image.set_visible(False)
+
+    def _overview(self, x0: float, y0: float, x1: float, y1: float):
+        self.mode = 'overview'
+        self.scatter.set_visible(False)
+        for artist in self.edge_collections + self.glows + [self.labels]:
+            artist.set_visible(False)
+        if self.density is None:
+            self.density = self._build_density()
+        grid, origin, cell = self.density
+        n = self.DENSITY_CELLS
+        (i0, j0), (i1, j1) = np.clip(np.floor((np.array([[x0, y0], [x1, y1]]) - origin) / cell).astype(np.int64),
+                                     0, n - 1)
+        crop = grid[i0:i1 + 1, j0:j1 + 1].T
+        extent = (origin[0] + i0 * cell[0], origin[0] + (i1 + 1) * cell[0],
+                  origin[1] + j0 * cell[1], origin[1] + (j1 + 1) * cell[1])
+        self.image.set_data(crop)
+        self.image.set_extent(extent)
+        self.image.set_clim(0, max(float(grid.max()), 1e-9))
+        self.image.set_visible(True)
+
+    def _build_density(self):
+        """Rejilla (DENSITY_CELLS²) con log(1 + nodos y muestras de túneles) por celda"""
+        n = self.DENSITY_CELLS
+        coords = self.coords
+        origin = coords.min(axis=0)
+        cell = np.maximum((coords.max(axis=0) - origin) / n, 1e-9)
+        points = [coords]
+        if len(self.edges):
+            # Muestras a lo largo de cada túnel, ~1 por celda que atraviesa (máximo 64)
+            a, b = coords[self.edges[:, 0]], coords[self.edges[:, 1]]
+            steps = np.clip(np.ceil((np.abs(b - a) / cell).max(axis=1)), 1, 64).astype(np.int64)
+            edge = np.repeat(np.arange(len(a)), steps)
+            t = (np.arange(len(edge)) - np.repeat(np.cumsum(steps) - steps, steps) + 0.5) / steps[edge]
+            points.append(a[edge] + (b[edge] - a[edge]) * t[:, None])
+        cells = np.clip(np.floor((np.concatenate(points) - origin) / cell).astype(np.int64), 0, n - 1)
+        grid = np.bincount(cells[:, 0] * n + cells[:, 1], minlength=n * n).reshape(n, n)
+        return np.log1p(grid).astype(np.float32), origin, cell
+
+
+def _draw_connections(ax, graph: CompactGraph, coords: np.ndarray, path_indices: List[List[int]]):
+    """Dibuja los túneles que no forman parte de un camino como dos LineCollection
+
+    Devuelve (aristas dibujadas, colecciones) para el nivel de detalle.
+    """
+    edges = graph.edges
+    # Excluir conexiones de caminos (en ambos sentidos) comparando claves a * n + b
+    n = len(graph)
+    path_keys = [a * n + b for indices in path_indices
+                 for a, b in zip(indices, indices[1:]) if a >= 0 and b >= 0]
+    if path_keys and len(edges):
+        keys = edges[:, 0].astype(np.int64) * n + edges[:, 1]
+        path_keys = np.array(path_keys, dtype=np.int64)
+        reverse = (path_keys % n) * n + path_keys // n
+        edges = edges[~np.isin(keys, np.concatenate((path_keys, reverse)))]
+    if not len(edges):
+        return edges, []
+    segments = np.stack((coords[edges[:, 0]], coords[edges[:, 1]]), axis=1)
+    
+    # Línea principal
+    main = ax.add_collection(LineCollection(segments, colors='#444444', linewidths=1.5, alpha=0.7,
+                                            capstyle='projecting', zorder=2), autolim=False)
+    # Línea de brillo sutil
+    shine = ax.add_collection(LineCollection(segments, colors='#666666', linewidths=0.5, alpha=0.5,
+                                             capstyle='projecting', zorder=2), autolim=False)
+    return edges, [main, shine]
+
+def _draw_paths(ax, paths: List['Path'], path_indices: List[List[int]], coords: np.ndarray,
+                path_colors: List[str]):
+    """Dibuja los caminos resaltados: una LineCollection por capa (fondo, principal, brillo)
+
+    Devuelve las colecciones (todas con los mismos segmentos) para el nivel de detalle.
+    """
+    segments = []
+    colors = []
+    widths = []
+    for i, (path, indices) in enumerate(zip(paths, path_indices)):
+        color = path_colors[i % len(path_colors)]
+        # Calcular grosor basado en el número de hormigas
+        base_width = max(4, min(12, 3 + path.ant_count * 0.6))
+        for a, b in zip(indices, indices[1:]):
+            if a >= 0 and b >= 0:
+                segments.append((coords[a], coords[b]))
+                colors.append(color)
+                widths.append(base_width)
+    if not segments:
+        return []
+    widths = np.array(widths, dtype=float)
+    
+    # Línea de fondo (más gruesa, más oscura)
+    back = ax.add_collection(LineCollection(segments, colors=colors, linewidths=widths + 2, alpha=0.4,
+                                            capstyle='projecting', zorder=3), autolim=False)
+    # Línea principal
+    main = ax.add_collection(LineCollection(segments, colors=colors, linewidths=widths, alpha=0.9,
+                                            capstyle='projecting', zorder=4), autolim=False)
+    # Línea de brillo
+    shine = ax.add_collection(LineCollection(segments, colors='white', linewidths=widths * 0.3, alpha=0.6,
+                                             capstyle='projecting', zorder=5), autolim=False)
+    return [back, main, shine]
+
+def _set_title(ax, num_ants: int, graph: CompactGraph, paths: Optional[List['Path']]):
+    # Configurar título con estilo futurista
+    title = f'Lem-in Graph Visualizer\n{num_ants} ants • {len(graph)} nodes • {graph.link_lines} connections'
+    if paths:
+        title += f' • {len(paths)} path(s) found'
+
+    ax.set_title(title, fontsize=16, fontweight='bold', color='#FFFFFF', 
+                pad=20, bbox=dict(boxstyle='round,pad=1', facecolor='#333333', 
+                                alpha=0.8, edgecolor='#00FF88', linewidth=2))
+
+def _add_legend(ax, paths: Optional[List['Path']]):
+    # Crear leyenda con estilo mejorado (sustituye a la anterior si la hay)
+    legend_elements = [
+        plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#00FF88', 
+                   markersize=12, label='START', markeredgecolor='#00CC66', 
+                   markeredgewidth=2),
+        plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#FF4444', 
+                   markersize=12, label='END', markeredgecolor='#CC2222',
+                   markeredgewidth=2),
+        plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#4A9EFF', 
+                   markersize=10, label='NODE', markeredgecolor='#3A7ECC',
+                   markeredgewidth=2),
+        plt.Line2D([0], [0], color='#666666', linewidth=3, label='CONNECTION')
+    ]
+
+    # Añadir caminos a la leyenda
+    if paths:
+        for i, path in enumerate(paths):
+            color = PATH_COLORS[i % len(PATH_COLORS)]
+            legend_elements.append(
+                plt.Line2D([0], [0], color=color, linewidth=4, 
+                          label=f'Path {path.path_num} ({path.ant_count} ants)')
+            )
+
+    # Configurar leyenda con estilo oscuro
+    legend = ax.legend(handles=legend_elements, loc='upper right', 
+                      frameon=True, fancybox=True, shadow=True,
+                      facecolor='#2D2D2D', edgecolor='#555555', 
+                      fontsize=10, labelcolor='#CCCCCC')
+    legend.get_frame().set_alpha(0.9)
+    legend.get_frame().set_linewidth(2)
+
+HEAT_LABELS = {
+    'ant_turns': 'Hormiga-turnos por sala',
+    'waits': 'Turnos de espera por sala',
+    'peak': 'Máximo de hormigas a la vez',
+    'entries': 'Hormigas que pasan por la sala',
+}
+
+def add_heatmap(ax, graph: CompactGraph, report: 'CongestionReport', metric: str = 'ant_turns'):
+    """Superpone la congestión de ant_congestion: túneles por tráfico y salas por metric
+
+    Sólo se dibuja lo que usa la simulación, por encima de las etiquetas;
+    ##start y ##end quedan fuera de la escala de color (acumulan todas las hormigas).
+    """
+    coords = ax.node_coords
+    cmap = plt.get_cmap('inferno')
+    traffic = report.traffic
+    used = np.flatnonzero(traffic > 0)
+    if len(used):
+        edges = graph.edges[used]
+        segments = np.stack((coords[edges[:, 0]], coords[edges[:, 1]]), axis=1)
+        weight = traffic[used] / traffic[used].max()
+        ax.add_collection(LineCollection(segments, colors=cmap(0.3 + 0.7 * weight), linewidths=1 + 5 * weight,
+                                         alpha=0.9, capstyle='round', zorder=7.5), autolim=False)
+    values = report.room_metric(metric)
+    inner = values > 0
+    inner[[i for i in (graph.start, graph.end) if i >= 0]] = False
+    rooms = np.flatnonzero(inner)
+    if not len(rooms):
+        return
+    heat = ax.scatter(coords[rooms, 0], coords[rooms, 1], c=values[rooms], cmap=cmap, vmin=0, s=110,
+                      edgecolors='#000000', linewidths=0.6, zorder=8)
+    colorbar = ax.figure.colorbar(heat, ax=ax, fraction=0.03, pad=0.01)
+    colorbar.set_label(f"{HEAT_LABELS[metric]} (túneles: hormigas que los cruzan)", color='#CCCCCC')
+    colorbar.ax.tick_params(colors='#CCCCCC')
+    colorbar.outline.set_edgecolor('#555555')
+
+def add_paths(ax, num_ants: int, graph: CompactGraph, paths: List['Path'], first: int = 0):
+    """Dibuja paths[first:] sobre una figura de render_graph y actualiza título y leyenda
+
+    Para caminos que llegan después de dibujar el grafo (ver ant_live); los
+    colores siguen la misma secuencia que en render_graph.
+    """
+    new = paths[first:]
+    if not new:
+        return
+    shift = first % len(PATH_COLORS)
+    _draw_paths(ax, new, [graph.indices_of(path.nodes) for path in new], ax.node_coords,
+                PATH_COLORS[shift:] + PATH_COLORS[:shift])
+    _set_title(ax, num_ants, graph, paths)
+    _add_legend(ax, paths)
+
+def new_figure(figsize: Tuple[float, float] = (16, 12)):
+    """Figura vacía con el tema oscuro; devuelve (fig, ax)
+
+    Es lo único que necesita el backend: ant_visualizer la crea mientras otro
+    hilo o proceso parsea la entrada (ver _run_gui_overlapped).
+    """
+    plt.style.use('dark_background')
+    fig, ax = plt.subplots(figsize=figsize)
+    _apply_dark_theme(fig, ax)
+    return fig, ax
+
+def render_layers(fig, ax, num_ants: int, graph: CompactGraph, paths: List['Path'] = None,
+                  interactive: bool = True, coords: Optional[np.ndarray] = None, lod: Optional[bool] = None,
+                  heatmap: Optional['CongestionReport'] = None, heat_metric: str = 'ant_turns',
+                  preview: bool = False):
+    """Dibuja el grafo sobre (fig, ax) por capas; generador que cede el nombre de cada una
+
+    'nodes': límites, título y, con preview, las salas como puntos de un solo
+    estilo (un único sello de marcador en Agg) y el layout; 'paths': caminos y
+    resaltado de ##start/##end; 'edges': salas, túneles, etiquetas, tooltip,
+    nivel de detalle, congestión y leyenda. Cada capa tiene su propio zorder,
+    así que el resultado final es el mismo que dibujándolo todo de una vez.
+    """
+    if coords is None:
+        coords = np.column_stack((graph.xs, graph.ys))
+    ax.node_coords = coords
+    xs, ys = coords[:, 0], coords[:, 1]
+    
+    # Índices de sala de cada camino (-1 si el nombre no existe en el grafo)
+    path_indices = [graph.indices_of(path.nodes) for path in paths] if paths else []
+    
+    # Preparar datos para nodos con colores mejorados
+    is_start = (graph.flags & FLAG_START) != 0
+    is_end = ((graph.flags & FLAG_END) != 0) & ~is_start
+    special = is_start | is_end
+    node_sizes = np.where(special, 300, 150)
+    node_colors = np.where(is_start, '#00FF88', np.where(is_end, '#FF4444', '#4A9EFF'))
+    
+    dots = None
+    if preview:
+        dots, = ax.plot(xs, ys, linestyle='none', marker='o', markersize=6, color='#4A9EFF',
+                        alpha=0.7, markeredgewidth=0, zorder=6)
+    
+    # Ajustar límites con márgenes elegantes
+    if len(graph):
+        min_x, max_x = float(xs.min()), float(xs.max())
+        min_y, max_y = float(ys.min()), float(ys.max())
+        margin_x = max(5, (max_x - min_x) * 0.15)
+        margin_y = max(5, (max_y - min_y) * 0.15)
+        
+        ax.set_xlim(min_x - margin_x, max_x + margin_x)
+        ax.set_ylim(min_y - margin_y, max_y + margin_y)
+    
+    with stage('decor'):
+        _set_title(ax, num_ants, graph, paths)
+    
+        # Etiquetas de ejes con estilo
+        ax.set_xlabel('X Coordinate', fontsize=12, fontweight='bold', color='#CCCCCC')
+        ax.set_ylabel('Y Coordinate', fontsize=12, fontweight='bold', color='#CCCCCC')
+        if preview:
+            # Título y ejes fijan los márgenes: el tight_layout final apenas los mueve
+            fig.tight_layout()
+    yield 'nodes'
+    
+    path_collections = []
+    if paths:
+        with stage('paths'):
+            path_collections = _draw_paths(ax, paths, path_indices, coords, PATH_COLORS)
+    
+    with stage('nodes'):
+        # Añadir efectos de resplandor a nodos especiales
+        glows = [_add_glow_effect(ax, xs[is_start], ys[is_start], '#00FF88', 15),
+                 _add_glow_effect(ax, xs[is_end], ys[is_end], '#FF4444', 15)]
+    
+        # Añadir segundo anillo para nodos especiales (una sola colección, detrás
+        # de la línea de brillo de los caminos, con la que comparte zorder)
+        if special.any():
+            ax.scatter(xs[special], ys[special], s=node_sizes[special] * 1.3, 
+                      c='none', edgecolors=node_colors[special], linewidth=1, 
+                      alpha=0.6, zorder=5)
+    yield 'paths'
+    
+    with stage('edges'):
+        edges, edge_collections = _draw_connections(ax, graph, coords, path_indices)
+    
+    with stage('nodes'):
+        edge_colors = np.where(is_start, '#00CC66', np.where(is_end, '#CC2222', '#3A7ECC'))
+    
+        # Crear gráfico de nodos con efectos mejorados
+        scatter = ax.scatter(xs, ys, s=node_sizes, c=node_colors, 
+                            alpha=0.9, edgecolors=edge_colors, linewidth=2.5, 
+                            zorder=6, marker='o')
+        if dots is not None:
+            dots.remove()
+    
+    # Añadir nombres de nodos con estilo mejorado
+    text_colors = np.where(is_start, '#00FF88', np.where(is_end, '#FF4444', '#CCCCCC'))
+    box_edgecolors = np.where(is_start, '#00FF88', np.where(is_end, '#FF4444', '#555555'))
+    labels = _NodeLabels(xs, ys, graph.names, text_colors, box_edgecolors)
+    labels.set_zorder(7)
+    ax.add_artist(labels)
+    
+    # Añadir interactividad
+    if interactive:
+        ax.node_hover = _add_interactive_tooltip(fig, ax, scatter, graph, coords)
+    if (lod if lod is not None else interactive) and len(graph):
+        ax.add_artist(_LevelOfDetail(ax, np.asarray(coords, dtype=float), scatter, edges,
+                                     edge_collections, path_collections, labels, glows))
+    
+    if heatmap is not None:
+        with stage('heatmap'):
+            add_heatmap(ax, graph, heatmap, heat_metric)
+    
+    with stage('decor'):
+        _add_legend(ax, paths)
+    
+    with stage('tight_layout'):
+        fig.tight_layout()
+    yield 'edges'
+
+def render_graph(num_ants: int, graph: CompactGraph, paths: List['Path'] = None,
+                 figsize: Tuple[float, float] = (16, 12), interactive: bool = True,
+                 coords: Optional[np.ndarray] = None, lod: Optional[bool] = None,
+                 heatmap: Optional['CongestionReport'] = None, heat_metric: str = 'ant_turns'):
+    """Construye la figura con los nodos, conexiones y caminos; devuelve (fig, ax)
+
+    coords (n, 2) sustituye a las coordenadas del mapa al dibujar (ver
+    ant_layout); queda en ax.node_coords para la animación. lod (por defecto,
+    en modo interactivo) recorta lo dibujado a la vista en cada zoom y
+    desplazamiento (ver _LevelOfDetail); sin él se dibuja todo siempre.
+    heatmap superpone la congestión de la simulación (ver add_heatmap).
+    """
+    # Crear figura con estilo moderno
+    with stage('setup'):
+        fig, ax = new_figure(figsize)
+    for _ in render_layers(fig, ax, num_ants, graph, paths, interactive, coords, lod, heatmap, heat_metric):
+        pass
+    return fig, ax
+
+def show_graph(num_ants: int, graph: CompactGraph, paths: List['Path'] = None,
+               coords: Optional[np.ndarray] = None, lod: bool = True,
+               heatmap: Optional['CongestionReport'] = None, heat_metric: str = 'ant_turns',
+               figure=None, progressive: bool = False,
+               first_frame: Optional[Callable[[str], None]] = None):
+    """Muestra los nodos y conexiones en una ventana interactiva con estilo mejorado
+
+    figure es un (fig, ax) de new_figure ya creado. Con progressive la ventana
+    se abre con la vista previa (sólo salas) y cada capa de render_layers se
+    pinta en cuanto está lista. first_frame(capa) se llama al terminar el
+    primer dibujado de la ventana.
+    """
+    if not len(graph):
+        print("No hay nodos para mostrar")
+        return
+    
+    drawn = []
+    with stage('render'):
+        if figure is None:
+            with stage('setup'):
+                figure = new_figure()
+        fig, ax = figure
+    
+        # Configurar ventana
+        fig.canvas.toolbar_visible = True
+        fig.canvas.manager.set_window_title('Lem-in Graph Visualizer - Dark Theme')
+    
+        if first_frame is not None:
+            def on_draw(_):
+                fig.canvas.mpl_disconnect(cid)
+                first_frame(drawn[-1])
+            cid = fig.canvas.mpl_connect('draw_event', on_draw)
+    
+        for layer in render_layers(fig, ax, num_ants, graph, paths, coords=coords, lod=lod, heatmap=heatmap,
+                                   heat_metric=heat_metric, preview=progressive):
+            drawn.append(layer)
+            if progressive:
+                # Abre la ventana (la primera vez) y pinta la capa antes de seguir
+                plt.pause(LAYER_PAUSE)
+    
+    if profile_active() and not progressive:
+        # Primer dibujado fuera de show(): la interacción posterior no cuenta
+        with stage('draw'):
+            fig.canvas.draw()
+    plt.show()
+
+def export_graph(num_ants: int, graph: CompactGraph, paths: List['Path'], output: str,
+                 dpi: float = 100, figsize: Tuple[float, float] = (16, 12),
+                 fmt: Optional[str] = None, coords: Optional[np.ndarray] = None,
+                 heatmap: Optional['CongestionReport'] = None, heat_metric: str = 'ant_turns'):
+    """Renderiza el grafo sin ventana y lo guarda en output (PNG, SVG...)
+
+    Para uso sin pantalla hay que seleccionar el backend Agg antes de importar
+    este módulo (lo hace el modo export de ant_visualizer).
+    """
+    with stage('render'):
+        fig, ax = render_graph(num_ants, graph, paths, figsize=figsize, interactive=False, coords=coords,
+                               heatmap=heatmap, heat_metric=heat_metric)
+        # tight_layout() deja un motor de layout de relleno y con él savefig hace un
+        # dibujado previo completo (etiquetas incluidas): el tamaño no cambia, se quita
+        fig.set_layout_engine(None)
+    try:
+        with stage('draw'):
+            fig.savefig(output, dpi=dpi, format=fmt, facecolor=fig.get_facecolor())
+    finally:
+        # En lotes de miles de mapas no hay que acumular figuras abiertas
+        plt.close(fig)
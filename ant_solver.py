@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+import argparse
+import heapq
+import sys
+import time
+from typing import List, Optional, Tuple
+
+from ant_distribution import distribution_turns, optimal_distribution, optimal_turns
+from ant_graph import CompactGraph
+from ant_profile import stage
+from ant_reduce import reduce_graph
+from ant_visualizer import parse_lem_in_with_simulation
+
+INF = float('inf')
+
+
+class FlowNetwork:
+    """Red residual con desdoblamiento de nodos para caminos disjuntos por salas
+
+    Cada sala v se divide en v_in = 2v y v_out = 2v + 1 unidos por un arco de
+    capacidad 1 (sin límite para ##start y ##end). Cada túnel u-v da los arcos
+    u_out -> v_in y v_out -> u_in de capacidad 1 y coste 1 (o weights[e] para
+    la arista e de un grafo reducido). El arco i y su inverso son i y i ^ 1.
+    """
+
+    def __init__(self, graph: CompactGraph, weights: Optional[List[int]] = None):
+        n = len(graph)
+        self.graph = graph
+        self.source = 2 * graph.start + 1
+        self.sink = 2 * graph.end
+        self.adj: List[List[int]] = [[] for _ in range(2 * n)]
+        self.to: List[int] = []
+        self.cap: List[int] = []
+        self.cost: List[int] = []
+        self.weights = weights if weights is not None else [1] * graph.edge_count
+        self.tunnels: List[int] = []        # arista de cada par de arcos de túnel
+
+        big = n + 1
+        for v in range(n):
+            self._add_arc(2 * v, 2 * v + 1, big if v in (graph.start, graph.end) else 1, 0)
+        self.first_tunnel = len(self.to)
+        for e, (u, v) in enumerate(graph.edges.tolist()):
+            if u != v:
+                w = self.weights[e]
+                self._add_arc(2 * u + 1, 2 * v, 1, w)
+                self._add_arc(2 * v + 1, 2 * u, 1, w)
+                self.tunnels.append(e)
+        self.potential = [0] * (2 * n)
+
+    def _add_arc(self, u: int, v: int, cap: int, cost: int):
+        self.adj[u].append(len(self.to))
+        self.to.append(v)
+        self.cap.append(cap)
+        self.cost.append(cost)
+        self.adj[v].append(len(self.to))
+        self.to.append(u)
+        self.cap.append(0)
+        self.cost.append(-cost)
+
+    def augment(self) -> bool:
+        """Empuja una unidad de flujo por el camino residual más barato (Dijkstra + potenciales)"""
+        to, cap, cost, adj, potential = self.to, self.cap, self.cost, self.adj, self.potential
+        dist = [INF] * len(adj)
+        parent_arc = [-1] * len(adj)
+        dist[self.source] = 0
+        heap = [(0, self.source)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == self.sink:
+                break
+            pu = potential[u]
+            for arc in adj[u]:
+                if cap[arc] > 0:
+                    v = to[arc]
+                    nd = d + cost[arc] + pu - potential[v]
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        parent_arc[v] = arc
+                        heapq.heappush(heap, (nd, v))
+        if dist[self.sink] == INF:
+            return False
+        # Potenciales de Johnson: mantienen los costes reducidos no negativos
+        limit = dist[self.sink]
+        for v, d in enumerate(dist):
+            potential[v] += d if d < limit else limit
+        v = self.sink
+        while v != self.source:
+            arc = parent_arc[v]
+            cap[arc] -= 1
+            cap[arc ^ 1] += 1
+            v = to[arc ^ 1]
+        return True
+
+    def decompose(self) -> List[Tuple[int, List[int], List[int]]]:
+        """Descompone el flujo actual en (longitud, salas, aristas) ordenados por longitud"""
+        graph, to, cap, weights = self.graph, self.to, self.cap, self.weights
+        used = {}
+        # Arcos de túnel con flujo: los pares (índice par) sin capacidad restante
+        for arc in range(self.first_tunnel, len(to), 2):
+            if cap[arc] == 0:
+                edge = self.tunnels[(arc - self.first_tunnel) // 4]
+                used.setdefault(to[arc ^ 1] // 2, []).append((to[arc] // 2, edge))
+        result = []
+        for first, edge in used.pop(graph.start, []):
+            rooms, edges = [graph.start, first], [edge]
+            while rooms[-1] != graph.end:
+                room, edge = used[rooms[-1]].pop()
+                rooms.append(room)
+                edges.append(edge)
+            result.append((sum(weights[e] for e in edges), rooms, edges))
+        return sorted(result, key=lambda p: p[0])
+
+    def paths(self) -> List[List[int]]:
+        """Descompone el flujo actual en caminos de salas (índices del grafo)"""
+        return [rooms for _, rooms, _ in self.decompose()]
+
+
+def solve(graph: CompactGraph, num_ants: int, max_paths: Optional[int] = None, reduce: bool = True
+          ) -> Tuple[int, List[List[int]], List[int]]:
+    """Mejor conjunto de caminos disjuntos para num_ants
+
+    Aumenta el flujo de coste mínimo de uno en uno y evalúa los turnos de cada
+    nivel (k caminos de longitud total mínima). Con reduce, el flujo se calcula
+    sobre el grafo sin callejones y con los pasillos contraídos (ant_reduce) y
+    los caminos se expanden a las salas originales. Devuelve (turnos, caminos,
+    hormigas por camino); turnos es 0 si no hay camino entre ##start y ##end.
+    """
+    start, end = graph.start, graph.end
+    if start < 0 or end < 0 or num_ants <= 0:
+        return 0, [], []
+    if end in graph.neighbors_of(start).tolist():
+        # Túnel directo: todas las hormigas pasan en un único turno
+        return 1, [[start, end]], [num_ants]
+
+    reduced = None
+    if reduce:
+        with stage('reduce'):
+            reduced = reduce_graph(graph)
+        if reduced.graph.start < 0:
+            return 0, [], []
+        network = FlowNetwork(reduced.graph, reduced.weights.tolist())
+    else:
+        network = FlowNetwork(graph)
+    best_turns, best_paths = INF, []
+    level, cost = 0, 0
+    while (max_paths is None or level < max_paths) and network.augment():
+        level += 1
+        paths = network.decompose()
+        lengths = [length for length, _, _ in paths]
+        turns, used = optimal_turns(lengths, num_ants)
+        if turns < best_turns:
+            best_turns, best_paths = turns, paths[:used]
+        # El coste del flujo mínimo es convexo: si el último camino añadido ya es
+        # más largo que los turnos actuales, ningún nivel posterior mejora
+        cost, delta = sum(lengths), sum(lengths) - cost
+        if delta - 1 >= best_turns:
+            break
+    if not best_paths:
+        return 0, [], []
+    turns, ants = optimal_distribution([length for length, _, _ in best_paths], num_ants)
+    if reduced is not None:
+        return turns, [reduced.expand(rooms, edges) for _, rooms, edges in best_paths], ants
+    return turns, [rooms for _, rooms, _ in best_paths], ants
+
+
+def format_path_lines(graph: CompactGraph, paths: List[List[int]], ants: List[int]) -> List[str]:
+    """Líneas de caminos con el mismo formato que imprime lem-in"""
+    lines = []
+    for j, (path, count) in enumerate(zip(paths, ants)):
+        rooms = ''.join(f"-> {graph.names[room]} " for room in path[1:])
+        lines.append(f"path num: {j}\tants assigned: {count}\tstart: {graph.names[path[0]]} {rooms}")
+    return lines
+
+
+def write_map(num_ants: int, graph: CompactGraph, out):
+    """Escribe el mapa en el formato de entrada de lem-in"""
+    out.write(f"{num_ants}\n")
+    for i, name in enumerate(graph.names):
+        if graph.is_start(i):
+            out.write("##start\n")
+        elif graph.is_end(i):
+            out.write("##end\n")
+        out.write(f"{name} {graph.xs[i]} {graph.ys[i]}\n")
+    names = graph.names
+    out.write(''.join(f"{names[a]}-{names[b]}\n" for a, b in graph.edges.tolist()))
+
+
+def main(argv=None):
+    """Calcula los caminos óptimos de un mapa (o de una salida de lem-in) y los imprime"""
+    parser = argparse.ArgumentParser(
+        description="Caminos disjuntos óptimos (flujo de coste mínimo) para un mapa de lem-in")
+    parser.add_argument('input', nargs='?', help="mapa o salida de lem-in (por defecto stdin)")
+    parser.add_argument('--ants', type=int, help="número de hormigas (por defecto el del mapa)")
+    parser.add_argument('--paths-only', action='store_true',
+                        help="no repetir el mapa, sólo las líneas de caminos")
+    parser.add_argument('--no-reduce', action='store_true',
+                        help="resolver sobre el grafo completo, sin podar ni contraer pasillos")
+    args = parser.parse_args(argv)
+
+    stream = open(args.input) if args.input else sys.stdin
+    try:
+        num_ants, graph, c_paths, simulation_lines = parse_lem_in_with_simulation(stream)
+    finally:
+        if args.input:
+            stream.close()
+    if args.ants is not None:
+        num_ants = args.ants
+    if graph.start < 0 or graph.end < 0:
+        sys.exit("Error: Lack of start or end")
+
+    t0 = time.perf_counter()
+    turns, paths, ants = solve(graph, num_ants, reduce=not args.no_reduce)
+    elapsed = time.perf_counter() - t0
+    if not paths:
+        sys.exit("Camino no encontrado")
+
+    out = sys.stdout
+    if not args.paths_only:
+        write_map(num_ants, graph, out)
+    for line in format_path_lines(graph, paths, ants):
+        out.write(line + "\n")
+    out.write(f"#optimal turns: {turns}\n")
+
+    report = f"Óptimo: {turns} turnos con {len(paths)} camino(s) en {elapsed * 1000:.0f} ms"
+    if c_paths and args.ants is None:
+        c_turns = len(simulation_lines) or distribution_turns(
+            [len(p.nodes) - 1 for p in c_paths], [p.ant_count for p in c_paths])
+        report += f" | solver C: {c_turns} turnos con {len(c_paths)} camino(s) (+{c_turns - turns})"
+    print(report, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from ant_graph import CompactGraph
+from ant_reduce import reduce_graph
+from ant_solver import FlowNetwork
+
+LEM_IN_MAX_STEPS = 1000     # simulateAntMovement corta con "Error: Too many steps" a partir de aquí
+CELLS = 1 << 22             # candidatos x hormigas evaluados por bloque
+
+
+class PathSet:
+    """Conjunto de caminos disjuntos candidato: longitudes en túneles, ordenadas
+
+    Con k caminos, T turnos dan cabida a sum(T - l_i + 1) hormigas, así que
+    el mínimo para n hormigas es max(ceil((n + extra) / k), longest) con
+    extra = sum(l_i - 1): la fórmula de optimal_turns para un k fijo.
+    """
+    __slots__ = ('lengths', 'extra', 'longest')
+
+    def __init__(self, lengths: Sequence[int]):
+        self.lengths = tuple(sorted(int(length) for length in lengths))
+        self.extra = sum(length - 1 for length in self.lengths)
+        self.longest = self.lengths[-1]
+
+    def __len__(self) -> int:
+        return len(self.lengths)
+
+    def turns(self, ants: np.ndarray) -> np.ndarray:
+        if self.longest <= 1:
+            return np.ones(len(ants), dtype=np.int64)
+        return np.maximum(-(-(ants + self.extra) // len(self)), self.longest)
+
+
+def prefix_sets(lengths: Sequence[int]) -> List[PathSet]:
+    """Los j caminos más cortos de un conjunto, para cada j (el llenado por niveles usa un prefijo)"""
+    ordered = sorted(lengths)
+    return [PathSet(ordered[:j]) for j in range(1, len(ordered) + 1)]
+
+
+def pareto(sets: Sequence[PathSet]) -> List[PathSet]:
+    """Quita repetidos y los conjuntos peores que otro con los mismos caminos en extra y longest
+
+    Quedan ordenados por (caminos, extra, longest): en un empate de turnos
+    gana el de menos caminos, como en optimal_turns.
+    """
+    unique = sorted({s.lengths: s for s in sets}.values(), key=lambda s: (len(s), s.extra, s.longest))
+    kept = []
+    for s in unique:
+        if not any(len(k) == len(s) and k.extra <= s.extra and k.longest <= s.longest for k in kept):
+            kept.append(s)
+    return kept
+
+
+def flow_levels(graph: CompactGraph, max_ants: int, max_paths: Optional[int] = None,
+                reduce: bool = True) -> List[List[int]]:
+    """Longitudes de cada nivel del flujo de coste mínimo (k caminos de longitud total mínima)
+
+    Como en ant_solver.solve, se para cuando el nivel siguiente ya no puede
+    mejorar los turnos de max_ants (ni, por tanto, los de menos hormigas).
+    """
+    start, end = graph.start, graph.end
+    if start < 0 or end < 0:
+        return []
+    if end in graph.neighbors_of(start).tolist():
+        return [[1]]
+    if reduce:
+        reduced = reduce_graph(graph)
+        if reduced.graph.start < 0:
+            return []
+        network = FlowNetwork(reduced.graph, reduced.weights.tolist())
+    else:
+        network = FlowNetwork(graph)
+    levels, best, cost = [], None, 0
+    while (max_paths is None or len(levels) < max_paths) and network.augment():
+        lengths = [length for length, _, _ in network.decompose()]
+        levels.append(lengths)
+        turns = min(int(s.turns(np.array([max_ants]))[0]) for s in prefix_sets(lengths))
+        best = turns if best is None else min(best, turns)
+        cost, delta = sum(lengths), sum(lengths) - cost
+        if delta - 1 >= best:
+            break
+    return levels
+
+
+def _c_adjacency(graph: CompactGraph) -> Tuple[np.ndarray, np.ndarray]:
+    """CSR con los vecinos en el orden de connect() de lem-in: orden de los túneles, sin repetidos"""
+    n = len(graph)
+    edges = graph.edges.astype(np.int64)
+    edges = edges[edges[:, 0] != edges[:, 1]]
+    keys = np.minimum(edges[:, 0], edges[:, 1]) * n + np.maximum(edges[:, 0], edges[:, 1])
+    _, first = np.unique(keys, return_index=True)
+    first = np.sort(first)
+    src = np.concatenate((edges[first, 0], edges[first, 1]))
+    dst = np.concatenate((edges[first, 1], edges[first, 0]))
+    order = np.lexsort((np.tile(first, 2), src))
+    offsets = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(src, minlength=n), out=offsets[1:])
+    return offsets, dst[order]
+
+
+def greedy_paths(graph: CompactGraph) -> List[List[int]]:
+    """Caminos que elige findAllPaths: BFS repetido bloqueando las salas de los caminos ya hallados
+
+    El BFS es por niveles con numpy pero conserva el orden FIFO de la cola
+    de lem-in (cada sala nueva hereda el primer padre en ese orden), así que
+    los caminos son los mismos que los del binario.
+    """
+    start, end = graph.start, graph.end
+    if start < 0 or end < 0:
+        return []
+    offsets, neighbors = _c_adjacency(graph)
+    blocked = np.zeros(len(graph), dtype=bool)
+    paths = []
+    while True:
+        visited = blocked.copy()
+        visited[start] = True
+        parent = np.full(len(graph), -1, dtype=np.int64)
+        frontier = np.array([start])
+        while len(frontier) and not visited[end]:
+            counts = offsets[frontier + 1] - offsets[frontier]
+            base = np.repeat(offsets[frontier] - np.cumsum(counts) + counts, counts)
+            found = neighbors[base + np.arange(counts.sum())]
+            owner = np.repeat(frontier, counts)
+            fresh = ~visited[found]
+            found, owner = found[fresh], owner[fresh]
+            # Primer descubrimiento de cada sala, en el orden en que entraría en la cola
+            found, first = np.unique(found, return_index=True)
+            order = np.argsort(first)
+            frontier = found[order]
+            parent[frontier] = owner[first[order]]
+            visited[frontier] = True
+        if not visited[end]:
+            break
+        path = [end]
+        while path[-1] != start:
+            path.append(int(parent[path[-1]]))
+        path.reverse()
+        paths.append(path)
+        blocked[path[1:-1]] = True
+        if len(path) == 2:
+            break
+    return paths
+
+
+class Sweep:
+    """Turnos óptimos y de lem-in para cada número de hormigas en [lo, hi]
+
+    turns[i] y choice[i] corresponden a lo + i hormigas; choice indexa
+    candidates (el conjunto de caminos óptimo). lem_in_* son lo mismo para
+    los caminos de findAllPaths con el reparto de distributeAnts, que es el
+    llenado por niveles sobre esos caminos.
+    """
+    __slots__ = ('name', 'lo', 'hi', 'num_ants', 'turns', 'choice', 'candidates',
+                 'lem_in_turns', 'lem_in_choice', 'lem_in_sets', 'seconds')
+
+    def __init__(self, name: str, lo: int, hi: int, num_ants: int, candidates: List[PathSet],
+                 lem_in_sets: List[PathSet]):
+        self.name = name
+        self.lo = lo
+        self.hi = hi
+        self.num_ants = num_ants
+        self.candidates = candidates
+        self.lem_in_sets = lem_in_sets
+        self.turns, self.choice = envelope(candidates, lo, hi)
+        self.lem_in_turns, self.lem_in_choice = envelope(lem_in_sets, lo, hi)
+        self.seconds = 0.0
+
+    @property
+    def ants(self) -> np.ndarray:
+        return np.arange(self.lo, self.hi + 1, dtype=np.int64)
+
+    def breakpoints(self, lem_in: bool = False) -> List[dict]:
+        """Tramos de hormigas con el mismo conjunto de caminos"""
+        turns, choice, sets = ((self.lem_in_turns, self.lem_in_choice, self.lem_in_sets) if lem_in
+                               else (self.turns, self.choice, self.candidates))
+        if not len(choice):
+            return []
+        edges = np.flatnonzero(np.diff(choice)) + 1
+        firsts = np.concatenate(([0], edges))
+        lasts = np.concatenate((edges - 1, [len(choice) - 1]))
+        return [{'first_ants': self.lo + a, 'last_ants': self.lo + b, 'paths': len(sets[c]),
+                 'lengths': list(sets[c].lengths), 'turns': [int(turns[a]), int(turns[b])]}
+                for a, b, c in zip(firsts.tolist(), lasts.tolist(), choice[firsts].tolist())]
+
+    def summary(self) -> dict:
+        gap = self.lem_in_turns - self.turns if len(self.lem_in_turns) else np.zeros(0, dtype=np.int64)
+        worse = np.flatnonzero(gap > 0)
+        too_many = np.flatnonzero(self.lem_in_turns > LEM_IN_MAX_STEPS)
+        return {
+            'map': self.name,
+            'ants': [self.lo, self.hi],
+            'map_ants': self.num_ants,
+            'candidates': len(self.candidates),
+            'optimal_breakpoints': len(self.breakpoints()),
+            'lem_in_paths': list(self.lem_in_sets[-1].lengths) if self.lem_in_sets else [],
+            'first_gap_ants': self.lo + int(worse[0]) if len(worse) else None,
+            'max_gap': int(gap.max()) if len(gap) else None,
+            'max_gap_ants': self.lo + int(gap.argmax()) if len(gap) else None,
+            'lem_in_too_many_steps_from': self.lo + int(too_many[0]) if len(too_many) else None,
+            'seconds': self.seconds,
+        }
+
+
+def envelope(sets: Sequence[PathSet], lo: int, hi: int) -> Tuple[np.ndarray, np.ndarray]:
+    """Mínimo de turnos sobre todos los conjuntos para cada n en [lo, hi], y cuál lo da
+
+    Se elige por los turnos sin redondear, max((n + extra) / k, longest): el
+    redondeo hacia arriba es monótono, así que ese conjunto también es óptimo
+    y, al ser rectas, dos conjuntos se cruzan una sola vez (sin alternar por
+    el redondeo). En un empate gana el primero (el de menos caminos tras
+    pareto). Se evalúa por bloques de hormigas para acotar la memoria.
+    """
+    count = hi - lo + 1
+    turns = np.zeros(count, dtype=np.int64)
+    choice = np.full(count, -1, dtype=np.int32)
+    if not sets or count <= 0:
+        return turns[:0], choice[:0]
+    k = np.array([len(s) for s in sets], dtype=np.int64)
+    extra = np.array([s.extra for s in sets], dtype=np.int64)
+    longest = np.array([s.longest for s in sets], dtype=np.int64)
+    direct = longest <= 1
+    step = max(CELLS // len(sets), 1024)
+    for a in range(0, count, step):
+        ants = np.arange(lo + a, lo + min(a + step, count), dtype=np.int64)
+        relaxed = np.maximum((ants[None, :] + extra[:, None]) / k[:, None], longest[:, None])
+        best = np.where(direct[:, None], 0.0, relaxed).argmin(axis=0)
+        choice[a:a + len(best)] = best
+        turns[a:a + len(best)] = np.where(direct[best], 1,
+                                          np.maximum(-(-(ants + extra[best]) // k[best]), longest[best]))
+    return turns, choice
+
+
+def candidate_sets(graph: CompactGraph, max_ants: int, max_paths: Optional[int] = None,
+                   reduce: bool = True) -> Tuple[List[PathSet], List[PathSet]]:
+    """(candidatos óptimos, prefijos de findAllPaths) de un grafo"""
+    candidates = pareto([s for level in flow_levels(graph, max_ants, max_paths, reduce)
+                         for s in prefix_sets(level)])
+    lem_in = pareto(prefix_sets([len(path) - 1 for path in greedy_paths(graph)]))
+    return candidates, lem_in
+
+
+def _candidates_task(task: dict) -> dict:
+    """Parsea un mapa y calcula sus candidatos (en un proceso del pool: sólo tipos simples)"""
+    from ant_visualizer import parse_lem_in_with_simulation
+    t0 = time.perf_counter()
+    with open(task['path']) as f:
+        num_ants, graph, _, _ = parse_lem_in_with_simulation(f)
+    candidates, lem_in = candidate_sets(graph, task['hi'], task['max_paths'], task['reduce'])
+    return {'name': task['path'], 'num_ants': num_ants, 'rooms': len(graph),
+            'candidates': [list(s.lengths) for s in candidates],
+            'lem_in': [list(s.lengths) for s in lem_in], 'seconds': time.perf_counter() - t0}
+
+
+def sweep_result(result: dict, lo: int, hi: int) -> Sweep:
+    t0 = time.perf_counter()
+    sweep = Sweep(result['name'], lo, hi, result['num_ants'], [PathSet(s) for s in result['candidates']],
+                  [PathSet(s) for s in result['lem_in']])
+    sweep.seconds = result['seconds'] + time.perf_counter() - t0
+    return sweep
+
+
+def plot_sweep(sweep: Sweep, output: Optional[str] = None, dpi: float = 100):
+    """Frontera turnos/hormigas (óptima y de lem-in) y caminos usados, en escala logarítmica"""
+    import matplotlib
+    if output:
+        matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    from ant_render import PATH_COLORS
+
+    ants = sweep.ants
+    # Muestra logarítmica más los extremos de cada tramo: las curvas son escalones monótonos
+    marks = [b[key] for lem_in in (False, True) for b in sweep.breakpoints(lem_in)
+             for key in ('first_ants', 'last_ants')]
+    sample = np.unique(np.concatenate((np.geomspace(sweep.lo, sweep.hi, 2048).astype(np.int64),
+                                       np.array(marks, dtype=np.int64)))) - sweep.lo
+    fig, (top, bottom) = plt.subplots(2, 1, figsize=(12, 8), sharex=True, height_ratios=(3, 1))
+    fig.patch.set_facecolor('#0F0F0F')
+    for ax in (top, bottom):
+        ax.set_facecolor('#1A1A1A')
+        ax.tick_params(colors='#CCCCCC')
+        ax.grid(True, color='#333333', linewidth=0.5)
+        for spine in ax.spines.values():
+            spine.set_color('#555555')
+    optimal, lem_in = PATH_COLORS[1], PATH_COLORS[0]
+    top.plot(ants[sample], sweep.turns[sample], color=optimal, linewidth=2, label='óptimo (flujo de coste mínimo)')
+    if len(sweep.lem_in_turns):
+        top.plot(ants[sample], sweep.lem_in_turns[sample], color=lem_in, linewidth=1.5, linestyle='--',
+                 label='lem-in (findAllPaths + distributeAnts)')
+    top.axhline(LEM_IN_MAX_STEPS, color='#FFD700', linewidth=0.8, linestyle=':',
+                label=f'límite de lem-in ({LEM_IN_MAX_STEPS} pasos)')
+    for b in sweep.breakpoints()[1:]:
+        top.axvline(b['first_ants'], color=optimal, alpha=0.25, linewidth=0.8)
+    if sweep.lo <= sweep.num_ants <= sweep.hi:
+        top.axvline(sweep.num_ants, color='#FFFFFF', linewidth=1, alpha=0.6,
+                    label=f'hormigas del mapa ({sweep.num_ants})')
+    top.set_xscale('log')
+    top.set_yscale('log')
+    top.set_ylabel('turnos', color='#CCCCCC')
+    top.set_title(f"{os.path.basename(sweep.name)}: turnos según el número de hormigas", color='#FFFFFF')
+    top.legend(facecolor='#2D2D2D', edgecolor='#555555', labelcolor='#FFFFFF')
+
+    bottom.step(ants[sample], [len(sweep.candidates[c]) for c in sweep.choice[sample].tolist()],
+                where='post', color=optimal, linewidth=2)
+    if len(sweep.lem_in_choice):
+        bottom.step(ants[sample], [len(sweep.lem_in_sets[c]) for c in sweep.lem_in_choice[sample].tolist()],
+                    where='post', color=lem_in, linewidth=1.5, linestyle='--')
+    bottom.set_ylabel('caminos', color='#CCCCCC')
+    bottom.set_xlabel('hormigas', color='#CCCCCC')
+    fig.tight_layout()
+    if output:
+        fig.savefig(output, dpi=dpi, facecolor=fig.get_facecolor())
+        plt.close(fig)
+    else:
+        plt.show()
+
+
+def _plot_name(output: str, name: str, several: bool) -> str:
+    if not several:
+        return output
+    root, ext = os.path.splitext(output)
+    return f"{root}_{os.path.splitext(os.path.basename(name))[0]}{ext or '.png'}"
+
+
+def main(argv=None):
+    """Barrido del número de hormigas: tramos del conjunto óptimo y comparación con lem-in"""
+    from ant_profile import available_cores
+    parser = argparse.ArgumentParser(
+        description="Turnos óptimos y de lem-in para cada número de hormigas de un rango")
+    parser.add_argument('inputs', nargs='+', help="mapas o salidas de lem-in")
+    parser.add_argument('--ants', type=int, nargs=2, metavar=('LO', 'HI'), default=(1, 10000),
+                        help="rango de hormigas (1 10000)")
+    parser.add_argument('--max-paths', type=int, help="máximo de caminos por conjunto candidato")
+    parser.add_argument('--no-reduce', action='store_true', help="flujo sobre el grafo completo (ver ant_reduce)")
+    parser.add_argument('--plot', metavar='FILE',
+                        help="guarda la gráfica (con varios mapas, FILE_<mapa>.png); '-' la muestra")
+    parser.add_argument('--json', metavar='FILE', help="tramos y resumen por mapa en JSON")
+    parser.add_argument('-j', '--jobs', type=int, default=available_cores(),
+                        help=f"procesos para calcular los candidatos de varios mapas ({available_cores()})")
+    args = parser.parse_args(argv)
+    lo, hi = args.ants
+    if not 1 <= lo <= hi:
+        parser.error("--ants necesita 1 <= LO <= HI")
+
+    tasks = [{'path': path, 'hi': hi, 'max_paths': args.max_paths, 'reduce': not args.no_reduce}
+             for path in args.inputs]
+    t0 = time.perf_counter()
+    if len(tasks) > 1 and args.jobs > 1:
+        with ProcessPoolExecutor(max_workers=min(args.jobs, len(tasks))) as pool:
+            results = list(pool.map(_candidates_task, tasks))
+    else:
+        results = [_candidates_task(task) for task in tasks]
+
+    report: Dict[str, dict] = {}
+    for result in results:
+        sweep = sweep_result(result, lo, hi)
+        s = sweep.summary()
+        print(f"\n=== {sweep.name} ({result['rooms']} salas, {s['candidates']} conjuntos candidatos, "
+              f"{s['seconds'] * 1000:.0f} ms) ===")
+        if not sweep.candidates:
+            print("  sin camino entre ##start y ##end")
+            report[sweep.name] = {'summary': s, 'optimal': [], 'lem_in': []}
+            continue
+        for b in sweep.breakpoints():
+            print(f"  {b['first_ants']:>8}-{b['last_ants']:<8} {b['paths']:>3} camino(s) {b['lengths']} "
+                  f"-> {b['turns'][0]}-{b['turns'][1]} turnos")
+        if s['first_gap_ants'] is None:
+            print("  lem-in: óptimo en todo el rango")
+        else:
+            print(f"  lem-in: peor que el óptimo desde {s['first_gap_ants']} hormigas "
+                  f"(hasta +{s['max_gap']} turnos con {s['max_gap_ants']}), caminos {s['lem_in_paths']}")
+        if s['lem_in_too_many_steps_from'] is not None:
+            print(f"  lem-in: 'Too many steps' desde {s['lem_in_too_many_steps_from']} hormigas")
+        report[sweep.name] = {'summary': s, 'optimal': sweep.breakpoints(), 'lem_in': sweep.breakpoints(True)}
+        if args.plot:
+            plot_sweep(sweep, None if args.plot == '-' else _plot_name(args.plot, sweep.name, len(tasks) > 1))
+    print(f"\n>> {len(results)} mapa(s) en {(time.perf_counter() - t0) * 1000:.0f} ms", file=sys.stderr)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,384 @@
+#!/usr/bin/env python3
+
+import json
+import math
+import mmap
+import os
+import re
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+MAGIC = b'LEMTURN1'        # al final del fichero de turnos (ver TurnEncoder)
+ALIGN = 64
+BLOCK_LINES = 4096         # líneas de turno decodificadas de una vez
+
+_MOVE_RE = re.compile(r'L(\d+)->(\S+)')
+_NAME_HASH = 0x100000001B3
+_BYTE_MASKS = np.array([(1 << (8 * n)) - 1 for n in range(9)], dtype=np.uint64)
+
+
+class TurnMoves:
+    """Movimientos de la simulación decodificados a arrays de enteros
+
+    Los movimientos del turno t (0-based) son ants[offsets[t]:offsets[t + 1]]
+    y rooms[offsets[t]:offsets[t + 1]]. ants usa la numeración 1-based de
+    lem-in; rooms son índices del grafo (-1 si la sala no existe). malformed es
+    (turno 0-based, token) del primer token que no es "L<n>-><sala>", o None.
+    """
+    __slots__ = ('offsets', 'ants', 'rooms', 'unknown_rooms', 'malformed')
+
+    def __init__(self, offsets: np.ndarray, ants: np.ndarray, rooms: np.ndarray,
+                 unknown_rooms: List[str] = None, malformed: Optional[Tuple[int, str]] = None):
+        self.offsets = offsets
+        self.ants = ants
+        self.rooms = rooms
+        self.unknown_rooms = unknown_rooms or []
+        self.malformed = malformed
+
+    @property
+    def turn_count(self) -> int:
+        return len(self.offsets) - 1
+
+    def __len__(self) -> int:
+        # Como la lista de líneas de turno a la que sustituye
+        return self.turn_count
+
+    @property
+    def move_count(self) -> int:
+        return len(self.ants)
+
+    def turn(self, t: int):
+        """(ants, rooms) del turno t"""
+        a, b = self.offsets[t], self.offsets[t + 1]
+        return self.ants[a:b], self.rooms[a:b]
+
+    def turn_ids(self) -> np.ndarray:
+        """Número de turno (0-based) de cada movimiento"""
+        return np.repeat(np.arange(self.turn_count, dtype=np.int32), np.diff(self.offsets))
+
+    def slice(self, first: int, last: int) -> 'TurnMoves':
+        """Turnos [first, last) como TurnMoves (vistas de ants y rooms, sin copiarlos)"""
+        first, last = max(first, 0), min(last, self.turn_count)
+        last = max(last, first)
+        a, b = self.offsets[first], self.offsets[last]
+        return TurnMoves(self.offsets[first:last + 1] - a, self.ants[a:b], self.rooms[a:b], self.unknown_rooms)
+
+
+def decode_turns(lines: Iterable[str], index: Dict[str, int]) -> TurnMoves:
+    """Decodifica líneas "L1->a L2->b" a TurnMoves
+
+    Con el formato habitual (movimientos separados por espacios) se trabaja
+    sobre los bytes del bloque con numpy; si alguna línea se sale de ese
+    formato se recurre a la expresión regular token a token, y el primer token
+    mal formado (o separado por algo que no es un espacio) queda en malformed.
+    Los nombres de sala sólo se buscan en el diccionario una vez por nombre distinto.
+    """
+    if not isinstance(lines, list):
+        lines = list(lines)
+    counts = np.fromiter((line.count('->') for line in lines), dtype=np.int64, count=len(lines))
+    offsets = np.zeros(len(lines) + 1, dtype=np.int64)
+    np.cumsum(counts, out=offsets[1:])
+    text = ' '.join(lines)
+
+    decoded = _decode_tokens(text, int(offsets[-1]))
+    malformed = None
+    if decoded is None:
+        moves = []
+        for t, line in enumerate(lines):
+            tokens = [token for token in line.split(' ') if token]
+            matches = [_MOVE_RE.fullmatch(token) for token in tokens]
+            moves += [m.groups() for m in matches if m]
+            offsets[t + 1] = len(moves)
+            if malformed is None and len(moves) - offsets[t] != len(tokens):
+                malformed = (t, next(token for token, m in zip(tokens, matches) if not m))
+        if not moves:
+            empty = np.zeros(0, dtype=np.int32)
+            return TurnMoves(offsets, empty, empty.copy(), malformed=malformed)
+        ant_strs, room_strs = zip(*moves)
+        ants = np.array(ant_strs).astype(np.int32)
+        names, inverse = np.unique(np.array(room_strs), return_inverse=True)
+        names = names.tolist()
+    else:
+        ants, names, inverse = decoded
+
+    name_to_room = np.array([index.get(name, -1) for name in names], dtype=np.int32)
+    rooms = name_to_room[inverse.ravel()]
+    unknown = [name for name, room in zip(names, name_to_room) if room < 0]
+    return TurnMoves(offsets, ants, rooms, unknown, malformed)
+
+
+def _decode_tokens(text: str, expected: int):
+    """(ants, nombres distintos, inverso) si todo el texto son tokens "L<n>-><sala>"; si no, None"""
+    if expected == 0:
+        return None
+    buf = np.frombuffer(text.encode(), dtype=np.uint8)
+    blank = buf == ord(' ')
+    starts = np.flatnonzero(~blank & np.concatenate(([True], blank[:-1])))
+    ends = np.flatnonzero(~blank & np.concatenate((blank[1:], [True]))) + 1
+    arrows = np.flatnonzero((buf[:-1] == ord('-')) & (buf[1:] == ord('>')))
+    if len(starts) != expected or len(arrows) != expected:
+        return None
+    digits = arrows - starts - 1
+    length = ends - arrows - 2
+    if (buf[starts] != ord('L')).any() or digits.min() < 1 or digits.max() > 9 or length.min() < 1:
+        return None
+    # Ventanas de bytes sobre el texto (vistas sin copia): una fila por posición
+    padded = np.concatenate((np.zeros(9, dtype=np.uint8), buf, np.zeros(64, dtype=np.uint8)))
+
+    # Número de hormiga: los dígitos anteriores a la flecha, columna a columna
+    width = int(digits.max())
+    window = np.lib.stride_tricks.sliding_window_view(padded, width)[arrows + 9 - width] - np.uint8(ord('0'))
+    ants = np.zeros(expected, dtype=np.int32)
+    for k in range(width):
+        column, used = window[:, k], digits >= width - k
+        if ((column > 9) & used).any():
+            return None
+        ants = ants * 10 + np.where(used, column, 0)
+
+    # Nombre de sala: palabras de 8 bytes tras la flecha (rellenas con ceros) y una clave por fila
+    words = -(-int(length.max()) // 8)
+    if words > 8:
+        return None
+    window = np.lib.stride_tricks.sliding_window_view(padded, 8)
+    packed = np.empty((expected, words), dtype=np.uint64)
+    for j in range(words):
+        word = window[arrows + 11 + 8 * j].view('<u8').ravel()
+        packed[:, j] = word & _BYTE_MASKS[np.clip(length - 8 * j, 0, 8)]
+    key = packed[:, 0].copy()
+    for j in range(1, words):
+        key = key * np.uint64(_NAME_HASH) + packed[:, j]
+    keys, inverse = np.unique(key, return_inverse=True)
+    rows = np.empty(len(keys), dtype=np.int64)
+    rows[inverse] = np.arange(expected)
+    if words > 1 and (packed != packed[rows][inverse]).any():
+        # Colisión de la clave: agrupar por los bytes completos
+        _, rows, inverse = np.unique(packed.view(f'V{8 * words}').ravel(), return_index=True,
+                                     return_inverse=True)
+    names = [packed[row].astype('<u8').tobytes().rstrip(b'\0').decode() for row in rows.tolist()]
+    return ants, names, inverse
+
+
+def position_table(moves: TurnMoves, num_ants: int, start: int,
+                   initial: Optional[np.ndarray] = None) -> np.ndarray:
+    """Tabla densa (turnos + 1, hormigas) con la sala de cada hormiga tras cada turno
+
+    La fila 0 es el estado inicial (todas en ##start, o initial si se pasa
+    para continuar una tabla anterior; entonces el número de hormigas es el
+    de initial). La hormiga i (1-based) ocupa la columna i - 1.
+    """
+    if initial is not None:
+        num_ants = len(initial)
+    else:
+        num_ants = max(num_ants, int(moves.ants.max()) if moves.move_count else 0)
+    turns = moves.turn_count
+    table = np.full((turns + 1, num_ants), -1, dtype=np.int32)
+    table[0] = start if initial is None else initial
+    valid = (moves.ants >= 1) & (moves.ants <= num_ants)
+    table[moves.turn_ids()[valid] + 1, moves.ants[valid] - 1] = moves.rooms[valid]
+
+    # Rellenar hacia delante: cada casilla sin movimiento hereda la fila anterior
+    # (y los movimientos a salas desconocidas, -1, también)
+    rows = np.where(table >= 0, np.arange(turns + 1, dtype=np.int32)[:, None], 0)
+    np.maximum.accumulate(rows, axis=0, out=rows)
+    return np.take_along_axis(table, rows, axis=0)
+
+
+def first_rooms(moves: TurnMoves, num_ants: int) -> np.ndarray:
+    """Sala del primer movimiento de cada hormiga (columna i - 1 para la hormiga i; -1 si no se mueve)"""
+    first = np.full(num_ants, -1, dtype=np.int32)
+    valid = np.flatnonzero((moves.ants >= 1) & (moves.ants <= num_ants))
+    ants, index = np.unique(moves.ants[valid], return_index=True)
+    first[ants - 1] = moves.rooms[valid[index]]
+    return first
+
+
+class TurnIndex:
+    """Posición de todas las hormigas en cualquier turno, con checkpoints
+
+    Guarda la fila completa cada interval turnos (por defecto ~sqrt(turnos));
+    la fila t se reconstruye desde el checkpoint anterior con position_table
+    sobre como mucho interval turnos, y el bloque se conserva para las filas
+    siguientes. Se indexa como la tabla densa: index[t], shape, len.
+    """
+    __slots__ = ('moves', 'num_ants', 'start', 'interval', 'checkpoints', '_block', '_block_first')
+
+    def __init__(self, moves: TurnMoves, num_ants: int, start: int, interval: Optional[int] = None):
+        self.moves = moves
+        self.num_ants = max(num_ants, int(moves.ants.max()) if moves.move_count else 0)
+        self.start = start
+        turns = moves.turn_count
+        self.interval = max(1, interval or math.isqrt(turns) + 1)
+        self.checkpoints = np.empty((turns // self.interval + 1, self.num_ants), dtype=np.int32)
+        row = np.full(self.num_ants, start, dtype=np.int32)
+        self.checkpoints[0] = row
+        for k in range(1, len(self.checkpoints)):
+            block = moves.slice((k - 1) * self.interval, k * self.interval)
+            valid = np.flatnonzero((block.ants >= 1) & (block.ants <= self.num_ants) & (block.rooms >= 0))
+            # Último movimiento de cada hormiga en el bloque
+            ants, index = np.unique(block.ants[valid][::-1], return_index=True)
+            row[ants - 1] = block.rooms[valid[::-1][index]]
+            self.checkpoints[k] = row
+        self._block = None
+        self._block_first = -1
+
+    @property
+    def turn_count(self) -> int:
+        return self.moves.turn_count
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.turn_count + 1, self.num_ants
+
+    def __len__(self) -> int:
+        return self.turn_count + 1
+
+    def positions(self, t: int) -> np.ndarray:
+        """Sala de cada hormiga tras t turnos (t = 0: estado inicial)"""
+        if not 0 <= t <= self.turn_count:
+            raise IndexError(f"turno {t} fuera de [0, {self.turn_count}]")
+        first = t // self.interval * self.interval
+        if first != self._block_first:
+            initial = self.checkpoints[first // self.interval]
+            self._block = position_table(self.moves.slice(first, first + self.interval), self.num_ants,
+                                         self.start, initial=initial)
+            self._block_first = first
+        return self._block[t - first]
+
+    __getitem__ = positions
+
+    def table(self, first: int, last: int) -> np.ndarray:
+        """Filas densas de los turnos first..last (ambos incluidos)"""
+        first, last = max(first, 0), min(last, self.turn_count)
+        return position_table(self.moves.slice(first, last), self.num_ants, self.start,
+                              initial=self.positions(first).copy())
+
+    def nbytes(self) -> int:
+        return self.checkpoints.nbytes + (self._block.nbytes if self._block is not None else 0)
+
+
+class TurnEncoder:
+    """Codifica las líneas de turno por bloques según llegan, sin guardar las cadenas
+
+    Con spill, los movimientos se escriben en ese fichero como pares int32
+    (hormiga, sala) y finish() devuelve un TurnMoves mapeado en memoria: la
+    simulación no ocupa RAM y otros procesos pueden abrirla con load_turns.
+    Formato: pares, offsets int64 por turno (alineados a ALIGN bytes), pie
+    JSON, longitud del pie (8 bytes) y MAGIC.
+    """
+
+    def __init__(self, index: Dict[str, int], spill: Optional[str] = None, block_lines: int = BLOCK_LINES):
+        self.index = index
+        self.spill = spill
+        self.block_lines = block_lines
+        self.lines: List[str] = []
+        self.turns = 0
+        self.move_count = 0
+        self._counts: List[np.ndarray] = []
+        self._ants: List[np.ndarray] = []
+        self._rooms: List[np.ndarray] = []
+        self._unknown: Dict[str, None] = {}
+        self._tmp = f"{spill}.{os.getpid()}.tmp" if spill else None
+        self._file = open(self._tmp, 'wb') if spill else None
+
+    def __len__(self) -> int:
+        return self.turns + len(self.lines)
+
+    def append(self, line: str):
+        self.lines.append(line)
+        if len(self.lines) >= self.block_lines:
+            self.flush()
+
+    def extend(self, lines: Iterable[str]):
+        for line in lines:
+            self.append(line)
+
+    def flush(self):
+        """Decodifica las líneas pendientes"""
+        if self.lines:
+            moves = decode_turns(self.lines, self.index)
+            self.lines = []
+            self.add(moves)
+
+    def add(self, moves: TurnMoves):
+        """Añade turnos ya decodificados (por ejemplo, el bloque que acaba de validar ant_validator)"""
+        self.turns += moves.turn_count
+        self.move_count += moves.move_count
+        self._counts.append(np.diff(moves.offsets))
+        self._unknown.update(dict.fromkeys(moves.unknown_rooms))
+        if self._file is not None:
+            self._file.write(np.column_stack((moves.ants, moves.rooms)).astype(np.int32).tobytes())
+        else:
+            self._ants.append(moves.ants)
+            self._rooms.append(moves.rooms)
+
+    def finish(self) -> TurnMoves:
+        self.flush()
+        offsets = np.zeros(self.turns + 1, dtype=np.int64)
+        if self._counts:
+            np.cumsum(np.concatenate(self._counts), out=offsets[1:])
+        unknown = list(self._unknown)
+        if self._file is None:
+            empty = np.zeros(0, dtype=np.int32)
+            return TurnMoves(offsets, np.concatenate(self._ants) if self._ants else empty,
+                             np.concatenate(self._rooms) if self._rooms else empty.copy(), unknown)
+        f, self._file = self._file, None
+        try:
+            _write_tail(f, offsets, unknown)
+            f.close()
+            os.replace(self._tmp, self.spill)
+        except BaseException:
+            f.close()
+            os.remove(self._tmp)
+            raise
+        return load_turns(self.spill)
+
+    def close(self):
+        """Descarta un volcado a medias (si finish no ha llegado a ejecutarse)"""
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+            os.remove(self._tmp)
+
+
+def _write_tail(f, offsets: np.ndarray, unknown: List[str]):
+    pairs = f.tell()
+    f.write(b'\0' * (-pairs % ALIGN))
+    footer = json.dumps({'moves': pairs // 8, 'turns': len(offsets) - 1, 'offsets_at': f.tell(),
+                         'unknown_rooms': unknown}, separators=(',', ':')).encode()
+    f.write(offsets.astype('<i8').tobytes())
+    f.write(footer + len(footer).to_bytes(8, 'little') + MAGIC)
+
+
+def save_turns(path: str, moves: TurnMoves):
+    """Guarda moves en el formato de TurnEncoder (escritura atómica)"""
+    tmp = f"{path}.{os.getpid()}.tmp"
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(np.column_stack((moves.ants, moves.rooms)).astype('<i4').tobytes())
+            _write_tail(f, np.asarray(moves.offsets), moves.unknown_rooms)
+        os.replace(tmp, path)
+    except BaseException:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+        raise
+
+
+def load_turns(path: str) -> TurnMoves:
+    """Abre un fichero de turnos mapeado en memoria: ants y rooms son vistas de sólo lectura"""
+    with open(path, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < len(MAGIC) + 8:
+            raise ValueError(f"{path}: no es un fichero de turnos")
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+    if mapped[-len(MAGIC):] != MAGIC:
+        raise ValueError(f"{path}: no es un fichero de turnos de esta versión")
+    end = size - len(MAGIC) - 8
+    length = int.from_bytes(mapped[end:end + 8], 'little')
+    footer = json.loads(mapped[end - length:end])
+    count, turns = footer['moves'], footer['turns']
+    if footer['offsets_at'] + 8 * (turns + 1) != end - length:
+        raise ValueError(f"{path}: fichero de turnos truncado")
+    pairs = np.frombuffer(mapped, dtype='<i4', count=2 * count).reshape(count, 2)
+    offsets = np.frombuffer(mapped, dtype='<i8', count=turns + 1, offset=footer['offsets_at'])
+    return TurnMoves(offsets, pairs[:, 0], pairs[:, 1], footer['unknown_rooms'])
@@ -0,0 +1,314 @@
+#!/usr/bin/env python3
+
+import argparse
+import json
+import sys
+import time
+from typing import List, Optional
+
+import numpy as np
+
+from ant_distribution import distribution_turns
+from ant_graph import CompactGraph, GraphBuilder
+from ant_turns import TurnEncoder, TurnMoves, decode_turns
+from ant_visualizer import LemInStreamParser
+
+NO_TURN = np.iinfo(np.int64).max
+CHUNK_CHARS = 4 << 20      # ~300k movimientos por bloque
+
+
+class Violation:
+    """Primera regla incumplida: turno (1-based), tipo y descripción"""
+    __slots__ = ('turn', 'kind', 'message')
+
+    def __init__(self, turn: int, kind: str, message: str):
+        self.turn = turn
+        self.kind = kind
+        self.message = message
+
+    def __repr__(self):
+        return f"Violation(turn={self.turn}, kind={self.kind!r}, message={self.message!r})"
+
+
+class ValidationResult:
+    """Resultado de validar una simulación completa"""
+
+    def __init__(self, turns: int, moves: int, violation: Optional[Violation], elapsed: float):
+        self.turns = turns
+        self.moves = moves
+        self.violation = violation
+        self.elapsed = elapsed
+
+    @property
+    def ok(self) -> bool:
+        return self.violation is None
+
+    def to_dict(self) -> dict:
+        result = {'ok': self.ok, 'turns': self.turns, 'moves': self.moves, 'seconds': self.elapsed}
+        if self.violation:
+            result['violation'] = {'turn': self.violation.turn, 'kind': self.violation.kind,
+                                   'message': self.violation.message}
+        return result
+
+
+class SimulationValidator:
+    """Valida los turnos de la simulación por bloques, con arrays de numpy
+
+    Sólo se conserva el estado entre bloques (sala actual de cada hormiga); cada
+    bloque de líneas se decodifica, se comprueba y se descarta. Reglas:
+    - cada token de una línea es un movimiento "L<hormiga>-><sala>" separado por espacios,
+    - cada movimiento recorre un túnel existente (y nadie sale de ##end),
+    - cada hormiga se mueve como mucho una vez por turno,
+    - ninguna sala intermedia tiene dos hormigas al final de un turno,
+    - todas las hormigas salen de ##start y terminan en ##end,
+    - el número de turnos coincide con el esperado.
+    """
+
+    def __init__(self, graph: CompactGraph, num_ants: int):
+        self.graph = graph
+        self.num_ants = num_ants
+        self.n = len(graph)
+        self.start = graph.start
+        self.end = graph.end
+        self.positions = np.full(num_ants + 1, self.start, dtype=np.int64)   # índice = id de hormiga
+        self.turns = 0
+        self.moves = 0
+        self.violation: Optional[Violation] = None
+        # Claves u * n + v de los túneles (en ambos sentidos) ordenadas para searchsorted
+        src = np.repeat(np.arange(self.n, dtype=np.int64), np.diff(graph.offsets))
+        self.edge_keys = src * self.n + graph.neighbors
+        self.intermediate = ~(np.isin(np.arange(self.n), [self.start, self.end]))
+
+    def _report(self, found: List[Violation]):
+        if found:
+            first = min(found, key=lambda v: v.turn)
+            if self.violation is None or first.turn < self.violation.turn:
+                self.violation = first
+
+    def feed(self, lines: List[str]) -> Optional[TurnMoves]:
+        """Valida un bloque de líneas de turno consecutivas; devuelve el bloque decodificado"""
+        if self.violation is not None or not lines:
+            return None
+        moves = decode_turns(lines, self.graph.index)
+        self.feed_moves(moves)
+        return moves
+
+    def feed_moves(self, moves: TurnMoves):
+        """Valida un bloque de turnos consecutivos ya decodificados"""
+        if self.violation is not None or not moves.turn_count:
+            return
+        t0 = self.turns + 1
+        if self.start < 0 or self.end < 0:
+            self._report([Violation(t0, 'no_start_end', "el mapa no tiene ##start o ##end")])
+            return
+        if moves.malformed is not None:
+            t, token = moves.malformed
+            self._report([Violation(t0 + t, 'malformed_move',
+                                    f"'{token}' no es un movimiento L<hormiga>-><sala>")])
+            return
+        self.turns += moves.turn_count
+        self.moves += moves.move_count
+        if not moves.move_count:
+            return
+        turn = moves.turn_ids().astype(np.int64) + t0
+        ants = moves.ants.astype(np.int64)
+        rooms = moves.rooms.astype(np.int64)
+        names = self.graph.names
+        found = []
+
+        bad = np.flatnonzero(rooms < 0)
+        if len(bad):
+            i = bad[0]
+            found.append(Violation(int(turn[i]), 'unknown_room',
+                                   f"L{ants[i]} se mueve a una sala inexistente ({moves.unknown_rooms[0]})"))
+        bad = np.flatnonzero((ants < 1) | (ants > self.num_ants))
+        if len(bad):
+            i = bad[0]
+            found.append(Violation(int(turn[i]), 'unknown_ant',
+                                   f"L{ants[i]} no existe (hay {self.num_ants} hormigas)"))
+        if found:
+            # Con ids o salas inválidas el resto de comprobaciones no tiene sentido
+            self._report(found)
+            return
+
+        # Ordenar por (hormiga, turno): los movimientos ya vienen por turno, basta un orden estable
+        by_ant = np.argsort(ants, kind='stable')
+        turn, ants, rooms = turn[by_ant], ants[by_ant], rooms[by_ant]
+        same_ant = np.zeros(len(ants), dtype=bool)
+        same_ant[1:] = ants[1:] == ants[:-1]
+
+        # Una hormiga, un movimiento por turno
+        dup = np.flatnonzero(same_ant[1:] & (turn[1:] == turn[:-1])) + 1
+        if len(dup):
+            i = dup[np.argmin(turn[dup])]
+            found.append(Violation(int(turn[i]), 'double_move',
+                                   f"L{ants[i]} se mueve más de una vez en el turno {turn[i]}"))
+
+        # Sala de origen: el movimiento anterior de la hormiga o su posición al empezar el bloque
+        prev = np.where(same_ant, np.roll(rooms, 1), self.positions[ants])
+        bad = np.flatnonzero(prev == self.end)
+        if len(bad):
+            i = bad[np.argmin(turn[bad])]
+            found.append(Violation(int(turn[i]), 'left_end',
+                                   f"L{ants[i]} sale de ##end hacia {names[rooms[i]]}"))
+        keys = prev * self.n + rooms
+        hit = np.searchsorted(self.edge_keys, keys)
+        hit[hit == len(self.edge_keys)] = 0
+        bad = np.flatnonzero(self.edge_keys[hit] != keys) if len(self.edge_keys) else np.arange(len(keys))
+        if len(bad):
+            i = bad[np.argmin(turn[bad])]
+            found.append(Violation(int(turn[i]), 'no_tunnel',
+                                   f"L{ants[i]} va de {names[prev[i]]} a {names[rooms[i]]} sin túnel"))
+
+        # Ocupación: cada estancia en una sala es un intervalo [entrada, siguiente movimiento)
+        next_turn = np.full(len(turn), NO_TURN, dtype=np.int64)
+        last = np.ones(len(ants), dtype=bool)
+        last[:-1] = ~same_ant[1:]
+        next_turn[~last] = turn[1:][~last[:-1]]
+        first_move = np.full(self.num_ants + 1, NO_TURN, dtype=np.int64)
+        first_move[ants[~same_ant]] = turn[~same_ant]
+        by_turn = np.empty_like(by_ant)
+        by_turn[by_ant] = np.arange(len(by_ant))
+        waiting = np.flatnonzero(self.intermediate[self.positions[1:]]) + 1
+        # Las que esperan desde el bloque anterior y luego los movimientos: ya ordenados por entrada
+        occ_room = np.concatenate((self.positions[waiting], rooms[by_turn]))
+        occ_start = np.concatenate((np.full(len(waiting), t0 - 1, dtype=np.int64), turn[by_turn]))
+        occ_end = np.concatenate((first_move[waiting], next_turn[by_turn]))
+        occ_ant = np.concatenate((waiting, ants[by_turn]))
+        keep = self.intermediate[occ_room]
+        occ_room, occ_start, occ_end, occ_ant = occ_room[keep], occ_start[keep], occ_end[keep], occ_ant[keep]
+        if len(occ_room) > 1:
+            order = np.argsort(occ_room, kind='stable')
+            occ_room, occ_start, occ_end, occ_ant = (occ_room[order], occ_start[order],
+                                                     occ_end[order], occ_ant[order])
+            # Máximo acumulado del final por sala: se separan las salas con un desplazamiento
+            span = max(int(self.turns) + 2, 2)
+            capped = np.minimum(occ_end, self.turns + 1) + occ_room * span
+            running = np.maximum.accumulate(capped)
+            same_room = occ_room[1:] == occ_room[:-1]
+            clash = np.flatnonzero(same_room & (occ_start[1:] + occ_room[1:] * span < running[:-1])) + 1
+            if len(clash):
+                i = clash[np.argmin(occ_start[clash])]
+                found.append(Violation(int(occ_start[i]), 'room_collision',
+                                       f"L{occ_ant[i]} entra en {names[occ_room[i]]}, que ya está ocupada"))
+
+        self._report(found)
+        self.positions[ants[last]] = rooms[last]
+
+    def finish(self, expected_turns: Optional[int] = None, error_line: Optional[str] = None):
+        """Comprobaciones finales: todas en ##end, número de turnos y línea de error"""
+        if self.violation is not None:
+            return self.violation
+        found = []
+        if error_line:
+            # lem-in ha abortado: su mensaje explica mejor el fallo que el estado final
+            self._report([Violation(self.turns + 1, 'error_line', error_line)])
+            return self.violation
+        if self.start < 0 or self.end < 0:
+            self._report([Violation(0, 'no_start_end', "el mapa no tiene ##start o ##end")])
+            return self.violation
+        pending = np.flatnonzero(self.positions[1:] != self.end) + 1
+        if len(pending):
+            found.append(Violation(self.turns, 'not_finished',
+                                   f"{len(pending)} hormiga(s) no llegan a ##end (L{pending[0]} "
+                                   f"está en {self.graph.names[self.positions[pending[0]]]})"))
+        if expected_turns is not None and self.turns != expected_turns:
+            found.append(Violation(min(self.turns, expected_turns) + 1, 'turn_count',
+                                   f"{self.turns} turnos, se esperaban {expected_turns}"))
+        self._report(found)
+        return self.violation
+
+
+def validate_stream(stream=None, expected_turns: Optional[int] = None,
+                    chunk_chars: int = CHUNK_CHARS, save_turns: Optional[str] = None) -> ValidationResult:
+    """Valida una salida de lem-in leyendo el flujo una sola vez
+
+    Los turnos se validan en bloques de unos chunk_chars caracteres, así la
+    memoria no depende de la longitud de la simulación. Si no se indica
+    expected_turns se usa el que implican las líneas 'path num:' (reparto
+    impreso por el solver). Con save_turns los bloques decodificados se
+    guardan en ese fichero de turnos (ver TurnEncoder), aunque haya fallo.
+    """
+    t0 = time.perf_counter()
+    parser = LemInStreamParser(stream)
+    builder = GraphBuilder()
+    num_ants = 0
+    paths = []
+    validator = None
+    encoder = TurnEncoder(builder.index, save_turns) if save_turns else None
+    chunk, size = [], 0
+
+    def feed(lines: List[str]):
+        if encoder is None:
+            validator.feed(lines)
+            return
+        # Tras el primer fallo el validador ya no decodifica: el fichero se completa igual
+        moves = decode_turns(lines, builder.index)
+        validator.feed_moves(moves)
+        encoder.add(moves)
+
+    try:
+        for kind, value in parser.events():
+            if kind == 'turn':
+                if validator is None:
+                    validator = SimulationValidator(builder.build(), num_ants)
+                chunk.append(value)
+                size += len(value)
+                if size >= chunk_chars:
+                    feed(chunk)
+                    chunk, size = [], 0
+            elif kind == 'room':
+                builder.add_room(*value)
+            elif kind == 'link':
+                builder.add_link(*value)
+            elif kind == 'path':
+                paths.append(value)
+            elif kind == 'ants':
+                num_ants = value
+        if validator is None:
+            validator = SimulationValidator(builder.build(), num_ants)
+        if chunk:
+            feed(chunk)
+        if encoder is not None:
+            encoder.finish()
+    finally:
+        if encoder is not None:
+            encoder.close()
+
+    if expected_turns is None and paths:
+        expected_turns = distribution_turns([len(p.nodes) - 1 for p in paths],
+                                            [p.ant_count for p in paths])
+    violation = validator.finish(expected_turns, parser.error_line)
+    return ValidationResult(validator.turns, validator.moves, violation, time.perf_counter() - t0)
+
+
+def main(argv=None):
+    """Valida una salida de lem-in y termina con código 1 si no es correcta"""
+    parser = argparse.ArgumentParser(description="Validador de la simulación de lem-in")
+    parser.add_argument('input', nargs='?', help="salida de lem-in (por defecto stdin)")
+    parser.add_argument('--expected', type=int,
+                        help="turnos esperados (por defecto los que implica el reparto impreso)")
+    parser.add_argument('--json', action='store_true', help="resultado en JSON")
+    parser.add_argument('--save-turns', metavar='FILE',
+                        help="guarda los turnos decodificados para ant_visualizer/ant_congestion --turns-file")
+    args = parser.parse_args(argv)
+
+    stream = open(args.input) if args.input else sys.stdin
+    try:
+        result = validate_stream(stream, args.expected, save_turns=args.save_turns)
+    finally:
+        if args.input:
+            stream.close()
+
+    if args.json:
+        print(json.dumps(result.to_dict(), ensure_ascii=False))
+    elif result.ok:
+        print(f"OK: {result.turns} turnos, {result.moves} movimientos ({result.elapsed * 1000:.0f} ms)")
+    else:
+        v = result.violation
+        print(f"ERROR en el turno {v.turn} [{v.kind}]: {v.message}")
+    sys.exit(0 if result.ok else 1)
+
+
+if __name__ == "__main__":
+    main()
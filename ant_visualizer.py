@@ -1,64 +1,42 @@
 #!/usr/bin/env python3
 
+import argparse
+import json
 import sys
 import re
-from typing import List, Tuple, Dict, Set, Optional
-import matplotlib.pyplot as plt
-import matplotlib.colors as mcolors
-import numpy as np
-from matplotlib.patches import Circle, FancyBboxPatch
-import matplotlib.patches as mpatches
-
-class Node:
-    """Representa un nodo con nombre y coordenadas"""
-    def __init__(self, name: str, x: int, y: int, is_start: bool = False, is_end: bool = False):
-        self.name = name
-        self.x = x
-        self.y = y
-        self.is_start = is_start
-        self.is_end = is_end
-
-class Connection:
-    """Representa una conexión entre dos nodos"""
-    def __init__(self, node1: str, node2: str):
-        self.node1 = node1
-        self.node2 = node2
+import time
+from typing import TYPE_CHECKING, List, Tuple, Dict, Set, Optional, Union
+from ant_distribution import check_paths
+from ant_graph import CompactGraph, GraphBuilder
+from ant_profile import stage
+
+# Referencia del primer fotograma del modo gui (ver _report_first_frame)
+_STARTED = time.perf_counter()
+
+if TYPE_CHECKING:
+    from ant_turns import TurnMoves
+
+# matplotlib y numpy se importan bajo demanda (ver ant_render): los modos
+# de estadísticas y JSON arrancan sin cargarlos
 
 class Path:
     """Representa un camino encontrado por el algoritmo"""
+    __slots__ = ('path_num', 'ant_count', 'nodes')
+
     def __init__(self, path_num: int, ant_count: int, nodes: List[str]):
         self.path_num = path_num
         self.ant_count = ant_count
         self.nodes = nodes
 
-def parse_node_line(line: str) -> Node:
-    """Parsea una línea con formato: nombre coordx coordy"""
-    pattern = r'^([a-zA-Z0-9_]+)\s+(-?\d+)\s+(-?\d+)$'
-    match = re.match(pattern, line.strip())
-    
-    if not match:
-        raise ValueError(f"Formato inválido")
-    
-    name = match.group(1)
-    x = int(match.group(2))
-    y = int(match.group(3))
-    
-    return Node(name, x, y)
+_ROOM_RE = re.compile(r'^([a-zA-Z0-9_]+)\s+(-?\d+)\s+(-?\d+)$')
+_LINK_RE = re.compile(r'^([a-zA-Z0-9_]+)-([a-zA-Z0-9_]+)$')
+_PATH_RE = re.compile(r'path num:\s*(\d+)\s+ants assigned:\s*(\d+)\s+start:\s*(.+)')
 
-def parse_connection_line(line: str) -> Connection:
-    """Parsea una línea con formato: nodo1-nodo2"""
-    pattern = r'^([a-zA-Z0-9_]+)-([a-zA-Z0-9_]+)$'
-    match = re.match(pattern, line.strip())
-    
-    if not match:
-        raise ValueError(f"Formato de conexión inválido")
-    
-    return Connection(match.group(1), match.group(2))
+SIMULATION_HEADER = "=== SIMULATION ==="
 
 def parse_path_line(line: str) -> Optional[Path]:
     """Parsea una línea de camino: path num: 0     ants assigned: 15       start: center -> n3 -> e1 -> e2 -> exit"""
-    pattern = r'path num:\s*(\d+)\s+ants assigned:\s*(\d+)\s+start:\s*(.+)'
-    match = re.match(pattern, line.strip())
+    match = _PATH_RE.match(line.strip())
     
     if not match:
         return None
@@ -73,463 +51,216 @@ def parse_path_line(line: str) -> Optional[Path]:
     return Path(path_num, ant_count, nodes)
 
 
-def check_last_line_for_error():
-    lines = sys.stdin.read().splitlines()
-    if lines:
-        last_line = lines[-1]
+class LemInStreamParser:
+    """Parser incremental (máquina de estados) de la salida de lem-in.
+
+    Consume cualquier iterable de líneas (sys.stdin, un fichero abierto...)
+    una sola vez, sin guardar la entrada, y produce eventos a medida que lee:
+
+        ('ants',  num_ants)
+        ('room',  (name, x, y, is_start, is_end))
+        ('link',  (node1, node2))
+        ('path',  Path)
+        ('turn',  "L1->a L2->b")
+        ('error', "Error: ...")    # sólo si la última línea contiene "Error"
+    """
+
+    ANTS, ROOMS, LINKS, SIMULATION = range(4)
+
+    def __init__(self, stream=None):
+        self.stream = sys.stdin if stream is None else stream
+        self.state = self.ANTS
+        self.lines_read = 0
+        self.elapsed = 0.0
+        self.error_line = None
+
+    @property
+    def lines_per_second(self) -> float:
+        """Líneas procesadas por segundo en la última pasada"""
+        return self.lines_read / self.elapsed if self.elapsed > 0 else 0.0
+
+    def events(self):
+        """Genera los eventos del flujo línea a línea"""
+        next_is_start = False
+        next_is_end = False
+        last_line = ''
+        t0 = time.perf_counter()
+        elapsed = 0.0
+
+        for raw in self.stream:
+            self.lines_read += 1
+            line = raw.strip()
+            if not line:
+                continue
+            last_line = line
+            head = line[0]
+            event = None
+
+            if self.state == self.SIMULATION:
+                # Caso más frecuente en salidas grandes: líneas de turno
+                if head == 'L' and '->' in line:
+                    event = ('turn', line)
+            elif self.state == self.ANTS:
+                self.state = self.ROOMS
+                try:
+                    event = ('ants', int(line))
+                except ValueError:
+                    event = ('ants', 0)
+            elif head == '#':
+                if self.state == self.ROOMS:
+                    if line == '##start':
+                        next_is_start = True
+                    elif line == '##end':
+                        next_is_end = True
+            elif head == 'p' and line.startswith('path num:'):
+                path = parse_path_line(line)
+                if path:
+                    event = ('path', path)
+            elif head == '=' and line == SIMULATION_HEADER:
+                self.state = self.SIMULATION
+            else:
+                if self.state == self.ROOMS:
+                    match = _ROOM_RE.match(line)
+                    if match:
+                        event = ('room', (match.group(1), int(match.group(2)), int(match.group(3)),
+                                          next_is_start, next_is_end))
+                        next_is_start = False
+                        next_is_end = False
+                    else:
+                        # La primera línea que no es sala abre la sección de conexiones
+                        self.state = self.LINKS
+                if self.state == self.LINKS:
+                    match = _LINK_RE.match(line)
+                    if match:
+                        event = ('link', (match.group(1), match.group(2)))
+
+            if event is not None:
+                # No contar el tiempo que el consumidor pasa procesando el evento
+                elapsed += time.perf_counter() - t0
+                yield event
+                t0 = time.perf_counter()
+
+        elapsed += time.perf_counter() - t0
+        self.elapsed = elapsed
         if "Error" in last_line:
-            sys.exit("Error found in last line, exiting.")
+            self.error_line = last_line
+            yield ('error', last_line)
 
-def parse_lem_in_with_simulation() -> Tuple[int, List[Node], List[Connection], List[Path], List[str]]:
-    """Parsea el formato completo de lem-in con datos de simulación desde stdin"""
-    lines = []
-    
-    try:
-        for line in sys.stdin:
-            line = line.strip()
-            if line:
-                lines.append(line)
-    except KeyboardInterrupt:
-        sys.exit(1)
-    
-    if not lines:
-        return 0, [], [], [], []
-    
-    # Primera línea: número de hormigas
-    try:
-        num_ants = int(lines[0])
-    except (ValueError, IndexError):
-        num_ants = 0
-    
-    nodes = []
-    connections = []
+
+def parse_lem_in_with_simulation(stream=None, parser: Optional[LemInStreamParser] = None,
+                                 build: bool = True, encode: bool = False, spill: Optional[str] = None,
+                                 moves: Optional['TurnMoves'] = None
+                                 ) -> Tuple[int, Union[CompactGraph, GraphBuilder], List[Path],
+                                            Union[List[str], 'TurnMoves']]:
+    """Parsea el formato completo de lem-in con datos de simulación (stdin por defecto)
+
+    Con build=False devuelve el GraphBuilder sin convertirlo a arrays de numpy,
+    suficiente para las estadísticas. Con encode (o spill) los turnos se
+    decodifican por bloques mientras se leen y se devuelven como TurnMoves,
+    sin guardar las líneas; spill los vuelca a ese fichero (ver TurnEncoder).
+    Con moves (un fichero de load_turns) las líneas de turno sólo se cuentan
+    y se devuelve moves; ValueError si no tiene los mismos turnos.
+    """
+    if parser is None:
+        parser = LemInStreamParser(stream)
+    
+    num_ants = 0
+    builder = GraphBuilder()
     paths = []
     simulation_lines = []
-    current_line = 1
-    next_is_start = False
-    next_is_end = False
-    parsing_simulation = False
-    # Parsear nodos
-    while current_line < len(lines):
-        line = lines[current_line]
-        
-        # Detectar inicio de simulación
-        if line == "=== SIMULATION ===":
-            parsing_simulation = True
-            current_line += 1
-            continue
-        
-        if parsing_simulation:
-            # Capturar líneas de simulación
-            if line.startswith('L') and '->' in line:
-                simulation_lines.append(line)
-            current_line += 1
-            continue
-        
-        # Detectar líneas de caminos
-        path = parse_path_line(line)
-        if path:
-            paths.append(path)
-            current_line += 1
-            continue
-        
-        # Saltar comentarios que no son marcadores especiales
-        if line.startswith('#') and line not in ["##start", "##end"]:
-            current_line += 1
-            continue
-        
-        # Verificar marcadores especiales
-        if line == "##start":
-            next_is_start = True
-            current_line += 1
-            continue
-        elif line == "##end":
-            next_is_end = True
-            current_line += 1
-            continue
-        
-        # Intentar parsear como nodo
-        try:
-            node = parse_node_line(line)
-            node.is_start = next_is_start
-            node.is_end = next_is_end
-            nodes.append(node)
-            next_is_start = False
-            next_is_end = False
-            current_line += 1
-        except ValueError:
-            # Si no es un nodo, puede ser una conexión
-            break
-    
-    # Parsear conexiones (si no estamos en simulación)
-    while current_line < len(lines) and not parsing_simulation:
-        line = lines[current_line]
-        
-        # Detectar líneas de caminos
-        path = parse_path_line(line)
-        if path:
-            paths.append(path)
-            current_line += 1
-            continue
-        
-        # Detectar inicio de simulación
-        if line == "=== SIMULATION ===":
-            parsing_simulation = True
-            current_line += 1
-            continue
-        
-        # Saltar comentarios
-        if line.startswith('#'):
-            current_line += 1
-            continue
-            
-        try:
-            connection = parse_connection_line(line)
-            connections.append(connection)
-        except ValueError:
-            pass  # Ignorar líneas que no son conexiones válidas
-        current_line += 1
-    
-    # Capturar líneas de simulación restantes
-    while current_line < len(lines):
-        line = lines[current_line]
-        if line.startswith('L') and '->' in line:
-            simulation_lines.append(line)
-        current_line += 1
-    
-    return num_ants, nodes, connections, paths, simulation_lines
-
-def _add_interactive_tooltip(fig, ax, scatter, nodes: List[Node]):
-    """Añade tooltip interactivo con estilo mejorado"""
-    annot = ax.annotate('', xy=(0,0), xytext=(20,20), textcoords="offset points",
-                       bbox=dict(boxstyle="round,pad=0.8", facecolor='#2D2D2D', 
-                               edgecolor='#00FF88', linewidth=2, alpha=0.95),
-                       arrowprops=dict(arrowstyle="->", connectionstyle="arc3,rad=0.3",
-                                     color='#00FF88', linewidth=2),
-                       fontsize=12, fontweight='bold', color='white',
-                       zorder=1000)  # Asegurar que esté por encima de todo
-    annot.set_visible(False)
-    
-    def update_annot(ind):
-        pos = scatter.get_offsets()[ind["ind"][0]]
-        annot.xy = pos
-        node = nodes[ind["ind"][0]]
-        
-        # Construir texto del tooltip con información del nodo
-        tooltip_text = f"NODE: {node.name}\nPOS: ({node.x}, {node.y})"
-        if node.is_start:
-            tooltip_text += "\n[START]"
-        elif node.is_end:
-            tooltip_text += "\n[END]"
-        
-        annot.set_text(tooltip_text)
-        # Ajustar posición para evitar que se salga de la pantalla
-        if pos[0] > ax.get_xlim()[1] * 0.8:  # Si está muy a la derecha
-            annot.set_position((-40, 20))  # Mover tooltip a la izquierda
-        else:
-            annot.set_position((20, 20))  # Posición normal
-    
-    def hover(event):
-        if event.inaxes == ax:
-            cont, ind = scatter.contains(event)
-            if cont:
-                update_annot(ind)
-                annot.set_visible(True)
-                fig.canvas.draw()
-            else:
-                if annot.get_visible():
-                    annot.set_visible(False)
-                    fig.canvas.draw()
+    encoder = None
+    if moves is None and (encode or spill):
+        from ant_turns import TurnEncoder
+        # El índice se completa antes del primer turno: las salas van delante
+        encoder = simulation_lines = TurnEncoder(builder.index, spill)
+    turn_lines = 0
     
-    fig.canvas.mpl_connect("motion_notify_event", hover)
+    try:
+        for kind, value in parser.events():
+            if kind == 'turn':
+                if moves is None:
+                    simulation_lines.append(value)
+                else:
+                    turn_lines += 1
+            elif kind == 'room':
+                builder.add_room(*value)
+            elif kind == 'link':
+                builder.add_link(*value)
+            elif kind == 'path':
+                paths.append(value)
+            elif kind == 'ants':
+                num_ants = value
+    except BaseException as e:
+        if encoder is not None:
+            encoder.close()
+        if isinstance(e, KeyboardInterrupt):
+            sys.exit(1)
+        raise
+    
+    if encoder is not None:
+        simulation_lines = encoder.finish()
+    elif moves is not None:
+        if turn_lines != moves.turn_count:
+            raise ValueError(f"el fichero de turnos tiene {moves.turn_count} turnos y la entrada {turn_lines}")
+        simulation_lines = moves
+    return num_ants, builder.build() if build else builder, paths, simulation_lines
 
-def _apply_dark_theme(fig, ax):
-    """Aplica tema oscuro elegante"""
-    # Configurar colores de fondo
-    fig.patch.set_facecolor('#0F0F0F')
-    ax.set_facecolor('#1A1A1A')
-    
-    # Configurar grid con estilo futurista
-    ax.grid(True, alpha=0.3, color='#333333', linewidth=0.8, linestyle='--')
-    
-    # Configurar ejes
-    ax.spines['bottom'].set_color('#555555')
-    ax.spines['top'].set_color('#555555')
-    ax.spines['right'].set_color('#555555')
-    ax.spines['left'].set_color('#555555')
-    ax.spines['bottom'].set_linewidth(2)
-    ax.spines['top'].set_linewidth(2)
-    ax.spines['right'].set_linewidth(2)
-    ax.spines['left'].set_linewidth(2)
-    
-    # Configurar etiquetas de ejes
-    ax.tick_params(axis='x', colors='#CCCCCC', labelsize=10)
-    ax.tick_params(axis='y', colors='#CCCCCC', labelsize=10)
-    ax.xaxis.label.set_color('#CCCCCC')
-    ax.yaxis.label.set_color('#CCCCCC')
-    ax.xaxis.label.set_fontsize(12)
-    ax.yaxis.label.set_fontsize(12)
-    ax.xaxis.label.set_fontweight('bold')
-    ax.yaxis.label.set_fontweight('bold')
-
-def _add_glow_effect(ax, x, y, color, size=50):
-    """Añade efecto de resplandor a los nodos importantes"""
-    # Crear círculos concéntricos para el efecto de resplandor
-    for i in range(3):
-        alpha = 0.1 - i * 0.03
-        radius = size * (1 + i * 0.3)
-        circle = Circle((x, y), radius, facecolor=color, alpha=alpha, 
-                       edgecolor='none', zorder=1)
-        ax.add_patch(circle)
-
-def show_graph(num_ants: int, nodes: List[Node], connections: List[Connection], paths: List[Path] = None):
-    """Muestra los nodos y conexiones en una ventana interactiva con estilo mejorado"""
-    if not nodes:
-        print("No hay nodos para mostrar")
-        return
-    
-    # Crear figura con estilo moderno
-    plt.style.use('dark_background')
-    fig, ax = plt.subplots(figsize=(16, 12))
-    
-    # Aplicar tema oscuro
-    _apply_dark_theme(fig, ax)
-    
-    # Crear diccionario de nodos para búsqueda rápida
-    node_dict = {node.name: node for node in nodes}
-    
-    # Crear conjunto de conexiones de caminos para resaltarlas
-    path_connections = set()
-    if paths:
-        for path in paths:
-            for i in range(len(path.nodes) - 1):
-                path_connections.add((path.nodes[i], path.nodes[i + 1]))
-                path_connections.add((path.nodes[i + 1], path.nodes[i]))
-    
-    # Paleta de colores moderna para caminos
-    path_colors = ['#FF6B6B', '#4ECDC4', '#45B7D1', '#FFA07A', '#98D8C8', 
-                   '#F06292', '#AED581', '#FFB74D', '#BA68C8', '#81C784']
-    
-    # Dibujar conexiones normales con efecto de profundidad
-    for connection in connections:
-        if connection.node1 in node_dict and connection.node2 in node_dict:
-            node1 = node_dict[connection.node1]
-            node2 = node_dict[connection.node2]
-            
-            # Verificar si esta conexión es parte de un camino
-            if (connection.node1, connection.node2) in path_connections:
-                continue
-            
-            # Línea principal
-            ax.plot([node1.x, node2.x], [node1.y, node2.y], 
-                   color='#444444', linewidth=1.5, alpha=0.7, zorder=2)
-            
-            # Línea de brillo sutil
-            ax.plot([node1.x, node2.x], [node1.y, node2.y], 
-                   color='#666666', linewidth=0.5, alpha=0.5, zorder=2)
-    
-    # Dibujar caminos resaltados con efectos especiales
-    if paths:
-        for i, path in enumerate(paths):
-            color = path_colors[i % len(path_colors)]
-            # Calcular grosor basado en el número de hormigas
-            base_width = max(4, min(12, 3 + path.ant_count * 0.6))
-            
-            for j in range(len(path.nodes) - 1):
-                node1_name = path.nodes[j]
-                node2_name = path.nodes[j + 1]
-                
-                if node1_name in node_dict and node2_name in node_dict:
-                    node1 = node_dict[node1_name]
-                    node2 = node_dict[node2_name]
-                    
-                    # Línea de fondo (más gruesa, más oscura)
-                    ax.plot([node1.x, node2.x], [node1.y, node2.y], 
-                           color=color, linewidth=base_width + 2, alpha=0.4, zorder=3)
-                    
-                    # Línea principal
-                    ax.plot([node1.x, node2.x], [node1.y, node2.y], 
-                           color=color, linewidth=base_width, alpha=0.9, zorder=4,
-                           label=f'Path {path.path_num} ({path.ant_count} ants)' if j == 0 else "")
-                    
-                    # Línea de brillo
-                    ax.plot([node1.x, node2.x], [node1.y, node2.y], 
-                           color='white', linewidth=base_width * 0.3, alpha=0.6, zorder=5)
-    
-    # Preparar datos para nodos con colores mejorados
-    x_coords = [node.x for node in nodes]
-    y_coords = [node.y for node in nodes]
-    
-    # Encontrar nodos especiales para efectos
-    start_nodes = [node for node in nodes if node.is_start]
-    end_nodes = [node for node in nodes if node.is_end]
-    
-    # Añadir efectos de resplandor a nodos especiales
-    for node in start_nodes:
-        _add_glow_effect(ax, node.x, node.y, '#00FF88', 15)
-    
-    for node in end_nodes:
-        _add_glow_effect(ax, node.x, node.y, '#FF4444', 15)
-    
-    # Configurar tamaños y colores de nodos
-    node_sizes = []
-    node_colors = []
-    edge_colors = []
-    
-    for node in nodes:
-        if node.is_start:
-            node_sizes.append(300)
-            node_colors.append('#00FF88')
-            edge_colors.append('#00CC66')
-        elif node.is_end:
-            node_sizes.append(300)
-            node_colors.append('#FF4444')
-            edge_colors.append('#CC2222')
-        else:
-            node_sizes.append(150)
-            node_colors.append('#4A9EFF')
-            edge_colors.append('#3A7ECC')
-    
-    # Crear gráfico de nodos con efectos mejorados
-    scatter = ax.scatter(x_coords, y_coords, s=node_sizes, c=node_colors, 
-                        alpha=0.9, edgecolors=edge_colors, linewidth=2.5, 
-                        zorder=6, marker='o')
-    
-    # Añadir segundo anillo para nodos especiales
-    for i, node in enumerate(nodes):
-        if node.is_start or node.is_end:
-            ax.scatter(node.x, node.y, s=node_sizes[i] * 1.3, 
-                      c='none', edgecolors=node_colors[i], linewidth=1, 
-                      alpha=0.6, zorder=5)
-    
-    # Añadir nombres de nodos con estilo mejorado
-    for node in nodes:
-        # Fondo para el texto
-        bbox_props = dict(boxstyle='round,pad=0.3', facecolor='#2D2D2D', 
-                         alpha=0.8, edgecolor='#555555', linewidth=1)
-        
-        if node.is_start:
-            text_color = '#00FF88'
-            bbox_props['edgecolor'] = '#00FF88'
-        elif node.is_end:
-            text_color = '#FF4444'
-            bbox_props['edgecolor'] = '#FF4444'
-        else:
-            text_color = '#CCCCCC'
-        
-        ax.annotate(node.name, (node.x, node.y), xytext=(8, 8), 
-                   textcoords='offset points', fontsize=9, fontweight='bold',
-                   color=text_color, bbox=bbox_props, zorder=7)
-    
-    # Añadir interactividad
-    _add_interactive_tooltip(fig, ax, scatter, nodes)
-    
-    # Configurar título con estilo futurista
-    title = f'Lem-in Graph Visualizer\n{num_ants} ants • {len(nodes)} nodes • {len(connections)} connections'
-    if paths:
-        title += f' • {len(paths)} path(s) found'
-    
-    ax.set_title(title, fontsize=16, fontweight='bold', color='#FFFFFF', 
-                pad=20, bbox=dict(boxstyle='round,pad=1', facecolor='#333333', 
-                                alpha=0.8, edgecolor='#00FF88', linewidth=2))
-    
-    # Etiquetas de ejes con estilo
-    ax.set_xlabel('X Coordinate', fontsize=12, fontweight='bold', color='#CCCCCC')
-    ax.set_ylabel('Y Coordinate', fontsize=12, fontweight='bold', color='#CCCCCC')
-    
-    # Crear leyenda con estilo mejorado
-    legend_elements = [
-        plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#00FF88', 
-                   markersize=12, label='START', markeredgecolor='#00CC66', 
-                   markeredgewidth=2),
-        plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#FF4444', 
-                   markersize=12, label='END', markeredgecolor='#CC2222',
-                   markeredgewidth=2),
-        plt.Line2D([0], [0], marker='o', color='w', markerfacecolor='#4A9EFF', 
-                   markersize=10, label='NODE', markeredgecolor='#3A7ECC',
-                   markeredgewidth=2),
-        plt.Line2D([0], [0], color='#666666', linewidth=3, label='CONNECTION')
-    ]
-    
-    # Añadir caminos a la leyenda
-    if paths:
-        for i, path in enumerate(paths):
-            color = path_colors[i % len(path_colors)]
-            legend_elements.append(
-                plt.Line2D([0], [0], color=color, linewidth=4, 
-                          label=f'Path {path.path_num} ({path.ant_count} ants)')
-            )
-    
-    # Configurar leyenda con estilo oscuro
-    legend = ax.legend(handles=legend_elements, loc='upper right', 
-                      frameon=True, fancybox=True, shadow=True,
-                      facecolor='#2D2D2D', edgecolor='#555555', 
-                      fontsize=10, labelcolor='#CCCCCC')
-    legend.get_frame().set_alpha(0.9)
-    legend.get_frame().set_linewidth(2)
-    
-    # Ajustar límites con márgenes elegantes
-    if x_coords and y_coords:
-        min_x, max_x = min(x_coords), max(x_coords)
-        min_y, max_y = min(y_coords), max(y_coords)
-        margin_x = max(5, (max_x - min_x) * 0.15)
-        margin_y = max(5, (max_y - min_y) * 0.15)
-        
-        ax.set_xlim(min_x - margin_x, max_x + margin_x)
-        ax.set_ylim(min_y - margin_y, max_y + margin_y)
-    
-    # Configurar ventana
-    fig.canvas.toolbar_visible = True
-    fig.canvas.manager.set_window_title('Lem-in Graph Visualizer - Dark Theme')
-    
-    plt.tight_layout()
-    plt.show()
+def show_graph(num_ants: int, graph: CompactGraph, paths: List[Path] = None, coords=None, lod: bool = True,
+               heatmap=None, heat_metric: str = 'ant_turns', first_frame=None):
+    """Muestra el grafo en una ventana interactiva (importa matplotlib bajo demanda)"""
+    import ant_render
+    ant_render.show_graph(num_ants, graph, paths, coords, lod=lod, heatmap=heatmap, heat_metric=heat_metric,
+                          first_frame=first_frame)
 
-def main():
-    """Función principal con mensajes mejorados"""
-    print(">> Iniciando Lem-in Graph Visualizer...")
-    print(">> Procesando datos de entrada...")
+def collect_statistics(num_ants: int, graph: Union[CompactGraph, GraphBuilder], paths: List[Path],
+                       simulation_lines: Union[List[str], 'TurnMoves'], parser: LemInStreamParser) -> dict:
+    """Reúne las estadísticas del grafo en un diccionario serializable a JSON"""
+    def room(i):
+        return {'name': graph.names[i], 'x': int(graph.xs[i]), 'y': int(graph.ys[i])} if i >= 0 else None
+    
+    return {
+        'ants': num_ants,
+        'nodes': len(graph),
+        'connections': graph.link_lines,
+        'valid_connections': graph.edge_count,
+        'invalid_connections': graph.invalid_links,
+        'start': room(graph.start),
+        'end': room(graph.end),
+        'paths': [{'path_num': path.path_num, 'ants': path.ant_count, 'nodes': path.nodes}
+                  for path in paths],
+        'distribution': check_paths(paths) if paths else None,
+        'simulation_turns': len(simulation_lines),
+        'parse': {'lines': parser.lines_read, 'seconds': parser.elapsed,
+                  'lines_per_second': parser.lines_per_second},
+    }
 
-    check_last_line_for_error()
-    
-    num_ants, nodes, connections, paths, simulation_lines = parse_lem_in_with_simulation()
-    
-    if not nodes:
-        print("ERROR: No se encontraron nodos válidos en la entrada")
-        return
-    
-    # Mostrar estadísticas con estilo
+def print_statistics(stats: dict):
+    """Imprime el bloque de estadísticas con estilo"""
     print(f"\n=== ESTADISTICAS DEL GRAFO ===")
-    print(f"Hormigas: {num_ants}")
-    print(f"Nodos: {len(nodes)}")
-    print(f"Conexiones: {len(connections)}")
+    print(f"Hormigas: {stats['ants']}")
+    print(f"Nodos: {stats['nodes']}")
+    print(f"Conexiones: {stats['connections']}")
+    parse = stats['parse']
+    print(f"Lectura: {parse['lines']} líneas en {parse['seconds'] * 1000:.1f} ms "
+          f"({parse['lines_per_second']:,.0f} líneas/s)")
     
     # Mostrar información de nodos especiales
-    start_nodes = [n for n in nodes if n.is_start]
-    end_nodes = [n for n in nodes if n.is_end]
+    start, end = stats['start'], stats['end']
     
-    if start_nodes:
-        print(f"Nodo de inicio: {start_nodes[0].name} ({start_nodes[0].x}, {start_nodes[0].y})")
+    if start:
+        print(f"Nodo de inicio: {start['name']} ({start['x']}, {start['y']})")
     else:
         print("WARNING: No se encontró nodo de inicio")
         
-    if end_nodes:
-        print(f"Nodo final: {end_nodes[0].name} ({end_nodes[0].x}, {end_nodes[0].y})")
+    if end:
+        print(f"Nodo final: {end['name']} ({end['x']}, {end['y']})")
     else:
         print("WARNING: No se encontró nodo final")
     
-    # Validar conexiones
-    node_names = {node.name for node in nodes}
-    valid_connections = 0
-    invalid_connections = []
-    
-    for conn in connections:
-        if conn.node1 in node_names and conn.node2 in node_names:
-            valid_connections += 1
-        else:
-            invalid_connections.append(f"{conn.node1}-{conn.node2}")
+    # Validar conexiones (el builder ya separa las que apuntan a salas inexistentes)
+    invalid_connections = stats['invalid_connections']
     
-    print(f"Conexiones válidas: {valid_connections}")
+    print(f"Conexiones válidas: {stats['valid_connections']}")
     if invalid_connections:
         print(f"WARNING: Conexiones inválidas: {len(invalid_connections)}")
         if len(invalid_connections) <= 5:
@@ -538,21 +269,339 @@ def main():
             print(f"   {', '.join(invalid_connections[:5])}... (+{len(invalid_connections)-5} más)")
     
     # Mostrar información de caminos
-    if paths:
+    if stats['paths']:
         print(f"\n=== CAMINOS ENCONTRADOS ===")
-        for path in paths:
-            print(f"Camino {path.path_num}: {path.ant_count} hormigas")
-            print(f"   Ruta: {' -> '.join(path.nodes)}")
-            print(f"   Longitud: {len(path.nodes)} nodos")
+        for path in stats['paths']:
+            print(f"Camino {path['path_num']}: {path['ants']} hormigas")
+            print(f"   Ruta: {' -> '.join(path['nodes'])}")
+            print(f"   Longitud: {len(path['nodes'])} nodos")
+        
+        # Comparar el reparto de lem-in con el óptimo para los mismos caminos
+        distribution = stats['distribution']
+        print(f"\n=== REPARTO DE HORMIGAS ===")
+        print(f"Turnos con el reparto actual: {distribution['turns']}")
+        print(f"Turnos con el reparto óptimo: {distribution['optimal_turns']}")
+        if distribution['gap'] > 0:
+            print(f"WARNING: el reparto pierde {distribution['gap']} turno(s); "
+                  f"óptimo: {distribution['optimal_assigned']}")
     
     # Mostrar información de simulación
-    if simulation_lines:
-        print(f"\nSimulación: {len(simulation_lines)} pasos registrados")
+    if stats['simulation_turns']:
+        print(f"\nSimulación: {stats['simulation_turns']} pasos registrados")
+
+def _parse_args(argv=None):
+    parser = argparse.ArgumentParser(
+        description="Visualizador de la salida de lem-in (lee stdin si no se indica fichero)")
+    parser.add_argument('input', nargs='?', help="fichero con la salida de lem-in (por defecto stdin)")
+    parser.add_argument('--mode', choices=['gui', 'stats', 'json', 'export', 'animate', 'live'],
+                        help="gui: ventana interactiva (por defecto); stats/json: sólo estadísticas, "
+                             "sin matplotlib; export: imagen sin pantalla (implícito con --output); "
+                             "animate: animación de la simulación (a fichero con --output); "
+                             "live: dibuja y anima mientras lem-in sigue escribiendo")
+    parser.add_argument('-o', '--output', help="fichero de salida del modo export (.png, .svg, .pdf) "
+                                                "o animate (.gif, .mp4)")
+    parser.add_argument('--format', dest='fmt', help="formato de imagen si no se deduce de --output")
+    parser.add_argument('--dpi', type=float, default=100, help="resolución del modo export (100)")
+    parser.add_argument('--size', type=float, nargs=2, metavar=('W', 'H'), default=(16, 12),
+                        help="tamaño de la figura en pulgadas (16 12)")
+    parser.add_argument('--fps', type=float, default=30, help="fotogramas por segundo de la animación (30)")
+    parser.add_argument('--frames-per-turn', type=int, default=6,
+                        help="fotogramas por turno al exportar la animación (6)")
+    parser.add_argument('--window', type=int, default=2000, metavar='TURNS',
+                        help="modo live: turnos que se conservan para reproducir (2000); "
+                             "la memoria es TURNS x hormigas x 4 bytes")
+    parser.add_argument('--layout', choices=['map', 'force', 'auto'], default='map',
+                        help="map: coordenadas del mapa (por defecto); force: distribución por fuerzas "
+                             "a partir de los túneles; auto: force sólo si las del mapa degeneran "
+                             "(todas alineadas, como en los mapas del generador)")
+    parser.add_argument('--layout-iterations', type=int, default=120, metavar='N',
+                        help="iteraciones de la distribución por fuerzas (120)")
+    parser.add_argument('--simplify', action='store_true',
+                        help="dibuja el grafo reducido: sin callejones y con los pasillos contraídos "
+                             "en una sola arista (ver ant_reduce.py)")
+    parser.add_argument('--heatmap', nargs='?', const='ant_turns', metavar='METRIC',
+                        choices=['ant_turns', 'waits', 'peak', 'entries'],
+                        help="modos gui/export: colorea salas y túneles según la congestión de la "
+                             "simulación (ant_turns por defecto, waits, peak o entries; ver ant_congestion.py)")
+    parser.add_argument('--no-lod', action='store_true',
+                        help="modo gui: dibuja todo siempre, sin recortar a la vista ni sombreado de "
+                             "densidad al alejarse (ver _LevelOfDetail en ant_render.py)")
+    parser.add_argument('--no-overlap', action='store_true',
+                        help="modo gui: arranque en secuencia (parseo, figura completa, ventana) en vez de "
+                             "parsear mientras se inicia matplotlib y abrir la ventana con una vista previa")
+    parser.add_argument('--cache', action='store_true',
+                        help="reutiliza el parseo guardado en la caché binaria (ver ant_cache.py)")
+    parser.add_argument('--cache-dir', metavar='DIR', help="directorio de la caché (implica --cache)")
+    parser.add_argument('--turns-file', metavar='FILE',
+                        help="turnos codificados y mapeados en memoria (ver ant_turns.py): se crea al "
+                             "leer la entrada o, si ya existe (ant_validator --save-turns), se reutiliza "
+                             "sin decodificar las líneas")
+    parser.add_argument('--profile', nargs='?', const='memory', choices=['time', 'memory'],
+                        help="tiempos por etapa en stderr; 'memory' (por defecto) añade tracemalloc")
+    parser.add_argument('--profile-json', metavar='FILE', help="guarda el perfil por etapas en JSON")
+    parser.add_argument('--cprofile', metavar='STAGE', action='append', default=[],
+                        help="ejecuta la etapa bajo cProfile (repetible: parse, build, render, draw...)")
+    parser.add_argument('--collapsed', metavar='FILE', default='profile.collapsed',
+                        help="pilas colapsadas de --cprofile para flamegraph.pl/speedscope "
+                             "(profile.collapsed)")
+    args = parser.parse_args(argv)
+    if args.mode is None:
+        args.mode = 'export' if args.output else 'gui'
+    if args.mode == 'export' and not args.output:
+        parser.error("el modo export necesita --output")
+    if args.simplify and args.mode in ('animate', 'live'):
+        parser.error(f"--simplify no es compatible con el modo {args.mode} (las hormigas recorren los pasillos)")
+    if args.heatmap and (args.mode not in ('gui', 'export') or args.simplify):
+        parser.error("--heatmap sólo se aplica a los modos gui y export, sin --simplify")
+    if args.mode == 'live' and (args.output or args.cache):
+        parser.error("el modo live sólo dibuja en pantalla y lee la entrada directamente (sin --output ni --cache)")
+    if args.cache_dir:
+        args.cache = True
+    if args.turns_file and (args.cache or args.mode == 'live'):
+        parser.error("--turns-file no es compatible con --cache ni con el modo live")
+    if (args.profile_json or args.cprofile) and not args.profile:
+        args.profile = 'memory'
+    if args.profile:
+        # Las etapas del perfil se miden en un solo hilo y en secuencia
+        args.no_overlap = True
+    return args
+
+def main(argv=None):
+    """Función principal con mensajes mejorados"""
+    args = _parse_args(argv)
+    if not args.profile:
+        _run(args)
+        return
+    
+    from ant_profile import StageProfiler, write_collapsed
+    profiler = StageProfiler(memory=args.profile == 'memory', cprofile_stages=args.cprofile)
+    try:
+        with profiler:
+            _run(args)
+    finally:
+        # También si el modo termina con sys.exit: el perfil sigue siendo útil
+        print("\n=== PERFIL POR ETAPAS ===", file=sys.stderr)
+        print(profiler.table(), file=sys.stderr)
+        if args.profile_json:
+            report = profiler.to_dict()
+            report['argv'] = sys.argv[1:] if argv is None else list(argv)
+            with open(args.profile_json, 'w') as f:
+                json.dump(report, f, indent=2)
+        if args.cprofile:
+            count = write_collapsed(profiler, args.collapsed)
+            print(f">> {count} pilas colapsadas en {args.collapsed}", file=sys.stderr)
+
+def _run_live(args):
+    import ant_live
+    layout = None
+    if args.layout != 'map':
+        import ant_layout
+        layout = lambda graph: ant_layout.graph_coords(graph, args.layout, None, args.layout_iterations)
+    stream = open(args.input) if args.input else sys.stdin
+    try:
+        ant_live.show_live(stream, window=args.window, fps=args.fps, figsize=tuple(args.size),
+                           layout=layout)
+    finally:
+        if args.input:
+            stream.close()
+
+def _run(args):
+    # En modo json stdout sólo lleva el documento JSON
+    verbose = args.mode != 'json'
+    
+    if verbose:
+        print(">> Iniciando Lem-in Graph Visualizer...")
+        print(">> Procesando datos de entrada...")
+
+    if args.mode == 'live':
+        _run_live(args)
+        return
+
+    if args.mode == 'gui' and not args.no_overlap:
+        _run_gui_overlapped(args)
+        return
+
+    prepared = _prepare(args, verbose)
+    if prepared is None:
+        return
+    num_ants, graph, paths, simulation_lines, coords, heatmap = prepared
+    
+    if args.mode == 'animate':
+        if not simulation_lines:
+            sys.exit("ERROR: la entrada no contiene simulación (=== SIMULATION ===)")
+        if args.output:
+            import matplotlib
+            matplotlib.use('Agg')
+        import ant_animation
+        if args.output:
+            ant_animation.export_animation(num_ants, graph, paths, simulation_lines, args.output,
+                                           fps=args.fps, frames_per_turn=args.frames_per_turn,
+                                           dpi=args.dpi, figsize=tuple(args.size), coords=coords)
+            print(f"\n>> Animación exportada: {args.output}")
+        else:
+            print(f"\n>> Abriendo animación (espacio: play/pausa, flechas: turno, +/-: velocidad)...")
+            ant_animation.show_animation(num_ants, graph, paths, simulation_lines, fps=args.fps,
+                                         coords=coords)
+        return
+    
+    if args.mode == 'export':
+        # Backend sin pantalla antes de que ant_render importe pyplot
+        import matplotlib
+        matplotlib.use('Agg')
+        import ant_render
+        ant_render.export_graph(num_ants, graph, paths, args.output, dpi=args.dpi,
+                                figsize=tuple(args.size), fmt=args.fmt, coords=coords,
+                                heatmap=heatmap, heat_metric=args.heatmap or 'ant_turns')
+        print(f"\n>> Imagen exportada: {args.output}")
+        return
     
     print(f"\n>> Abriendo visualización con tema oscuro...")
     
-    show_graph(num_ants, nodes, connections, paths)
+    show_graph(num_ants, graph, paths, coords, lod=not args.no_lod, heatmap=heatmap,
+               heat_metric=args.heatmap or 'ant_turns', first_frame=_report_first_frame)
+
+def _prepare(args, verbose: bool):
+    """Parseo y preparación del grafo de los modos no live
+
+    Devuelve (num_ants, graph, paths, simulation_lines, coords, heatmap), o
+    None si el modo (stats, json) ya ha terminado; sys.exit si la entrada no
+    sirve.
+    """
+    if args.cache:
+        # Grafo y turnos ya en arrays: la entrada hace además de parser para las estadísticas
+        import ant_cache
+        with stage('parse'):
+            parser = ant_cache.ParseCache(args.cache_dir).load_input(args.input)
+        num_ants, graph, paths, simulation_lines = parser.num_ants, parser.graph, parser.paths, parser.moves
+        if verbose:
+            print(f">> Caché: {'acierto' if parser.hit else 'fallo, entrada guardada'} ({parser.key[:12]})")
+    else:
+        # Animación y congestión decodifican los turnos: mejor por bloques al leer que guardar las líneas
+        encode = args.mode == 'animate' or bool(args.heatmap)
+        moves = spill = None
+        if args.turns_file:
+            import os
+            import ant_turns
+            if os.path.exists(args.turns_file):
+                moves = ant_turns.load_turns(args.turns_file)
+            else:
+                spill = args.turns_file
+        stream = open(args.input) if args.input else sys.stdin
+        try:
+            parser = LemInStreamParser(stream)
+            with stage('parse'):
+                num_ants, graph, paths, simulation_lines = parse_lem_in_with_simulation(
+                    parser=parser, build=False, encode=encode, spill=spill, moves=moves)
+        except ValueError as e:
+            sys.exit(f"ERROR: {args.turns_file}: {e}")
+        finally:
+            if args.input:
+                stream.close()
+        if verbose and args.turns_file:
+            print(f">> Turnos: {args.turns_file} ({'reutilizado' if moves is not None else 'creado'}, "
+                  f"{simulation_lines.move_count} movimientos)")
+        if args.mode in ('gui', 'export', 'animate'):
+            with stage('build'):
+                graph = graph.build()
+    
+    if parser.error_line:
+        sys.exit("Error found in last line, exiting.")
+    
+    if not len(graph):
+        if verbose:
+            print("ERROR: No se encontraron nodos válidos en la entrada")
+        else:
+            print(json.dumps({'error': 'no nodes'}))
+        sys.exit(1)
+    
+    with stage('statistics'):
+        stats = collect_statistics(num_ants, graph, paths, simulation_lines, parser)
+    if args.mode == 'json':
+        json.dump(stats, sys.stdout, indent=2, ensure_ascii=False)
+        print()
+        return None
+    
+    print_statistics(stats)
+    if args.mode == 'stats':
+        return None
+    
+    if args.simplify:
+        import ant_reduce
+        with stage('reduce'):
+            reduced = ant_reduce.reduce_graph(graph)
+        if not len(reduced.graph):
+            sys.exit("ERROR: no hay camino entre ##start y ##end, nada que simplificar")
+        r = reduced.report()
+        print(f">> Grafo simplificado: {r['rooms']} -> {r['reduced_rooms']} salas, "
+              f"{r['tunnels']} -> {r['reduced_tunnels']} túneles")
+        graph, paths = reduced.graph, reduced.map_paths(paths)
+    
+    coords = None
+    if args.layout != 'map':
+        import ant_layout
+        cache = None
+        if args.cache:
+            import ant_cache
+            cache = ant_cache.ParseCache(args.cache_dir)
+        with stage('layout'):
+            coords = ant_layout.graph_coords(graph, args.layout, cache, args.layout_iterations)
+    
+    heatmap = None
+    if args.heatmap:
+        if not simulation_lines:
+            sys.exit("ERROR: la entrada no contiene simulación (=== SIMULATION ===)")
+        import ant_congestion
+        with stage('congestion'):
+            heatmap = ant_congestion.analyze(graph, num_ants, simulation_lines, paths)
+        s = heatmap.summary()
+        print(f">> Congestión: {s['moves']} movimientos en {s['turns']} turnos analizados en "
+              f"{s['seconds'] * 1000:.0f} ms")
+    return num_ants, graph, paths, simulation_lines, coords, heatmap
+
+def _prepare_gui(args):
+    """_prepare del modo gui en el hilo o proceso de arranque
+
+    Sin los turnos (la ventana no los usa; la congestión ya está calculada):
+    lo que vuelve son los arrays del grafo, los caminos y las coordenadas.
+    """
+    try:
+        prepared = _prepare(args, True)
+    finally:
+        # Desde otro proceso la salida tiene que llegar antes que la del principal
+        sys.stdout.flush()
+    num_ants, graph, paths, _, coords, heatmap = prepared
+    return num_ants, graph, paths, coords, heatmap
+
+def _report_first_frame(layer: str):
+    print(f">> Primer fotograma ({'vista previa' if layer == 'nodes' else 'completo'}): "
+          f"{(time.perf_counter() - _STARTED) * 1000:.0f} ms desde el arranque")
+
+def _run_gui_overlapped(args):
+    """Modo gui con arranque solapado
+
+    La entrada se parsea y el grafo se prepara (_prepare_gui) en un proceso
+    mientras este importa matplotlib y crea la figura; la ventana se abre con
+    sólo las salas y se completa por capas (ver ant_render.render_layers).
+    stdin se lee en un hilo: multiprocessing lo cierra en los procesos hijos.
+    Con un solo núcleo también se usa un hilo (un proceso sólo añadiría el
+    coste de copiar los arrays) y el solape se limita a la espera de lectura.
+    """
+    from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+    from ant_profile import available_cores
+    use_process = bool(args.input) and available_cores() > 1
+    if use_process:
+        # El hijo hereda el buffer de stdout: vaciarlo antes para no duplicarlo
+        sys.stdout.flush()
+    with (ProcessPoolExecutor if use_process else ThreadPoolExecutor)(max_workers=1) as pool:
+        future = pool.submit(_prepare_gui, args)
+        import ant_render
+        figure = ant_render.new_figure()
+        num_ants, graph, paths, coords, heatmap = future.result()
+    
+    print(f"\n>> Abriendo visualización con tema oscuro...")
+    ant_render.show_graph(num_ants, graph, paths, coords, lod=not args.no_lod, heatmap=heatmap,
+                          heat_metric=args.heatmap or 'ant_turns', figure=figure, progressive=True,
+                          first_frame=_report_first_frame)
 
 if __name__ == "__main__":
     main()
-